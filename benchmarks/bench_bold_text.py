@@ -0,0 +1,110 @@
+"""
+加粗文字渲染微基准
+对比旧版9次偏移重绘的伪加粗与 poster_assets.draw_bold_text 描边加粗绘制海报日期框的耗时，
+并统计两者输出的像素差异（差异集中在字形边缘的抗锯齿像素）
+
+用法：
+    python benchmarks/bench_bold_text.py [--font 字体文件] [--rounds 次数] [--save 目录]
+不指定字体时使用配置中的时间字体，找不到时使用matplotlib自带的DejaVuSans-Bold。
+--save 会把旧版输出、新版输出和放大后的差异图保存到指定目录。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xiaotian.manage.config import DATE_FONT  # noqa: E402
+from xiaotian.tools.poster_assets import draw_bold_text  # noqa: E402
+
+
+OFFSETS = [(0, 0), (1, 0), (0, 1), (1, 1), (-1, 0), (0, -1), (-1, -1), (1, -1), (-1, 1)]
+BOX_SIZE = 180
+BACKGROUND = (12, 14, 32, 255)
+
+
+def legacy_bold_text(draw, xy, text, font, fill, anchor="mm"):
+    """旧版：上下左右各偏移1像素重绘9次"""
+    for offset in OFFSETS:
+        draw.text((xy[0] + offset[0], xy[1] + offset[1]), text, fill=fill, font=font, anchor=anchor)
+
+
+def render_date_box(bold_text, font, year="2026", month="10月", day="17日") -> Image.Image:
+    """按create_poster中的布局绘制日期框"""
+    img = Image.new('RGBA', (BOX_SIZE, BOX_SIZE), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([(0, 0), (BOX_SIZE, BOX_SIZE)], outline=(255, 255, 255, 255), width=10)
+    for i, char in enumerate(year):
+        bold_text(draw, (30, 30 + i * 38), char, font, '#FFFFFF')
+    draw.line([(BOX_SIZE // 2 - 32, 15), (BOX_SIZE // 2 - 32, BOX_SIZE - 15)], fill=(255, 255, 255, 255), width=5)
+    right_center_x = BOX_SIZE // 2 + 30
+    bold_text(draw, (right_center_x, 60), month, font, '#7FBCDE')
+    bold_text(draw, (right_center_x, 110), day, font, '#7FBCDE')
+    return img
+
+
+def default_font_path() -> str:
+    if os.path.exists(DATE_FONT):
+        return DATE_FONT
+    import matplotlib
+    return os.path.join(os.path.dirname(matplotlib.__file__), 'mpl-data', 'fonts', 'ttf', 'DejaVuSans-Bold.ttf')
+
+
+def time_render(bold_text, font, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        render_date_box(bold_text, font)
+    return (time.perf_counter() - start) / rounds
+
+
+def pixel_diff(a: Image.Image, b: Image.Image):
+    """返回(不同像素数, 差异超过32的像素数, 平均差异, 最大差异, 差异图)"""
+    diff = ImageChops.difference(a.convert('RGB'), b.convert('RGB')).convert('L')
+    histogram = diff.histogram()
+    total = sum(histogram)
+    changed = total - histogram[0]
+    large = sum(histogram[33:])
+    mean = sum(value * count for value, count in enumerate(histogram)) / total
+    peak = max((value for value, count in enumerate(histogram) if count), default=0)
+    return changed, large, mean, peak, diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="加粗文字渲染微基准")
+    parser.add_argument('--font', help="字体文件")
+    parser.add_argument('--size', type=int, default=47, help="字号（海报中时间字体为47）")
+    parser.add_argument('--rounds', type=int, default=200, help="重复次数")
+    parser.add_argument('--save', help="保存输出图片和差异图的目录")
+    args = parser.parse_args()
+
+    font_path = args.font or default_font_path()
+    font = ImageFont.truetype(font_path, args.size)
+    print(f"字体: {font_path}  字号: {args.size}  重复: {args.rounds}次")
+
+    legacy = render_date_box(legacy_bold_text, font)
+    stroked = render_date_box(draw_bold_text, font)
+    changed, large, mean, peak, diff = pixel_diff(legacy, stroked)
+    pixels = BOX_SIZE * BOX_SIZE
+    print(f"像素差异: {changed}/{pixels} ({changed / pixels:.1%})，"
+          f"差异>32: {large} ({large / pixels:.1%})，平均差异: {mean:.2f}，最大差异: {peak}")
+
+    legacy_time = time_render(legacy_bold_text, font, args.rounds)
+    stroke_time = time_render(draw_bold_text, font, args.rounds)
+    print(f"9次偏移重绘: {legacy_time * 1000:.3f} ms/日期框")
+    print(f"描边加粗:    {stroke_time * 1000:.3f} ms/日期框  ({legacy_time / stroke_time:.1f}x)")
+
+    if args.save:
+        os.makedirs(args.save, exist_ok=True)
+        legacy.save(os.path.join(args.save, "bold_legacy.png"))
+        stroked.save(os.path.join(args.save, "bold_stroke.png"))
+        # 差异放大8倍便于查看
+        diff.point(lambda v: min(255, v * 8)).save(os.path.join(args.save, "bold_diff.png"))
+        print(f"已保存到 {args.save}")
+
+
+if __name__ == '__main__':
+    main()
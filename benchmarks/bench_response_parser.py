@@ -0,0 +1,153 @@
+"""
+回复解析微基准
+对比旧版逐条正则的markdown清理、转义修复后json.loads的解析方式，
+与 response_parser 中预编译、按触发字符跳过规则的清理和宽松读取的耗时，并列出两者结果不同的样本
+
+用法：
+    python benchmarks/bench_response_parser.py [--corpus 文件] [--rounds 次数]
+语料文件可以是字符串列表的JSON，也可以是每行一条JSON字符串的JSONL；
+也可以直接传入记忆文件（{memory_key: [{"role":..,"content":..}]}），取其中assistant的回复。
+不指定时使用内置的模型回复样本。
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xiaotian.ai.response_parser import strip_markdown, read_reply_json  # noqa: E402
+
+
+SAMPLE_OUTPUTS = [
+    '{"data": [{"wait_time": 1, "content": "嗯嗯，今晚月亮很圆哦"}, {"wait_time": 3, "content": "要不要一起看？"}], "like": 1}',
+    '{"data": [{"wait_time": 2, "content": "木星是太阳系最大的行星！\n它的质量是其他行星总和的2.5倍"}], "like": 0}',
+    '{"data": [{"wait_time": 2, "content": "他说"我看到流星了"，是真的吗"}], "like": 2}',
+    '{"data": [{"wait_time": 1, "content": "**猎户座**是冬季最容易认的星座"}, {"wait_time": 4, "content": "1. 参宿四\n2. 参宿七\n3. 腰带三星"}], "like": 1}',
+    '{"data": [{"wait_time": 1, "content": "### 小知识\n> 光从太阳到地球大约需要 *8分20秒*"}], "like": 0}',
+    '{"data": [{"wait_time": 0, "content": "", "not_even_wrong": true}], "like": -1}',
+    '{"data": [{"wait_time": 2, "content": "哼，不理你了"}], "like": -3}',
+    '```json\n{"data": [{"wait_time": 2, "content": "今天的天气适合观星~"}], "like": 1}\n```',
+    '{"data": [{"wait_time": 1, "content": "- 月相：满月\n- 可见行星：金星、木星\n- 推荐目标：`M42`"}], "like": 0}',
+    '{"data": [{"wait_time": 2, "content": "可以看看[这个网站](https://example.com)，有很多~~过时的~~新图片"}], "like": 1}',
+    '{"data": [{"wait_time": 1, "content": "好呀"}, {"wait_time": 2, "content": "不过先说好"}, {"wait_time": 2, "content": "只能看十分钟"}], "like": 1}',
+    '{"wait_time": 3, "content": "旧格式的单条回复"}',
+    '喵？我没听懂，可以再说一遍吗',
+    '{"data": [{"wait_time": 2, "content": "黑洞的\\"事件视界\\"是光也逃不出的边界"}], "like": 2}',
+    '{"data": [{"wait_time": 2, "content": "哈哈哈哈\n\n\n\n好好笑"}], "like": 1}',
+    '{"data": [{"wait_time": 3, "content": "土星环主要由冰和岩石组成，环的厚度只有几十米到一公里左右，但直径却有数十万公里。如果把土星环按比例缩小成一张纸那么薄，它的直径会有一个足球场那么大。"}, {"wait_time": 4, "content": "所以说宇宙真的很神奇呢"}], "like": 1}',
+]
+
+
+def legacy_strip_md(t):
+    """旧版的markdown清理：16次顺序的re.sub"""
+    if not t:
+        return t
+    t = re.sub(r'```.*?```', '', t, flags=re.DOTALL)
+    t = re.sub(r'`([^`]+)`', r'\1', t)
+    t = re.sub(r'!\[([^\]]*)\]\([^)]*\)', r'\1', t)
+    t = re.sub(r'\[([^\]]+)\]\([^)]*\)', r'\1', t)
+    t = re.sub(r'\*\*\*([^*]+)\*\*\*', r'\1', t)
+    t = re.sub(r'___([^_]+)___', r'\1', t)
+    t = re.sub(r'\*\*([^*]+)\*\*', r'\1', t)
+    t = re.sub(r'__([^_]+)__', r'\1', t)
+    t = re.sub(r'\*([^*]+)\*', r'\1', t)
+    t = re.sub(r'_([^_]+)_', r'\1', t)
+    t = re.sub(r'~~([^~]+)~~', r'\1', t)
+    t = re.sub(r'^\s{0,3}#{1,6}\s*', '', t, flags=re.MULTILINE)
+    t = re.sub(r'^\s{0,3}>\s?', '', t, flags=re.MULTILINE)
+    t = re.sub(r'^\s*[-*+]\s+', '', t, flags=re.MULTILINE)
+    t = re.sub(r'^\s*\d+\.\s+', '', t, flags=re.MULTILINE)
+    t = re.sub(r'^\s*([-*_]\s*){3,}$', '', t, flags=re.MULTILINE)
+    t = re.sub(r'\n{3,}', '\n\n', t)
+    return t.strip()
+
+
+def legacy_read(text):
+    """旧版的解析：正则修复content中的换行和引号后json.loads"""
+    cleaned = text.strip()
+    if '{' in cleaned and '}' in cleaned:
+        def fix(match):
+            value = match.group(2)
+            value = re.sub(r'(?<!\\)\n', '\\\\n', value)
+            value = re.sub(r'(?<!\\)"', '\\\\"', value)
+            return match.group(1) + value + match.group(3)
+        cleaned = re.sub(r'("content"\s*:\s*")(.*?)("\s*[,}])', fix, cleaned, flags=re.DOTALL)
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        return None
+
+
+def contents_of(data, strip):
+    """按回复格式取出并清理所有content，不是JSON时清理整段文本"""
+    if isinstance(data, dict) and 'data' in data:
+        return [strip(item.get('content', '')) for item in data['data'] if isinstance(item, dict)]
+    if isinstance(data, dict) and 'content' in data:
+        return [strip(data['content'])]
+    return None
+
+
+def legacy_pipeline(text):
+    return contents_of(legacy_read(text), legacy_strip_md) or [legacy_strip_md(text)]
+
+
+def new_pipeline(text):
+    return contents_of(read_reply_json(text), strip_markdown) or [strip_markdown(text)]
+
+
+def load_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return [json.loads(line) for line in raw.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        # 记忆文件：取所有assistant回复
+        return [m['content'] for memories in data.values() if isinstance(memories, list)
+                for m in memories if isinstance(m, dict) and m.get('role') == 'assistant' and m.get('content')]
+    return [str(item) for item in data]
+
+
+def bench(func, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            func(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回复解析微基准")
+    parser.add_argument('--corpus', help="语料文件（JSON列表、JSONL或记忆文件）")
+    parser.add_argument('--rounds', type=int, default=2000, help="重复次数")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else SAMPLE_OUTPUTS
+    print(f"📚 语料：{len(corpus)} 条回复，重复 {args.rounds} 次")
+
+    md_texts = [c for text in corpus for c in (contents_of(legacy_read(text), lambda x: x) or [text])]
+    for name, old, new, texts in (
+        ("markdown清理", legacy_strip_md, strip_markdown, md_texts),
+        ("JSON读取", legacy_read, read_reply_json, corpus),
+        ("完整解析", legacy_pipeline, new_pipeline, corpus),
+    ):
+        old_time = bench(old, texts, args.rounds)
+        new_time = bench(new, texts, args.rounds)
+        per_item = 1e6 / (len(texts) * args.rounds)
+        print(f"⏱️ {name}：旧 {old_time * per_item:.2f}µs/条，新 {new_time * per_item:.2f}µs/条，"
+              f"加速 {old_time / new_time:.2f}x")
+
+    differences = [(text, legacy_pipeline(text), new_pipeline(text)) for text in corpus]
+    differences = [d for d in differences if d[1] != d[2]]
+    print(f"🔍 结果不同的样本：{len(differences)}/{len(corpus)}")
+    for text, old, new in differences:
+        print(f"  原文：{text!r}\n  旧：{old!r}\n  新：{new!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+描边加粗与旧版9次偏移重绘的像素差异测试
+绘制与海报相同布局的日期框，差异只允许出现在字形边缘的抗锯齿像素上
+"""
+
+import os
+import sys
+
+import pytest
+from PIL import ImageChops, ImageFilter, ImageFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from bench_bold_text import BOX_SIZE, default_font_path, legacy_bold_text, pixel_diff, render_date_box  # noqa: E402
+from xiaotian.tools.poster_assets import draw_bold_text  # noqa: E402
+
+# 容差：DejaVuSans-Bold 47号实测 不同像素5.0%、差异>32的像素3.2%、平均差异2.2、最大差异127，
+# 描边的轮廓比偏移重绘圆滑，差异集中在笔画拐角，留出一些余量以适应其他字体
+MAX_CHANGED_RATIO = 0.06
+MAX_LARGE_RATIO = 0.04
+MAX_MEAN_DIFF = 3.0
+MAX_PEAK_DIFF = 160
+
+
+@pytest.fixture(scope='module')
+def font():
+    path = default_font_path()
+    if not os.path.exists(path):
+        pytest.skip(f"没有可用的字体: {path}")
+    return ImageFont.truetype(path, 47)
+
+
+def test_stroke_bold_matches_legacy_within_tolerance(font):
+    legacy = render_date_box(legacy_bold_text, font)
+    stroked = render_date_box(draw_bold_text, font)
+    changed, large, mean, peak, _ = pixel_diff(legacy, stroked)
+    pixels = BOX_SIZE * BOX_SIZE
+    assert changed / pixels <= MAX_CHANGED_RATIO
+    assert large / pixels <= MAX_LARGE_RATIO
+    assert mean <= MAX_MEAN_DIFF
+    assert peak <= MAX_PEAK_DIFF
+
+
+def test_differences_only_on_glyph_edges(font):
+    """边框、分隔线和背景完全一致，有差异的像素都紧挨着旧版绘制的文字"""
+    legacy = render_date_box(legacy_bold_text, font)
+    stroked = render_date_box(draw_bold_text, font)
+    diff = pixel_diff(legacy, stroked)[4]
+    empty = render_date_box(lambda *args, **kwargs: None, font).convert('RGB')
+    # 旧版文字覆盖的像素向外扩展2像素，作为允许出现差异的区域
+    text_mask = pixel_diff(empty, legacy)[4].point(lambda v: 255 if v else 0)
+    allowed = text_mask.filter(ImageFilter.MaxFilter(5))
+    changed = diff.point(lambda v: 255 if v else 0)
+    assert ImageChops.subtract(changed, allowed).getbbox() is None
@@ -0,0 +1,110 @@
+"""
+长期记忆折叠测试：模型调用期间记忆被截断、淘汰或重新载入时，不能误删或重复保存对话
+"""
+
+import threading
+import types
+from collections import OrderedDict
+
+from xiaotian.ai.ai_core import XiaotianAI
+from xiaotian.ai.memory_summarizer import MemorySummarizer
+
+KEY = "user_test"
+
+
+class FakeStore:
+    """只记录set_summary调用的存储"""
+
+    def __init__(self, memories):
+        self.memories = memories
+        self.summaries = []
+
+    def load_memory(self, memory_key):
+        return [dict(m) for m in self.memories]
+
+    def load_summary(self, memory_key):
+        return None
+
+    def append_memory(self, memory_key, role, content):
+        self.memories.append({"role": role, "content": content})
+
+    def set_summary(self, memory_key, summary, drop=0):
+        self.summaries.append((memory_key, summary, drop))
+        del self.memories[:drop]
+
+
+def _fake_ai(count: int = 12):
+    memories = [{"role": "user" if i % 2 == 0 else "assistant", "content": str(i)} for i in range(count)]
+    ai = XiaotianAI.__new__(XiaotianAI)
+    ai.memory_lock = threading.RLock()
+    ai.memory_store = FakeStore(memories)
+    ai.memory_storage = OrderedDict()
+    ai.memory_summaries = {}
+    ai.current_model = "test"
+    ai.during_completion = lambda: None
+
+    def create_completion(priority, **kwargs):
+        ai.during_completion()
+        message = types.SimpleNamespace(content="用户喜欢看星星")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    ai.create_completion = create_completion
+    return ai
+
+
+def _contents(ai):
+    return [m["content"] for m in ai.memory_storage[KEY]]
+
+
+def _contents_after_reload(ai):
+    ai.get_memory(KEY)
+    return _contents(ai)
+
+
+def test_summary_folds_oldest_turns():
+    ai = _fake_ai()
+    ai.get_memory(KEY)
+    MemorySummarizer(ai).summarize(KEY, dropped=4)
+    # 至少折叠MEMORY_SUMMARY_BATCH条，保留最近一轮
+    assert _contents(ai) == ["10", "11"]
+    assert ai.memory_store.summaries == [(KEY, "用户喜欢看星星", 10)]
+    assert ai.get_memory_summary(KEY) == "用户喜欢看星星"
+
+
+def test_turns_trimmed_during_summary_are_not_dropped_again():
+    ai = _fake_ai()
+    ai.get_memory(KEY)
+
+    def trim():
+        # 模型调用期间add_to_memory按上限截掉了最早的两条
+        ai.memory_storage[KEY] = ai.memory_storage[KEY][2:]
+
+    ai.during_completion = trim
+    MemorySummarizer(ai).summarize(KEY, dropped=4)
+    assert _contents(ai) == ["10", "11"]
+    assert ai.memory_store.summaries[-1][2] == 8
+
+
+def test_summary_discarded_when_key_evicted_during_summary():
+    ai = _fake_ai()
+    ai.get_memory(KEY)
+    ai.during_completion = lambda: ai.memory_storage.pop(KEY)
+    MemorySummarizer(ai).summarize(KEY, dropped=4)
+    assert ai.memory_store.summaries == []
+    assert ai.memory_summaries.get(KEY) is None
+    # 重新载入的记忆完整保留
+    assert _contents_after_reload(ai) == [str(i) for i in range(12)]
+
+
+def test_summary_discarded_when_key_reloaded_during_summary():
+    ai = _fake_ai()
+    ai.get_memory(KEY)
+
+    def reload():
+        ai.memory_storage.pop(KEY)
+        ai.get_memory(KEY)
+
+    ai.during_completion = reload
+    MemorySummarizer(ai).summarize(KEY, dropped=4)
+    assert ai.memory_store.summaries == []
+    assert _contents(ai) == [str(i) for i in range(12)]
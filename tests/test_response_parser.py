@@ -0,0 +1,64 @@
+"""
+strip_markdown 与旧版逐条re.sub的 _strip_md 结果一致性测试
+旧版实现取自 benchmarks/bench_response_parser.py
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from bench_response_parser import SAMPLE_OUTPUTS, legacy_strip_md  # noqa: E402
+from xiaotian.ai.response_parser import strip_markdown  # noqa: E402
+
+
+# 规则顺序和叠加最容易产生差异的输入
+TRICKY_INPUTS = [
+    '',
+    '* 星号列表 *强调*',
+    '* * *',
+    'b\n-\n',
+    '> # 引用里的标题',
+    '# > 标题里的引用',
+    '> > 两层引用',
+    '> - 引用里的列表',
+    '- **粗体列表** 和 `代码`',
+    '***粗斜体*** 与 **粗体** 与 *斜体*',
+    '___a___ __b__ _c_',
+    '1. 第一\n2. 第二\n3.没有空格',
+    '---\n___\n***\n- - -',
+    '[**加粗链接**](https://example.com)',
+    '![图片](a.png) 与 [链接](b)',
+    '```\n代码块\n```之后 `行内`',
+    '~~删除~~ ~单波浪~',
+    'a\n\n\n\nb',
+    '   ### 缩进标题',
+    '    #### 缩进太多的标题',
+    '*a**b*c**',
+    '_下划线_开头_',
+]
+
+
+def _random_inputs(count: int = 2000, seed: int = 20261017):
+    pieces = ['*', '**', '***', '_', '__', '~~', '`', '```', '#', '## ', '> ', '- ', '+ ', '1. ',
+              '[', ']', '(', ')', '![', '\n', '\n\n\n', ' ', '  ', '\t', '星', '月', 'a', 'b', '.', '-']
+    rng = random.Random(seed)
+    return [''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('text', TRICKY_INPUTS)
+def test_matches_legacy_on_tricky_inputs(text):
+    assert strip_markdown(text) == legacy_strip_md(text)
+
+
+@pytest.mark.parametrize('text', SAMPLE_OUTPUTS)
+def test_matches_legacy_on_sample_outputs(text):
+    assert strip_markdown(text) == legacy_strip_md(text)
+
+
+def test_matches_legacy_on_random_inputs():
+    different = [text for text in _random_inputs() if strip_markdown(text) != legacy_strip_md(text)]
+    assert different == []
@@ -0,0 +1,70 @@
+"""
+流式回复的回调测试：用假的异步客户端按小块吐出模型回复
+"""
+
+import asyncio
+import types
+
+from xiaotian.ai import ai_core
+from xiaotian.ai.ai_core import XiaotianAI
+
+
+def _fake_ai(reply: str, chunk_size: int = 7) -> XiaotianAI:
+    """不连接存储和模型的XiaotianAI，模型把reply按chunk_size切块流式返回"""
+    chunks = [reply[i:i + chunk_size] for i in range(0, len(reply), chunk_size)]
+
+    class Stream:
+        def __aiter__(self):
+            async def gen():
+                for text in chunks:
+                    delta = types.SimpleNamespace(content=text)
+                    yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+            return gen()
+
+    async def create(**kwargs):
+        return Stream()
+
+    ai = XiaotianAI.__new__(XiaotianAI)
+    ai._async_client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    ai._resolve_priority = lambda user_id, priority: ai_core.PRIORITY_BACKGROUND
+    ai._build_chat_request = lambda *args: ('user_test', {})
+    ai._finish_chat = lambda memory_key, user_message, text: text
+    return ai
+
+
+def _stream(reply: str):
+    ai = _fake_ai(reply)
+    parts = []
+    response = asyncio.run(ai.get_response_stream_async("你好", on_part=lambda *part: parts.append(part)))
+    return ai, response, parts
+
+
+def test_parts_carry_position_in_parsed_contents():
+    """内容为空的消息不回调，但占一个位置，与parse_ai_response_for_like的结果对齐"""
+    reply = ('{"data": [{"wait_time": 1, "content": "A"}, {"wait_time": 2, "content": ""}, '
+             '{"wait_time": 3, "content": "B"}], "like": 1}')
+    ai, response, parts = _stream(reply)
+    assert parts == [(0, 1, "A"), (2, 3, "B")]
+    cleaned, _, wait_time, _ = ai.parse_ai_response_for_like(response)
+    streamed = {index for index, _, _ in parts}
+    assert [i for i in range(len(wait_time)) if i not in streamed and cleaned[i]] == []
+
+
+def test_not_even_wrong_on_first_item_suppresses_reply():
+    reply = ('{"data": [{"wait_time": 0, "content": "不想理你", "not_even_wrong": true}, '
+             '{"wait_time": 2, "content": "B"}], "like": 0}')
+    _, _, parts = _stream(reply)
+    assert parts == []
+
+
+def test_not_even_wrong_on_second_item_stops_later_parts():
+    """标记在第二条消息上时，第一条已经发出，之后的消息不再回调，
+    解析结果带有not_even_wrong标记，调用方据此丢弃剩余的消息"""
+    reply = ('{"data": [{"wait_time": 1, "content": "A"}, '
+             '{"wait_time": 0, "content": "B", "not_even_wrong": true}, '
+             '{"wait_time": 2, "content": "C"}], "like": 0}')
+    ai, response, parts = _stream(reply)
+    assert parts == [(0, 1, "A")]
+    _, _, _, not_even_wrong = ai.parse_ai_response_for_like(response)
+    assert not_even_wrong
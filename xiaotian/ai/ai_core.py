@@ -2,13 +2,13 @@
 小天的核心AI接口模块
 """
 
-from openai import OpenAI
-import json
+from openai import OpenAI, AsyncOpenAI
 import os
-import re
 import time
 import random
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable
 from ..manage.config import (
     API_KEY, BASE_URL, XIAOTIAN_SYSTEM_PROMPT, GLOBAL_RATE_LIMIT, USER_RATE_LIMIT, 
     MAX_MEMORY_COUNT, MEMORY_FILE, CHANGE_PERSONALITY_PROMPT, USE_MODEL, BASIC_PROMPT, 
@@ -16,19 +16,75 @@ from ..manage.config import (
     GENTLE_PERSONALITY_LIKE_MULTIPLIER, SHARP_PERSONALITY_LIKE_MULTIPLIER, 
     GENTLE_PERSONALITY_INDICES, SHARP_PERSONALITY_INDICES, ENHANCED_GENTLE_PERSONALITIES, 
     ENHANCED_SHARP_PERSONALITIES, LIKE_EMOTIONS, LIKE_SPEED_DECAY_RATE, 
-    LIKE_MIN_SPEED_MULTIPLIER, SYSTEM_PROMPT, LAST_PROMOT,RECYCLE_BIN
+    LIKE_MIN_SPEED_MULTIPLIER, SYSTEM_PROMPT, LAST_PROMOT, MEMORY_CACHE_SIZE
 )
+from .memory_store import MemoryStore, JsonMemoryStore, create_memory_store
+from .memory_watcher import get_memory_watcher
+from .llm_limiter import get_llm_limiter, PRIORITY_CHAT, PRIORITY_BACKGROUND
+from .stream_parser import DataArrayStreamParser
+from .response_parser import strip_markdown, read_reply_json
+from .response_cache import get_response_cache
+from .context_builder import build_messages
+from .memory_summarizer import MemorySummarizer
+from .keyword_matcher import get_keyword_matcher, KeywordHit
+from .personality_table import get_personality_table, is_reference, enhanced_ref
+
+
+# 进程内共用的OpenAI客户端和AI实例，所有工具共享同一个HTTP连接池
+_SHARED_CLIENT = None
+_SHARED_ASYNC_CLIENT = None
+_SHARED_AI = None
+_SHARED_GUARD = threading.Lock()
+_SHARED_AI_GUARD = threading.Lock()
+
+
+def get_shared_client() -> OpenAI:
+    """获取进程内共用的OpenAI客户端"""
+    global _SHARED_CLIENT
+    with _SHARED_GUARD:
+        if _SHARED_CLIENT is None:
+            _SHARED_CLIENT = OpenAI(
+                api_key=API_KEY,
+                base_url=BASE_URL
+            )
+        return _SHARED_CLIENT
+
+
+def get_shared_async_client() -> AsyncOpenAI:
+    """获取进程内共用的AsyncOpenAI客户端，供事件循环中的异步调用使用"""
+    global _SHARED_ASYNC_CLIENT
+    with _SHARED_GUARD:
+        if _SHARED_ASYNC_CLIENT is None:
+            _SHARED_ASYNC_CLIENT = AsyncOpenAI(
+                api_key=API_KEY,
+                base_url=BASE_URL
+            )
+        return _SHARED_ASYNC_CLIENT
+
+
+def get_shared_ai() -> "XiaotianAI":
+    """获取进程内共用的XiaotianAI实例，首次调用时创建"""
+    global _SHARED_AI
+    with _SHARED_AI_GUARD:
+        if _SHARED_AI is None:
+            _SHARED_AI = XiaotianAI()
+        return _SHARED_AI
+
 
 class XiaotianAI:
-    def __init__(self):
-        self.client = OpenAI(
-            api_key=API_KEY,
-            base_url=BASE_URL
-        )
-        # 改为按用户/群组分别存储记忆
-        self.memory_storage: Dict[str, List[Dict[str, str]]] = {}
-        # 存储每个用户的固定性格索引或自定义性格文本
+    def __init__(self, client: OpenAI = None):
+        # 默认使用进程内共用的客户端，避免每个实例各建一套连接池
+        self.client = client or get_shared_client()
+        self._async_client = None
+        # 改为按用户/群组分别存储记忆，只常驻最近使用的部分，其余按需从存储读取
+        self.memory_storage: Dict[str, List[Dict[str, str]]] = OrderedDict()
+        # 常驻记忆对应的长期记忆摘要（与memory_storage一起载入和淘汰）
+        self.memory_summaries: Dict[str, Any] = {}
+        # 保护对话记忆的追加、截断和折叠（后台整理长期记忆时与聊天线程共用）
+        self.memory_lock = threading.RLock()
+        # 存储每个用户的性格引用（内置索引、增强性格或自定义性格表中的哈希）
         self.user_personality: Dict[str, Any] = {}
+        self.personality_table = get_personality_table()
         # 存储每个用户的like状态
         self.user_like_status: Dict[str, Dict] = {}
         self.api_calls = {
@@ -37,15 +93,50 @@ class XiaotianAI:
             'user_counts': {}  # 用户级别的API调用计数
         }
         
-        # 记录文件最后修改时间，用于判断是否需要重新加载
-        self.memory_file_mtime = 0
+        # 记忆存储后端（JSON日志或SQLite），每次变更只写入对应的记录
+        self.memory_store: MemoryStore = create_memory_store()
         
         # 初始化时加载记忆
         self.load_memory(MEMORY_FILE)
         
+        # 监听其他实例对存储的修改，只同步变化的键
+        get_memory_watcher().subscribe(self.memory_store, self._apply_external_changes)
+        
         # 当前使用的模型（动态可变）
         self.current_model = USE_MODEL
         
+        # 后台把过长的对话折叠进长期记忆
+        self.summarizer = MemorySummarizer(self)
+        
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """异步客户端，首次使用时创建（需在事件循环中使用）"""
+        if self._async_client is None:
+            self._async_client = get_shared_async_client()
+        return self._async_client
+
+    def create_completion(self, priority: int = PRIORITY_CHAT, **request):
+        """按优先级排队后调用模型接口，参数同chat.completions.create"""
+        with get_llm_limiter().slot(priority):
+            return self.client.chat.completions.create(**request)
+
+    async def create_completion_async(self, priority: int = PRIORITY_CHAT, **request):
+        """create_completion的异步版本"""
+        async with get_llm_limiter().async_slot(priority):
+            return await self.async_client.chat.completions.create(**request)
+
+    def _cached_completion(self, priority: int, request: Dict[str, Any]) -> str:
+        """无状态的一次性查询：命中缓存时直接返回，否则调用模型并写入缓存"""
+        cache = get_response_cache()
+        content = cache.get(request)
+        if content is not None:
+            print("💾 命中回复缓存")
+            return content
+        response = self.create_completion(priority, **request)
+        content = response.choices[0].message.content
+        cache.put(request, content)
+        return content
+
     def change_model(self, new_model: str) -> str:
         """动态更换AI模型"""
         try:
@@ -54,19 +145,43 @@ class XiaotianAI:
         except:
             return f"wrong"
             
-    def _should_reload_memory(self, file_path: str) -> bool:
-        """检查是否需要重新加载记忆文件"""
+    def _get_store(self, file_path: str) -> MemoryStore:
+        """获取指定记忆文件对应的存储，默认记忆文件使用配置的存储后端"""
+        if os.path.abspath(file_path) == os.path.abspath(MEMORY_FILE):
+            return self.memory_store
+        return JsonMemoryStore(file_path)
+    
+    def _apply_external_changes(self, changes: Dict[str, Any]):
+        """应用其他实例写入的变更（由记忆监听线程调用）"""
+        with self.memory_lock:
+            if changes.get("reload"):
+                print("🔄 检测到记忆存储被整体更新，重新加载...")
+                self.load_memory(MEMORY_FILE)
+                return
+        
+            for record in changes.get("records", []):
+                op, key = record.get("op"), record.get("key")
+                if op in ("mem", "summary"):
+                    # 丢弃常驻的旧记忆，下次使用时重新读取
+                    self.memory_storage.pop(key, None)
+                    self.memory_summaries.pop(key, None)
+                elif op == "personality":
+                    if record.get("value") is None:
+                        self.user_personality.pop(key, None)
+                    else:
+                        self.user_personality[key] = record["value"]
+                elif op == "like":
+                    if record.get("value") is None:
+                        self.user_like_status.pop(key, None)
+                    else:
+                        self.user_like_status[key] = record["value"]
+    
+    def flush_memory(self):
+        """立即写入缓冲中的记忆变更（关闭或月度重置前调用）"""
         try:
-            if not os.path.exists(file_path):
-                return False
-            
-            current_mtime = os.path.getmtime(file_path)
-            if current_mtime > self.memory_file_mtime:
-                self.memory_file_mtime = current_mtime
-                return True
-            return False
-        except Exception:
-            return False
+            self.memory_store.flush()
+        except Exception as e:
+            print(f"❌ 写入记忆变更失败: {e}")
     
     def _get_memory_key(self, user_id: str, group_id: str = None) -> str:
         """生成记忆存储键，区分私聊和群聊"""
@@ -77,35 +192,67 @@ class XiaotianAI:
     
     def add_to_memory(self, memory_key: str, role: str, content: str):
         """添加消息到指定的记忆中"""
-        if memory_key not in self.memory_storage:
-            self.memory_storage[memory_key] = []
-        
-        self.memory_storage[memory_key].append({"role": role, "content": content})
-        
-        # 保持记忆在限制范围内
-        if len(self.memory_storage[memory_key]) > MAX_MEMORY_COUNT:
-            self.memory_storage[memory_key] = self.memory_storage[memory_key][-MAX_MEMORY_COUNT:]
+        with self.memory_lock:
+            # 确保该记忆已从存储中载入
+            self.get_memory(memory_key)
+            
+            self.memory_storage[memory_key].append({"role": role, "content": content})
+            
+            # 保持记忆在限制范围内
+            if len(self.memory_storage[memory_key]) > MAX_MEMORY_COUNT:
+                self.memory_storage[memory_key] = self.memory_storage[memory_key][-MAX_MEMORY_COUNT:]
+            
+            self._persist(self.memory_store.append_memory, memory_key, role, content)
+    
+    def _persist(self, operation, *args):
+        """执行一次存储写入，失败时只打印错误不影响对话"""
+        try:
+            operation(*args)
+        except Exception as e:
+            print(f"❌ 写入记忆存储失败: {e}")
     
+    def _set_user_personality(self, memory_key: str, personality_data: Any):
+        """设置用户性格并记录变更，完整的性格文本先转换为引用"""
+        if not is_reference(personality_data):
+            personality_data = self.personality_table.intern(personality_data)
+        self.user_personality[memory_key] = personality_data
+        self._persist(self.memory_store.set_personality, memory_key, personality_data)
+    
+    def save_like_status(self, user_id: str):
+        """记录用户like状态的变更（直接修改like状态后需调用）"""
+        like_key = f"user_{user_id}" if not user_id.startswith("user_") else user_id
+        self._persist(self.memory_store.set_like_status, like_key, self.user_like_status.get(like_key))
+    
+    def _migrate_personality_texts(self):
+        """把旧版本按用户保存的完整性格文本（包括like状态中的原始性格）迁移为引用"""
+        migrated = 0
+        for memory_key, personality_data in list(self.user_personality.items()):
+            if not is_reference(personality_data):
+                self._set_user_personality(memory_key, personality_data)
+                migrated += 1
+        for like_key, status in self.user_like_status.items():
+            original = status.get('original_personality') if isinstance(status, dict) else None
+            if not is_reference(original):
+                status['original_personality'] = self.personality_table.intern(original)
+                self.save_like_status(like_key)
+                migrated += 1
+        if migrated:
+            print(f"📦 已将 {migrated} 个完整性格文本迁移为性格表引用")
+
     def get_user_personality(self, memory_key: str) -> str:
         """获取或生成用户的固定性格"""
         # 如果用户还没有分配性格，随机选择一个内置性格
         if memory_key not in self.user_personality:
             personality_index = random.randint(0, len(XIAOTIAN_SYSTEM_PROMPT) - 1)
-            self.user_personality[memory_key] = personality_index
+            self._set_user_personality(memory_key, personality_index)
             print(f"为用户 {memory_key} 分配性格索引: {personality_index}")
         
-        # 获取用户的性格设定
-        user_personality_data = self.user_personality[memory_key]
-        
-        # 如果是整数，说明是内置性格的索引
-        if isinstance(user_personality_data, int):
-            return XIAOTIAN_SYSTEM_PROMPT[user_personality_data]
-        # 如果是字符串，说明是自定义性格文本
-        elif isinstance(user_personality_data, str):
-            return user_personality_data
-        else:
+        # 按引用查找性格文本（内置、增强或自定义性格表）
+        personality_text = self.personality_table.resolve(self.user_personality[memory_key])
+        if personality_text is None:
             # 兜底：使用第一个内置性格
             return XIAOTIAN_SYSTEM_PROMPT[0]
+        return personality_text
 
     def generate_custom_personality(self, userprompt: str, memory_key: str) -> str:
         """根据用户需求为特定用户生成自定义性格"""
@@ -114,7 +261,7 @@ class XiaotianAI:
             generation_prompt = generation_prompt.replace("{userprompt}", userprompt)
             model = self.current_model
 
-            response = self.client.chat.completions.create(
+            response = self.create_completion(
                 model=model,
                 messages=[
                     {"role": "user", "content": generation_prompt}
@@ -125,7 +272,7 @@ class XiaotianAI:
             generated_personality = BASIC_PROMPT + response.choices[0].message.content.strip() + LAST_PROMOT
 
             # 直接为该用户设置自定义性格
-            self.user_personality[memory_key] = generated_personality
+            self._set_user_personality(memory_key, generated_personality)
             
             print(f"✨ 成功为用户 {memory_key} 生成专属自定义性格")
             
@@ -165,8 +312,7 @@ class XiaotianAI:
         """重置用户性格（随机分配新的内置性格）"""
         if len(XIAOTIAN_SYSTEM_PROMPT) > 0:
             new_personality_index = random.randint(0, len(XIAOTIAN_SYSTEM_PROMPT) - 1)
-            self.user_personality[memory_key] = new_personality_index
-            self.save_memory(MEMORY_FILE)
+            self._set_user_personality(memory_key, new_personality_index)
             
             return f"✨ 已为你重新分配内置性格！新的性格索引：{new_personality_index}"
         else:
@@ -270,7 +416,7 @@ class XiaotianAI:
             
         elif status['total_like'] == 0 and status.get('original_personality') is not None and status.get('last_change_direction') != 'natural':
             # 回到原始性格
-            self.user_personality[memory_key] = status['original_personality']
+            self._set_user_personality(memory_key, status['original_personality'])
             status['last_change_direction'] = 'natural'
             status['original_personality'] = None
             status['speed_multiplier'] = 1.0
@@ -313,8 +459,8 @@ class XiaotianAI:
         
         # status['notified_thresholds'] = notified_thresholds
         
-        # 保存状态到文件
-        self.save_memory(MEMORY_FILE)
+        # 记录like状态变更
+        self.save_like_status(user_id)
         
         return notification_message
     
@@ -366,18 +512,16 @@ class XiaotianAI:
     
     def _adjust_personality_positive(self, memory_key: str):
         """正向性格调整（温柔增强）"""
-        # 随机选择一个增强温和性格
-        new_personality = random.choice(ENHANCED_GENTLE_PERSONALITIES)
-        # 存储为自定义性格文本
-        self.user_personality[memory_key] = new_personality
+        # 随机选择一个增强温和性格，只保存其引用
+        new_personality = enhanced_ref("gentle", random.randrange(len(ENHANCED_GENTLE_PERSONALITIES)))
+        self._set_user_personality(memory_key, new_personality)
         print(f"已为用户 {memory_key} 调整为增强温和性格")
     
     def _adjust_personality_negative(self, memory_key: str):
         """负向性格调整（锐利增强）"""
-        # 随机选择一个增强锐利性格
-        new_personality = random.choice(ENHANCED_SHARP_PERSONALITIES)
-        # 存储为自定义性格文本
-        self.user_personality[memory_key] = new_personality
+        # 随机选择一个增强锐利性格，只保存其引用
+        new_personality = enhanced_ref("sharp", random.randrange(len(ENHANCED_SHARP_PERSONALITIES)))
+        self._set_user_personality(memory_key, new_personality)
         print(f"已为用户 {memory_key} 调整为增强锐利性格")
     
     def find_user_by_partial_id(self, partial_id: str, current_group_id: str = None) -> list:
@@ -408,11 +552,10 @@ class XiaotianAI:
         # 清理旧格式的数据
         for key in keys_to_remove:
             del self.user_like_status[key]
+            self._persist(self.memory_store.set_like_status, key, None)
             print(f"已清理旧格式数据: {key}")
         
-        # 如果清理了数据，保存文件
         if keys_to_remove:
-            self.save_memory(MEMORY_FILE)
             print(f"已清理 {len(keys_to_remove)} 个旧格式的like数据")
         
         return matches
@@ -465,8 +608,9 @@ class XiaotianAI:
         source_status['total_like'] = round(source_like - transfer_amount, 2)
         target_status['total_like'] = round(new_target_like, 2)
         
-        # 保存状态
-        self.save_memory(MEMORY_FILE)
+        # 记录双方的like状态变更
+        self.save_like_status(source_user_id)
+        self.save_like_status(target_user_id)
         
         # 返回结果
         return f"✅ 对冲成功！\n💰 你的like值：{source_like:.2f} → {source_status['total_like']:.2f} (-{transfer_amount:.2f})\n🎯 目标用户like值：{target_like:.2f} → {target_status['total_like']:.2f} (-{actual_effect:.2f})\n💫 手续费：{fee:.2f}"
@@ -488,8 +632,8 @@ class XiaotianAI:
                 'speed_multiplier': 1.0,
                 'personality_change_count': 0
             }
-            # 保存到文件
-            self.save_memory(MEMORY_FILE)
+            # 记录变更
+            self.save_like_status(user_id)
             return f"✅ 已重置用户 {user_id} 的like系统"
         else:
             return f"⚠️ 用户 {user_id} 没有like记录"
@@ -502,13 +646,13 @@ class XiaotianAI:
         
         if status.get('original_personality') is not None:
             # 恢复原始性格
-            self.user_personality[memory_key] = status['original_personality']
+            self._set_user_personality(memory_key, status['original_personality'])
             status['last_change_direction'] = None
             status['original_personality'] = None
             status['total_like'] = 0.0  # 重置like值为浮点数
             
-            # 保存状态
-            self.save_memory(MEMORY_FILE)
+            # 记录变更
+            self.save_like_status(user_id)
             return "😌 好的，我已经恢复成原来的性格啦～感谢你的包容！"
         else:
             return "😊 我现在就是原来的性格哦，没有需要恢复的～"
@@ -524,36 +668,8 @@ class XiaotianAI:
             return "", None, None, False
             
         try:
-            # 预处理：自动修复JSON中的未转义换行符
-            cleaned_response = ai_response.strip()
-            
-            # 检查是否是JSON格式（包含花括号）
-            if '{' in cleaned_response and '}' in cleaned_response:
-                # 智能转义：只转义未转义的特殊字符
-                def smart_escape_json_strings(text):
-                    
-                    field = 'content'
-                    # 匹配特定字段的值：处理多行内容
-                    field_pattern = f'("{field}"\\s*:\\s*")(.*?)("\\s*[,}}])'
-                    
-                    def smart_escape_field_value(match):
-                        prefix = match.group(1)
-                        value = match.group(2)
-                        suffix = match.group(3)
-                        # 智能转义：只转义未转义的字符
-                        fixed_value = value
-                        # 处理换行符：只转义未转义的 \n
-                        # 使用负向前瞻，确保不转义已经转义的 \\n
-                        fixed_value = re.sub(r'(?<!\\)\n', '\\\\n', fixed_value)
-                        # 处理双引号：只转义未转义的 "
-                        fixed_value = re.sub(r'(?<!\\)"', '\\\\"', fixed_value)
-                        return prefix + fixed_value + suffix
-                    text = re.sub(field_pattern, smart_escape_field_value, text, flags=re.DOTALL)
-                    return text
-                cleaned_response = smart_escape_json_strings(cleaned_response)
-            
-            # 尝试直接解析整个响应为JSON
-            full_data = json.loads(cleaned_response)
+            # 标准解析失败时宽松解析，容忍内容中未转义的换行和引号
+            full_data = read_reply_json(ai_response)
             
             # 检查是否是新格式：{"data": [...], "like": 数字}
             if isinstance(full_data, dict) and 'data' in full_data:
@@ -613,27 +729,72 @@ class XiaotianAI:
         return cleaned_response, like_value, wait_time, not_even_wrong
     
     def get_memory(self, memory_key: str) -> List[Dict[str, str]]:
-        """获取指定的记忆"""
-        return self.memory_storage.get(memory_key, [])
-    
-    def detect_emotion(self, message: str) -> str:
-        """检测消息情绪 - 简单的关键词检测，优化性能"""
-        # 冷淡词汇
-        cold_keywords = ['无聊', '没意思', '算了', '不想', '冷', '沉默', '不说话']
-        # 热情词汇  
-        hot_keywords = ['激动', '兴奋', '开心', '高兴', '棒', '太好了', 'amazing', '牛逼', '厉害', '哇', '超级']
+        """获取指定的记忆，不在内存中时从存储读取，并淘汰最久未使用的记忆"""
+        with self.memory_lock:
+            if memory_key in self.memory_storage:
+                self.memory_storage.move_to_end(memory_key)
+                return self.memory_storage[memory_key]
         
-        message_lower = message.lower()
+            try:
+                memories = self.memory_store.load_memory(memory_key)[-MAX_MEMORY_COUNT:]
+            except Exception as e:
+                print(f"❌ 读取记忆失败: {e}")
+                memories = []
+            self.memory_storage[memory_key] = memories
         
-        # 快速检测，一旦找到就返回
-        for word in cold_keywords:
-            if word in message_lower:
-                return 'cold'
-                
-        for word in hot_keywords:
-            if word in message_lower:
-                return 'hot'
-                
+            # 超出常驻上限时淘汰最久未使用的记忆（已写入存储，之后可重新读取）
+            while len(self.memory_storage) > MEMORY_CACHE_SIZE:
+                evicted_key, _ = self.memory_storage.popitem(last=False)
+                self.memory_summaries.pop(evicted_key, None)
+            return memories
+    
+    def get_memory_summary(self, memory_key: str) -> str:
+        """获取指定记忆的长期记忆摘要，没有时返回None"""
+        with self.memory_lock:
+            if memory_key not in self.memory_summaries:
+                try:
+                    self.memory_summaries[memory_key] = self.memory_store.load_summary(memory_key)
+                except Exception as e:
+                    print(f"❌ 读取长期记忆失败: {e}")
+                    return None
+            return self.memory_summaries[memory_key]
+    
+    def apply_memory_summary(self, memory_key: str, summary: str, folded: List[Dict[str, str]]) -> int:
+        """保存新的长期记忆摘要，并移除已折叠进摘要的记忆，返回实际移除的条数
+        
+        折叠期间add_to_memory可能已经截掉了最早的几条，所以只移除记忆开头仍是folded中
+        同一批对象的部分，不会误删还没折叠的对话。
+        记忆在折叠期间被淘汰或重新载入、开头已经对不上时放弃这次摘要并返回0，
+        否则摘要和原始记忆会重复包含同一段对话。
+        """
+        with self.memory_lock:
+            memories = self.memory_storage.get(memory_key)
+            if memories is None:
+                return 0
+            drop = 0
+            for start in range(len(folded)):
+                remaining = folded[start:]
+                if len(remaining) <= len(memories) and all(a is b for a, b in zip(remaining, memories)):
+                    drop = len(remaining)
+                    break
+            if drop == 0:
+                return 0
+            # 原地删除，避免与同时追加的新记忆冲突
+            del memories[:drop]
+            # 存储中的记忆与常驻记忆同步截断，删除同样的条数
+            self.memory_store.set_summary(memory_key, summary, drop)
+            self.memory_summaries[memory_key] = summary
+            return drop
+    
+    def detect_emotion(self, message: str, hits: List[KeywordHit] = None) -> str:
+        """检测消息情绪 - 关键词检测，可以传入已经扫描好的关键词命中结果"""
+        if hits is None:
+            hits = get_keyword_matcher().find_all(message)
+        categories = {hit.category for hit in hits}
+        if 'cold' in categories:
+            return 'cold'
+        if 'hot' in categories:
+            return 'hot'
         return 'neutral'
     
     def _check_rate_limit(self, user_id: str = None) -> bool:
@@ -663,266 +824,260 @@ class XiaotianAI:
         self.api_calls['count'] += 1
         return True
             
-    def get_response(self, user_message: str, user_id: str = None, group_id: str = None, use_tools: bool = False) -> str:
-        """获取AI回复，支持按用户/群组分别记忆"""
-        # 检查是否需要重新加载记忆
-        if self._should_reload_memory(MEMORY_FILE):
-            print("🔄 检测到记忆文件更新，重新加载...")
-            self.load_memory(MEMORY_FILE)
+    def _build_chat_request(self, user_message: str, user_id: str = None, group_id: str = None) -> tuple:
+        """构建一次对话请求，返回 (记忆键, chat.completions.create的参数)"""
+        # 获取记忆键
+        memory_key = self._get_memory_key(user_id, group_id)
         
-        # 检查API调用速率限制
-        if not self._check_rate_limit(user_id):
-            return "请求过于频繁，请稍后再试~"
-            
-        try:
-            # 获取记忆键
-            memory_key = self._get_memory_key(user_id, group_id)
-            
-            # 获取用户的固定性格
-            user_prompt = self.get_user_personality(memory_key)
-            
-            # 获取用户当前的like状态（使用提取的用户ID）
-            extracted_user_id = self._extract_user_id_from_memory_key(memory_key)
-            like_status = self.get_user_like_status(extracted_user_id)
-            current_like = like_status['total_like']
+        # 获取用户的固定性格
+        user_prompt = self.get_user_personality(memory_key)
+        
+        # 获取用户当前的like状态（使用提取的用户ID）
+        extracted_user_id = self._extract_user_id_from_memory_key(memory_key)
+        like_status = self.get_user_like_status(extracted_user_id)
+        current_like = like_status['total_like']
+        
+        # 在系统提示词中添加当前好感度信息
+        emoji, attitude = self.get_like_emotion_and_attitude(current_like)
+        if current_like >= 0:
+            like_info = f"\n\n请以{attitude}的说话方式回复, 说话方式有（友好平和，友好开心，开心愉快，很开心，特别亲近，超级喜欢，非常宠爱，深深喜爱，无比珍视，视为最重要的人，你是我的全世界，超越一切的爱这些），根据现在的好感度调整回复语气，每种方式不会改变回复字数）"
+        else:
+            like_info = f"\n\n请以{attitude}的说话方式回复, 说话方式有（极度愤怒，几乎不想理你，非常生气，态度恶劣，很不高兴，语气冲，不耐烦，敷衍回应，有些厌烦，冷淡疏远，态度平淡，略有不满，有些疑惑，还算友善，友好平和，中性平和这些），根据现在的好感度调整回复语气，每种方式不会改变回复字数）"
+        user_prompt_with_like = user_prompt + like_info
+        if user_id != "system":
+            history = self.get_memory(memory_key)
+            summary = self.get_memory_summary(memory_key)
+            if summary:
+                user_prompt_with_like += f"\n\n你对这位用户的长期记忆（来自更早的聊天）：{summary}"
             
-            # 在系统提示词中添加当前好感度信息
-            emoji, attitude = self.get_like_emotion_and_attitude(current_like)
-            if current_like >= 0:
-                like_info = f"\n\n请以{attitude}的说话方式回复, 说话方式有（友好平和，友好开心，开心愉快，很开心，特别亲近，超级喜欢，非常宠爱，深深喜爱，无比珍视，视为最重要的人，你是我的全世界，超越一切的爱这些），根据现在的好感度调整回复语气，每种方式不会改变回复字数）"
-            else:
-                like_info = f"\n\n请以{attitude}的说话方式回复, 说话方式有（极度愤怒，几乎不想理你，非常生气，态度恶劣，很不高兴，语气冲，不耐烦，敷衍回应，有些厌烦，冷淡疏远，态度平淡，略有不满，有些疑惑，还算友善，友好平和，中性平和这些），根据现在的好感度调整回复语气，每种方式不会改变回复字数）"
-            user_prompt_with_like = user_prompt + like_info
-            if user_id != "system":
-            # 构建消息列表
-                messages = [
-                    {"role": "system", "content": user_prompt_with_like}
-                ]
+            # 构建消息列表：系统提示词 + 预算内最近的记忆 + 当前用户消息
+            messages, dropped = build_messages(user_prompt_with_like, history,
+                                               user_message, self.current_model)
+            if dropped:
+                print(f"✂️ {memory_key} 的上下文超出token预算，省略最早的 {dropped} 条记忆")
+            if self.summarizer.should_summarize(len(history), dropped):
+                # 在后台把最早的对话折叠进长期记忆，不影响本次回复
+                self.summarizer.schedule(memory_key, dropped)
 
-                # 添加对应的记忆
-                messages.extend(self.get_memory(memory_key))
-
-                # 添加当前用户消息
-                messages.append({"role": "user", "content": user_message})
-
-                # 不使用工具的普通调用
-                model = self.current_model
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.6,
-                    response_format={"type": "json_object"}
-                )
-                ai_response = response.choices[0].message.content
-            else:
-                # model = "moonshot-v1-8k"
-                messages = [ {"role": "system", "content": SYSTEM_PROMPT[0]},
-                    {"role": "user", "content": user_message}]
-                response = self.client.chat.completions.create(
-                    model=USE_MODEL,
-                    messages=messages,
-                    temperature=0.6,
-                    )
-                ai_response = response.choices[0].message.content
+            # 不使用工具的普通调用
+            request = {
+                "model": self.current_model,
+                "messages": messages,
+                "temperature": 0.6,
+                "response_format": {"type": "json_object"}
+            }
+        else:
+            # model = "moonshot-v1-8k"
+            messages = [ {"role": "system", "content": SYSTEM_PROMPT[0]},
+                {"role": "user", "content": user_message}]
+            request = {
+                "model": USE_MODEL,
+                "messages": messages,
+                "temperature": 0.6
+            }
+        return memory_key, request
 
+    def _finish_chat(self, memory_key: str, user_message: str, ai_response: str) -> str:
+        """记录本轮对话并返回回复"""
+        # 更新对应的记忆（变更以追加日志的方式持久化）
+        self.add_to_memory(memory_key, "user", user_message)
+        self.add_to_memory(memory_key, "assistant", ai_response)
+        return ai_response
 
-            # 更新对应的记忆
-            self.add_to_memory(memory_key, "user", user_message)
-            self.add_to_memory(memory_key, "assistant", ai_response)
-            
-            # 每次处理完消息后保存记忆
-            self.save_memory(MEMORY_FILE)
+    def _describe_chat_error(self, e: Exception) -> str:
+        """打印调试信息，并把异常转换为给用户的提示"""
+        print(f"🔍 调试信息：")
+        print(f"   - API密钥存在: {'是' if API_KEY else '否'}")
+        print(f"   - 基础URL: {BASE_URL}")
+        print(f"   - 错误类型: {type(e).__name__}")
+        print(f"   - 错误详情: {str(e)}")
+        
+        # 根据错误类型提供不同的提示
+        if "Connection error" in str(e) or "network" in str(e).lower():
+            return "网络连接失败，请检查网络连接或稍后重试。"
+        elif "authentication" in str(e).lower() or "api key" in str(e).lower():
+            return "API密钥验证失败，请检查API密钥环境变量。"
+        elif "rate limit" in str(e).lower():
+            return "API调用频率超限，请稍后重试。"
+        else:
+            return f"抱歉，我遇到了一些问题：{str(e)}"
             
-            return ai_response
+    def _resolve_priority(self, user_id: str, priority: int = None) -> int:
+        """确定调用优先级：未指定时system调用视为后台任务"""
+        if priority is not None:
+            return priority
+        return PRIORITY_BACKGROUND if user_id == "system" else PRIORITY_CHAT
+
+    def get_response(self, user_message: str, user_id: str = None, group_id: str = None, use_tools: bool = False,
+                     priority: int = None) -> str:
+        """获取AI回复，支持按用户/群组分别记忆"""
+        priority = self._resolve_priority(user_id, priority)
+        # 检查API调用速率限制（后台任务只排队，不占用用户的调用额度）
+        if priority != PRIORITY_BACKGROUND and not self._check_rate_limit(user_id):
+            return "请求过于频繁，请稍后再试~"
             
+        try:
+            memory_key, request = self._build_chat_request(user_message, user_id, group_id)
+            if user_id == "system":
+                # system调用不带记忆，相同提示词可以直接复用缓存
+                return self._finish_chat(memory_key, user_message, self._cached_completion(priority, request))
+            response = self.create_completion(priority, **request)
+            return self._finish_chat(memory_key, user_message, response.choices[0].message.content)
         except Exception as e:
-            print(f"🔍 调试信息：")
-            print(f"   - API密钥存在: {'是' if API_KEY else '否'}")
-            print(f"   - 基础URL: {BASE_URL}")
-            print(f"   - 错误类型: {type(e).__name__}")
-            print(f"   - 错误详情: {str(e)}")
+            return self._describe_chat_error(e)
+
+    async def get_response_async(self, user_message: str, user_id: str = None, group_id: str = None, use_tools: bool = False,
+                                 priority: int = None) -> str:
+        """get_response的异步版本，等待模型回复时不阻塞事件循环"""
+        priority = self._resolve_priority(user_id, priority)
+        if priority != PRIORITY_BACKGROUND and not self._check_rate_limit(user_id):
+            return "请求过于频繁，请稍后再试~"
             
-            # 根据错误类型提供不同的提示
-            if "Connection error" in str(e) or "network" in str(e).lower():
-                return "网络连接失败，请检查网络连接或稍后重试。"
-            elif "authentication" in str(e).lower() or "api key" in str(e).lower():
-                return "API密钥验证失败，请检查API密钥环境变量。"
-            elif "rate limit" in str(e).lower():
-                return "API调用频率超限，请稍后重试。"
-            else:
-                return f"抱歉，我遇到了一些问题：{str(e)}"
+        try:
+            memory_key, request = self._build_chat_request(user_message, user_id, group_id)
+            response = await self.create_completion_async(priority, **request)
+            return self._finish_chat(memory_key, user_message, response.choices[0].message.content)
+        except Exception as e:
+            return self._describe_chat_error(e)
     
     
-    def query_with_prompt(self, system_prompt: str, user_query: str) -> str:
+    async def get_response_stream_async(self, user_message: str, user_id: str = None, group_id: str = None,
+                                        use_tools: bool = False, priority: int = None,
+                                        on_part: Callable[[int, int, str], Any] = None) -> str:
+        """流式获取AI回复
+
+        data数组中的每条消息一生成完毕就调用 on_part(index, wait_time, content)，
+        index是该消息在parse_ai_response_for_like解析出的内容列表中的位置（内容为空的消息不回调，但同样占一个位置），
+        返回完整的回复文本，之后仍按原方式解析好感度等字段。
+        消息生成完毕就立即回调，所以not_even_wrong只能阻止带标记的这条及之后的消息：
+        标记出现在后面的消息上时，前面的消息已经发出，剩余的消息由调用方按解析结果丢弃。
+        """
+        priority = self._resolve_priority(user_id, priority)
+        if priority != PRIORITY_BACKGROUND and not self._check_rate_limit(user_id):
+            return "请求过于频繁，请稍后再试~"
+            
+        try:
+            memory_key, request = self._build_chat_request(user_message, user_id, group_id)
+            parser = DataArrayStreamParser()
+            chunks = []
+            index = 0
+            async with get_llm_limiter().async_slot(priority):
+                stream = await self.async_client.chat.completions.create(stream=True, **request)
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    chunks.append(delta)
+                    for item in parser.feed(delta):
+                        if item.get('not_even_wrong'):
+                            # 整条回复都不应发送，之后的消息也不再回调
+                            on_part = None
+                        if 'content' not in item:
+                            continue
+                        if on_part and item['content']:
+                            try:
+                                on_part(index, int(item.get('wait_time', 0)), self._strip_md(str(item['content'])))
+                            except Exception as e:
+                                print(f"❌ 处理流式消息失败: {e}")
+                        index += 1
+            return self._finish_chat(memory_key, user_message, "".join(chunks))
+        except Exception as e:
+            return self._describe_chat_error(e)
+    
+    def query_with_prompt(self, system_prompt: str, user_query: str, priority: int = PRIORITY_BACKGROUND) -> str:
         """使用自定义系统提示词进行查询，主要用于天气等功能"""
         try:
             # 调用API
             # model = "moonshot-v1-8k"
             
-            response = self.client.chat.completions.create(
-                model=USE_MODEL,
-                messages=[
+            request = {
+                "model": USE_MODEL,
+                "messages": [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_query}
                 ],
-                temperature=0.2,
-                response_format={"type": "json_object"}
-            )
+                "temperature": 0.2,
+                "response_format": {"type": "json_object"}
+            }
             
-            return response.choices[0].message.content
+            return self._cached_completion(priority, request)
             
         except Exception as e:
             print(f"❌ 查询API失败: {str(e)}")
             return '{}'
     
     def save_memory(self, file_path: str):
-        """保存记忆、用户性格和like状态到文件"""
+        """保存记忆、用户性格和like状态
+
+        所有变更都已记录在存储中，保存到默认记忆文件时只需写入缓冲并整理存储；
+        保存到其他文件时导出完整数据。
+        """
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # 在保存前，确保每个用户的记忆不超过最大限制
-            for memory_key, memories in self.memory_storage.items():
-                if len(memories) > MAX_MEMORY_COUNT:
-                    # 保留最新的MAX_MEMORY_COUNT条记忆，删除最早的
-                    self.memory_storage[memory_key] = memories[-MAX_MEMORY_COUNT:]
-                    print(f"⚠️ 用户 {memory_key} 的记忆超过限制，已删除最早的 {len(memories) - MAX_MEMORY_COUNT} 条记忆")
-            
-            # 保存记忆、性格映射和like状态
-            save_data = {
-                'memory_storage': self.memory_storage,
-                'user_personality': self.user_personality,
-                'user_like_status': self.user_like_status
-            }
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
+            store = self._get_store(file_path)
+            if store is self.memory_store:
+                self.memory_store.flush()
+                self.memory_store.compact()
+            else:
+                store.save_all(self.memory_store.load())
                 
-            print(f"💾 记忆已保存，包含 {len(self.memory_storage)} 个用户记忆")
+            print(f"💾 记忆已保存，包含 {len(self.user_personality)} 个用户性格")
             
         except Exception as e:
             print(f"❌ 保存记忆文件失败: {e}")
             
     def delete_memory(self, file_path: str, keep_user_personality: bool = True):
-        """将指定文件移动到回收站，并在源目录创建新文件，可选择是否保留user_personality"""
-        try:
-            if not os.path.isfile(file_path):
-                print(f"文件不存在: {file_path}")
-                return
-            # 读取原文件内容
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            user_personality = {}
-            if keep_user_personality and isinstance(data, dict):
-                user_personality = data.get('user_personality', {})
-
-            # 移动到回收站
-            dest_dir = RECYCLE_BIN
-            os.makedirs(dest_dir, exist_ok=True)
-            filename = os.path.basename(file_path)
-            dest_file = os.path.join(dest_dir, filename)
-            os.rename(file_path, dest_file)
-            print(f"已移动文件: {file_path} -> {dest_file}")
-            print(f"✅ 已将文件 {file_path} 移动到回收站 {dest_dir}")
-
-            if keep_user_personality:
-                # 在源目录创建新文件
-                new_data = {
-                    "memory_storage": {},
-                    "user_personality": user_personality,
-                    "user_like_status": {}
-                }
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(new_data, f, ensure_ascii=False, indent=2)
-                print(f"✅ 已在源目录创建新文件: {file_path}，是否保留user_personality: {keep_user_personality}")
-        except Exception as e:
-            print(f"❌ 移动文件或创建新文件失败: {e}")
+        """将记忆数据移动到回收站并清空，可选择是否保留user_personality"""
+        with self.memory_lock:
+            try:
+                store = self._get_store(file_path)
+                user_personality = store.archive(keep_user_personality)
+                if user_personality is None:
+                    return
+            
+                # 当前实例的内存状态同步清空，避免旧状态被再次写回
+                if store is self.memory_store:
+                    self.memory_storage = OrderedDict()
+                    self.memory_summaries = {}
+                    self.user_personality = dict(user_personality)
+                    self.user_like_status = {}
+            except Exception as e:
+                print(f"❌ 移动文件或创建新文件失败: {e}")
     
     def load_memory(self, file_path: str):
-        """从文件加载记忆、用户性格和like状态"""
-        try:
-            if os.path.exists(file_path):
-                # 更新文件修改时间
-                self.memory_file_mtime = os.path.getmtime(file_path)
+        """从存储加载用户性格和like状态，对话记忆在使用时按需读取"""
+        with self.memory_lock:
+            try:
+                store = self._get_store(file_path)
+                if store.exists():
+                    state = store.load_profiles()
                 
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # 兼容旧版本的内存文件格式
-                    if isinstance(data, dict) and 'memory_storage' in data:
-                        # 新格式
-                        memory_storage = data.get('memory_storage', {})
-                        # 在加载时检查每个用户的记忆数量，确保不超过限制
-                        for memory_key, memories in memory_storage.items():
-                            if len(memories) > MAX_MEMORY_COUNT:
-                                memory_storage[memory_key] = memories[-MAX_MEMORY_COUNT:]
-                                print(f"⚠️ 加载记忆时：用户 {memory_key} 的记忆超过限制，已截取最近的 {MAX_MEMORY_COUNT} 条")
+                    # 清空常驻的对话记忆，之后按需重新读取
+                    self.memory_storage = OrderedDict()
+                    self.memory_summaries = {}
+                    self.user_personality = state['user_personality']
+                    self.user_like_status = state['user_like_status']
+                    if store is self.memory_store:
+                        self._migrate_personality_texts()
                         
-                        self.memory_storage = memory_storage
-                        self.user_personality = data.get('user_personality', {})
-                        self.user_like_status = data.get('user_like_status', {})
-                    elif isinstance(data, list):
-                        # 旧格式：直接是memory列表，需要迁移
-                        # 在加载时确保旧格式记忆也不超过限制
-                        if len(data) > MAX_MEMORY_COUNT:
-                            data = data[-MAX_MEMORY_COUNT:]
-                            print(f"⚠️ 加载旧格式记忆时：记忆数量超过限制，已截取最近的 {MAX_MEMORY_COUNT} 条")
-                        self.memory_storage = {'default': data}  # 将旧记忆放入默认键
-                        self.user_personality = {}
-                        self.user_like_status = {}
-                    else:
-                        # 其他旧格式
-                        self.memory_storage = data if isinstance(data, dict) else {}
-                        self.user_personality = {}
-                        self.user_like_status = {}
-                        
-                print(f"✅ 成功加载记忆文件，包含 {len(self.memory_storage)} 个用户记忆")
-            else:
-                print(f"📁 记忆文件不存在，将创建新的记忆文件: {file_path}")
-                # 重置文件修改时间
-                self.memory_file_mtime = 0
+                    print(f"✅ 成功加载记忆，包含 {len(self.user_personality)} 个用户性格，{len(self.user_like_status)} 个like状态")
+                else:
+                    print(f"📁 记忆文件不存在，将创建新的记忆文件: {file_path}")
                 
-        except Exception as e:
-            print(f"❌ 加载记忆文件失败: {e}")
-            # 初始化为空，不影响程序运行
-            self.memory_storage = {}
-            self.user_personality = {}
-            self.user_like_status = {}
-            self.memory_file_mtime = 0
+            except Exception as e:
+                print(f"❌ 加载记忆文件失败: {e}")
+                # 初始化为空，不影响程序运行
+                self.memory_storage = OrderedDict()
+                self.memory_summaries = {}
+                self.user_personality = {}
+                self.user_like_status = {}
 
 
 
     # 移除可能的markdown格式
     def _strip_md(self, t: str) -> str:
-        if not t:
-            return t
-        # 移除代码块
-        t = re.sub(r'```.*?```', '', t, flags=re.DOTALL)
-        # 移除行内代码
-        t = re.sub(r'`([^`]+)`', r'\1', t)
-        # 链接与图片: ![alt](url) 或 [text](url)
-        t = re.sub(r'!\[([^\]]*)\]\([^)]*\)', r'\1', t)
-        t = re.sub(r'\[([^\]]+)\]\([^)]*\)', r'\1', t)
-        # 粗体 / 斜体 / 删除线
-        t = re.sub(r'\*\*\*([^*]+)\*\*\*', r'\1', t)
-        t = re.sub(r'___([^_]+)___', r'\1', t)
-        t = re.sub(r'\*\*([^*]+)\*\*', r'\1', t)
-        t = re.sub(r'__([^_]+)__', r'\1', t)
-        t = re.sub(r'\*([^*]+)\*', r'\1', t)
-        t = re.sub(r'_([^_]+)_', r'\1', t)
-        t = re.sub(r'~~([^~]+)~~', r'\1', t)
-        # 标题前缀
-        t = re.sub(r'^\s{0,3}#{1,6}\s*', '', t, flags=re.MULTILINE)
-        # 引用符号
-        t = re.sub(r'^\s{0,3}>\s?', '', t, flags=re.MULTILINE)
-        # 列表项目符号
-        t = re.sub(r'^\s*[-*+]\s+', '', t, flags=re.MULTILINE)
-        t = re.sub(r'^\s*\d+\.\s+', '', t, flags=re.MULTILINE)
-        # 水平线
-        t = re.sub(r'^\s*([-*_]\s*){3,}$', '', t, flags=re.MULTILINE)
-        # 多余空行
-        t = re.sub(r'\n{3,}', '\n\n', t)
-        return t.strip()
+        return strip_markdown(t)
     
 
     def optimize_text_length(self, text: str, target_min: int = 400, target_max: int = 550) -> str:
@@ -993,7 +1148,8 @@ class XiaotianAI:
         try:
             print(f"正在优化文本长度：原{current_length}字，目标{target_min}-{target_max}字")
             model = self.current_model
-            response = self.client.chat.completions.create(
+            response = self.create_completion(
+                PRIORITY_BACKGROUND,
                 model=model,
                 messages=[
                     {"role": "user", "content": prompt}
@@ -0,0 +1,68 @@
+"""
+小天的对话上下文构建模块
+按模型的token预算挑选要发送的记忆：系统提示词和当前消息必发，
+其余预算从最近的对话往前填，放不下的最早对话被丢弃
+"""
+
+from typing import Dict, List, Tuple
+
+from ..manage.config import MODEL_CONTEXT_BUDGETS, DEFAULT_CONTEXT_BUDGET
+
+
+# 每条消息的角色、分隔符等固定开销
+_MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """快速估算文本的token数，不依赖分词器
+
+    中日韩字符和全角标点大致一个字一个token，其余字符按约4个字符一个token计算，
+    估算值略偏大，保证不会超出模型上下文。
+    """
+    if not text:
+        return 0
+    wide = 0
+    for ch in text:
+        if ord(ch) > 0x2E7F:
+            wide += 1
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """估算单条消息的token数"""
+    return estimate_tokens(message.get('content') or "") + _MESSAGE_OVERHEAD
+
+
+def get_context_budget(model: str) -> int:
+    """获取模型的上下文token预算"""
+    return MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+def select_history(history: List[Dict[str, str]], budget: int) -> Tuple[List[Dict[str, str]], int]:
+    """从最近的记忆往前选取，总token数不超过budget
+
+    返回 (选中的记忆, 被丢弃的最早记忆条数)。选中的部分不会以assistant消息开头，
+    避免模型看到没有提问的回答。
+    """
+    used = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        cost = message_tokens(history[i])
+        if used + cost > budget:
+            break
+        used += cost
+        start = i
+    while start < len(history) and history[start].get('role') == 'assistant':
+        start += 1
+    return history[start:], start
+
+
+def build_messages(system_prompt: str, history: List[Dict[str, str]], user_message: str,
+                   model: str) -> Tuple[List[Dict[str, str]], int]:
+    """构建发送给模型的消息列表，返回 (消息列表, 被丢弃的记忆条数)"""
+    system = {"role": "system", "content": system_prompt}
+    user = {"role": "user", "content": user_message}
+    remaining = get_context_budget(model) - message_tokens(system) - message_tokens(user)
+    selected, dropped = select_history(history, max(0, remaining))
+    return [system] + selected + [user], dropped
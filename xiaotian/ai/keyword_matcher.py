@@ -0,0 +1,141 @@
+"""
+小天的关键词匹配模块
+把情绪关键词、唤醒词以及管理员配置的其他关键词列表编译成一个Aho-Corasick自动机，
+每条消息只扫描一遍就能得到所有命中的关键词及其分类，扫描耗时与关键词数量无关
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+from ..manage.config import EMOTION_KEYWORDS, TRIGGER_WORDS
+
+
+class KeywordHit(NamedTuple):
+    """一次关键词命中：在消息中的起始位置、关键词和所属分类"""
+    start: int
+    keyword: str
+    category: str
+
+
+class KeywordMatcher:
+    """多分类关键词匹配器
+
+    每个分类对应一组关键词，同一个关键词可以属于多个分类，英文按小写匹配。
+    修改分类后在下一次匹配时重新编译自动机，匹配过程中使用的始终是完整编译好的版本。
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]] = None):
+        self.lock = threading.Lock()
+        self.categories: Dict[str, tuple] = {}
+        self.hit_counts: Counter = Counter()
+        # (转移表, 失败指针, 输出表)，None表示需要重新编译
+        self._automaton = None
+        for category, keywords in (categories or {}).items():
+            self.set_category(category, keywords)
+
+    def set_category(self, category: str, keywords: Iterable[str]) -> bool:
+        """设置一个分类的关键词（为空时删除该分类），关键词没有变化时返回False"""
+        keywords = tuple(dict.fromkeys(k for k in keywords if k))
+        with self.lock:
+            if self.categories.get(category, ()) == keywords:
+                return False
+            if keywords:
+                self.categories[category] = keywords
+            else:
+                self.categories.pop(category, None)
+            self._automaton = None
+        return True
+
+    def get_category(self, category: str) -> List[str]:
+        """获取一个分类当前的关键词"""
+        return list(self.categories.get(category, ()))
+
+    def _compile(self):
+        """构建Aho-Corasick自动机：先建关键词前缀树，再按层计算失败指针并合并输出"""
+        goto: List[Dict[str, int]] = [{}]
+        output: List[list] = [[]]
+        for category, keywords in self.categories.items():
+            for keyword in keywords:
+                state = 0
+                for ch in keyword.lower():
+                    next_state = goto[state].get(ch)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][ch] = next_state
+                        goto.append({})
+                        output.append([])
+                    state = next_state
+                output[state].append((len(keyword), keyword, category))
+
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, child in goto[state].items():
+                queue.append(child)
+                target = fail[state]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                fail[child] = goto[target].get(ch, 0)
+                # 合并失败指针上的输出，匹配时不必沿失败链查找
+                output[child] = output[child] + output[fail[child]]
+        return goto, fail, output
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """扫描一遍消息，返回所有命中（按结束位置排序）"""
+        automaton = self._automaton
+        if automaton is None:
+            with self.lock:
+                if self._automaton is None:
+                    self._automaton = self._compile()
+                automaton = self._automaton
+        goto, fail, output = automaton
+
+        hits = []
+        state = 0
+        for i, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for length, keyword, category in output[state]:
+                    hits.append(KeywordHit(i - length + 1, keyword, category))
+        if hits:
+            self.hit_counts.update(hit.category for hit in hits)
+        return hits
+
+    def match_categories(self, text: str) -> Set[str]:
+        """返回消息命中的所有分类"""
+        return {hit.category for hit in self.find_all(text)}
+
+    def get_status(self) -> str:
+        """返回各分类的关键词数量和命中次数"""
+        with self.lock:
+            items = [f"{category} {len(keywords)}个（命中{self.hit_counts[category]}次）"
+                     for category, keywords in self.categories.items()]
+        return "🔑 关键词分类：" + ("，".join(items) if items else "无")
+
+
+def leading_keyword(hits: Iterable[KeywordHit], text: str, category: str):
+    """返回位于消息开头、属于指定分类的最长关键词，没有时返回None"""
+    best = None
+    for hit in hits:
+        if hit.start == 0 and hit.category == category and text.startswith(hit.keyword):
+            if best is None or len(hit.keyword) > len(best):
+                best = hit.keyword
+    return best
+
+
+_MATCHER = None
+_MATCHER_GUARD = threading.Lock()
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    """获取进程内共用的关键词匹配器，默认包含情绪关键词和唤醒词"""
+    global _MATCHER
+    with _MATCHER_GUARD:
+        if _MATCHER is None:
+            categories = dict(EMOTION_KEYWORDS)
+            categories['trigger'] = TRIGGER_WORDS
+            _MATCHER = KeywordMatcher(categories)
+        return _MATCHER
@@ -0,0 +1,148 @@
+"""
+小天的模型调用限流模块
+限制同时进行的模型请求数量，并按优先级分配空闲名额：
+root命令和竞答/案件判定最先，普通聊天其次，海报点评、天气等后台任务最后
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from ..manage.config import LLM_MAX_CONCURRENCY
+
+
+# 优先级，数值越小越先执行
+PRIORITY_URGENT = 0      # root命令、竞答和案件判定
+PRIORITY_CHAT = 1        # 普通聊天
+PRIORITY_BACKGROUND = 2  # 定时任务等后台调用
+
+PRIORITY_NAMES = {
+    PRIORITY_URGENT: "紧急",
+    PRIORITY_CHAT: "聊天",
+    PRIORITY_BACKGROUND: "后台",
+}
+
+
+class _Waiter:
+    """排队中的一次请求，线程用Event等待，协程用Future等待"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+    def wake(self):
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class LLMLimiter:
+    """带优先级的模型调用并发限制
+
+    同时只允许max_concurrency个请求访问模型接口，其余请求按 (优先级, 到达顺序) 排队。
+    线程中的同步调用和事件循环中的异步调用共用同一组名额。
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []
+        self._counter = itertools.count()
+        # 按优先级统计的调用次数，供状态查看
+        self.stats = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def _try_acquire(self, priority: int, waiter: _Waiter) -> bool:
+        """有空闲名额且没有更早排队的请求时直接占用，否则加入队列"""
+        with self._lock:
+            self.stats[priority] = self.stats.get(priority, 0) + 1
+            if self._active < self.max_concurrency and not self._queue:
+                self._active += 1
+                return True
+            heapq.heappush(self._queue, (priority, next(self._counter), waiter))
+            return False
+
+    def _release(self):
+        """释放名额，交给队列中优先级最高的请求"""
+        with self._lock:
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if not waiter.cancelled:
+                    # 名额直接转交，活跃数不变
+                    waiter.wake()
+                    return
+            self._active -= 1
+
+    def _cancel(self, waiter: _Waiter):
+        """放弃排队；如果名额已经转交过来则归还"""
+        with self._lock:
+            waiter.cancelled = True
+            granted = waiter.granted
+        if granted:
+            self._release()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_CHAT):
+        """在线程中占用一个名额"""
+        waiter = _Waiter()
+        if not self._try_acquire(priority, waiter):
+            waiter.event.wait()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self, priority: int = PRIORITY_CHAT):
+        """在事件循环中占用一个名额，等待时不阻塞事件循环"""
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._try_acquire(priority, waiter):
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self._cancel(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def get_status(self) -> str:
+        """返回当前并发和排队情况"""
+        with self._lock:
+            waiting = {}
+            for priority, _, waiter in self._queue:
+                if not waiter.cancelled:
+                    waiting[priority] = waiting.get(priority, 0) + 1
+            lines = [f"🚦 模型调用：进行中 {self._active}/{self.max_concurrency}"]
+            for priority, name in PRIORITY_NAMES.items():
+                lines.append(f"  {name}：排队 {waiting.get(priority, 0)}，累计 {self.stats.get(priority, 0)}")
+            return "\n".join(lines)
+
+
+_LIMITER = None
+_LIMITER_GUARD = threading.Lock()
+
+
+def get_llm_limiter() -> LLMLimiter:
+    """获取进程内共用的模型调用限流器"""
+    global _LIMITER
+    with _LIMITER_GUARD:
+        if _LIMITER is None:
+            _LIMITER = LLMLimiter()
+        return _LIMITER
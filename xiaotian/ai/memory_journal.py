@@ -0,0 +1,247 @@
+"""
+小天的记忆日志模块
+以追加写入的方式记录每一次记忆变更，定期合并为快照
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+from ..manage.config import MAX_MEMORY_COUNT, MEMORY_JOURNAL_COMPACT_THRESHOLD
+
+
+# 同一进程内可能存在多个XiaotianAI实例共用同一份记忆文件，按路径共享锁
+_PATH_LOCKS: Dict[str, threading.RLock] = {}
+_PATH_LOCKS_GUARD = threading.Lock()
+
+
+def _get_path_lock(path: str) -> threading.RLock:
+    """获取指定文件路径对应的进程内锁"""
+    path = os.path.abspath(path)
+    with _PATH_LOCKS_GUARD:
+        if path not in _PATH_LOCKS:
+            _PATH_LOCKS[path] = threading.RLock()
+        return _PATH_LOCKS[path]
+
+
+def empty_state() -> Dict[str, Dict]:
+    """返回空的记忆状态结构"""
+    return {
+        'memory_storage': {},
+        'user_personality': {},
+        'user_like_status': {},
+        'memory_summaries': {}
+    }
+
+
+def normalize_state(data: Any) -> Dict[str, Dict]:
+    """将记忆文件内容统一转换为新格式，兼容旧版本"""
+    if isinstance(data, dict) and 'memory_storage' in data:
+        state = empty_state()
+        state['memory_storage'] = data.get('memory_storage', {}) or {}
+        state['user_personality'] = data.get('user_personality', {}) or {}
+        state['user_like_status'] = data.get('user_like_status', {}) or {}
+        state['memory_summaries'] = data.get('memory_summaries', {}) or {}
+        return state
+    if isinstance(data, list):
+        # 旧格式：直接是memory列表，放入默认键
+        state = empty_state()
+        state['memory_storage'] = {'default': data[-MAX_MEMORY_COUNT:]}
+        return state
+    state = empty_state()
+    state['memory_storage'] = data if isinstance(data, dict) else {}
+    return state
+
+
+def apply_record(state: Dict[str, Dict], record: Dict[str, Any]):
+    """将一条日志记录应用到记忆状态上"""
+    op = record.get('op')
+    key = record.get('key')
+    if key is None:
+        return
+
+    if op == 'mem':
+        memories = state['memory_storage'].setdefault(key, [])
+        memories.append({"role": record.get('role'), "content": record.get('content')})
+        if len(memories) > MAX_MEMORY_COUNT:
+            state['memory_storage'][key] = memories[-MAX_MEMORY_COUNT:]
+    elif op == 'personality':
+        if record.get('value') is None:
+            state['user_personality'].pop(key, None)
+        else:
+            state['user_personality'][key] = record['value']
+    elif op == 'like':
+        if record.get('value') is None:
+            state['user_like_status'].pop(key, None)
+        else:
+            state['user_like_status'][key] = record['value']
+    elif op == 'summary':
+        # 长期记忆摘要，drop为已折叠进摘要、需要从对话记忆开头移除的条数
+        if record.get('value') is None:
+            state['memory_summaries'].pop(key, None)
+        else:
+            state['memory_summaries'][key] = record['value']
+        drop = int(record.get('drop') or 0)
+        if drop and key in state['memory_storage']:
+            state['memory_storage'][key] = state['memory_storage'][key][drop:]
+
+
+class MemoryJournal:
+    """记忆写前日志
+
+    每次变更（记忆追加、性格变化、好感度变化）只追加一行紧凑的JSON记录，
+    记录数超过阈值后将快照与日志合并，写回快照并清空日志。
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str = None,
+                 compact_threshold: int = MEMORY_JOURNAL_COMPACT_THRESHOLD, quiet: bool = False):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_threshold = compact_threshold
+        # 为True时合并不打印日志（用于数量较多的记忆分桶）
+        self.quiet = quiet
+        self.lock = _get_path_lock(snapshot_path)
+        # 当前日志中的记录数（近似值，用于判断何时合并）
+        self.record_count = 0
+
+    def append(self, record: Dict[str, Any]):
+        """追加一条记录到日志"""
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+            self.record_count += 1
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        """一次写入追加多条记录"""
+        if not records:
+            return
+        lines = "".join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n" for record in records)
+        with self.lock:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            self.record_count += len(records)
+
+    def should_compact(self) -> bool:
+        """日志记录是否已超过合并阈值"""
+        return self.record_count >= self.compact_threshold
+
+    def read_records(self) -> List[Dict[str, Any]]:
+        """读取日志中的全部记录，忽略损坏的行（例如写入中断的最后一行）"""
+        records = []
+        if not os.path.exists(self.journal_path):
+            return records
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"⚠️ 跳过损坏的记忆日志记录: {line[:50]}")
+        return records
+
+    def tail_position(self) -> Tuple[int, int]:
+        """返回日志当前的 (inode, 大小)，作为之后读取新增记录的起点"""
+        try:
+            st = os.stat(self.journal_path)
+            return st.st_ino, st.st_size
+        except FileNotFoundError:
+            return 0, 0
+
+    def read_since(self, position: Optional[Tuple[int, int]]) -> Tuple[List[Dict[str, Any]], Tuple[int, int], bool]:
+        """读取position之后新追加的完整记录
+
+        返回 (记录列表, 新的位置, 是否被截断)。日志在position之后被合并清空或替换时，
+        截断标记为True，调用方应以快照为准重新加载。
+        """
+        ino, offset = position or (0, 0)
+        try:
+            with open(self.journal_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                truncated = False
+                if (ino and st.st_ino != ino) or st.st_size < offset:
+                    truncated = True
+                    offset = 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], (0, 0), bool(offset)
+
+        # 只处理以换行结尾的完整记录，写了一半的记录留到下次读取
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line.decode('utf-8')))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                print(f"⚠️ 跳过损坏的记忆日志记录: {line[:50]}")
+        return records, (st.st_ino, offset + end), truncated
+
+    def read_snapshot(self) -> Optional[Any]:
+        """读取快照文件原始内容，不存在时返回None"""
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self) -> Dict[str, Dict]:
+        """读取快照并重放日志，返回完整的记忆状态"""
+        with self.lock:
+            data = self.read_snapshot()
+            state = normalize_state(data) if data is not None else empty_state()
+            records = self.read_records()
+            for record in records:
+                apply_record(state, record)
+            self.record_count = len(records)
+            return state
+
+    def load_with_position(self) -> Tuple[Dict[str, Dict], Tuple[int, int]]:
+        """读取快照并重放日志，同时返回日志已读取到的位置，之后可以用read_since只读取新增的记录"""
+        with self.lock:
+            data = self.read_snapshot()
+            state = normalize_state(data) if data is not None else empty_state()
+            records, position, _ = self.read_since(None)
+            for record in records:
+                apply_record(state, record)
+            self.record_count = len(records)
+            return state, position
+
+    def write_snapshot(self, state: Dict[str, Dict]):
+        """原子地写入快照（先写临时文件再重命名），并清空日志"""
+        with self.lock:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.snapshot_path)
+            self.truncate()
+
+    def truncate(self):
+        """清空日志"""
+        with self.lock:
+            if os.path.exists(self.journal_path):
+                open(self.journal_path, 'w', encoding='utf-8').close()
+            self.record_count = 0
+
+    def compact(self):
+        """将日志合并进快照
+
+        合并基于磁盘上的快照和日志进行，而不是某个实例的内存状态，
+        因此多个实例共用同一份文件时不会互相覆盖。
+        """
+        with self.lock:
+            try:
+                state = self.load()
+                self.write_snapshot(state)
+                if not self.quiet:
+                    print(f"🗜️ 记忆日志已合并进快照 {self.snapshot_path}")
+            except Exception as e:
+                print(f"❌ 合并记忆日志失败: {e}")
@@ -0,0 +1,993 @@
+"""
+小天的记忆存储模块
+为记忆、用户性格和like状态提供统一的存储接口，支持JSON和SQLite两种后端
+
+迁移工具用法：
+    python -m xiaotian.ai.memory_store --to sqlite   # JSON -> SQLite
+    python -m xiaotian.ai.memory_store --to json     # SQLite -> JSON
+"""
+
+import abc
+import atexit
+import copy
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from ..manage.config import (
+    MAX_MEMORY_COUNT, MEMORY_FILE, MEMORY_JOURNAL_FILE, MEMORY_DB_FILE,
+    MEMORY_BACKEND, MEMORY_FLUSH_INTERVAL, MEMORY_SHARD_DIR, MEMORY_SHARD_COUNT,
+    MEMORY_SHARD_COMPACT_THRESHOLD, MEMORY_SHARD_CACHE_SIZE, RECYCLE_BIN
+)
+from .memory_journal import MemoryJournal, empty_state, apply_record
+
+# SQLite变更表中保留的最近变更条数
+_CHANGE_LOG_KEEP = 10000
+
+
+def _snapshot_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """快照文件的 (inode, 修改时间, 大小)，重写快照时会变化；文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class MemoryStore(abc.ABC):
+    """记忆存储接口
+
+    XiaotianAI、LikeManager以及定时清理任务都通过此接口读写数据，
+    每次变更只涉及对应的一条记录，而不是整份数据。
+    后端必须实现所有抽象方法，缺少实现时在创建实例时就会报错。
+    """
+
+    @abc.abstractmethod
+    def exists(self) -> bool:
+        """存储中是否已有数据"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load(self) -> Dict[str, Dict]:
+        """加载全部状态：memory_storage、user_personality、user_like_status、memory_summaries"""
+        raise NotImplementedError
+
+    def load_profiles(self) -> Dict[str, Dict]:
+        """只加载性格和like状态（memory_storage为空），对话记忆按需通过load_memory读取"""
+        state = self.load()
+        state['memory_storage'] = {}
+        return state
+
+    def load_memory(self, memory_key: str) -> List[Dict[str, str]]:
+        """读取单个memory_key的对话记忆"""
+        return self.load()['memory_storage'].get(memory_key, [])
+
+    def load_summary(self, memory_key: str) -> Optional[str]:
+        """读取单个memory_key的长期记忆摘要"""
+        return self.load()['memory_summaries'].get(memory_key)
+
+    @abc.abstractmethod
+    def append_memory(self, memory_key: str, role: str, content: str):
+        """追加一条对话记忆"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_summary(self, memory_key: str, summary: Optional[str], drop: int = 0):
+        """设置长期记忆摘要（None表示删除），并移除已折叠进摘要的最早drop条对话记忆"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_personality(self, memory_key: str, personality_data: Any):
+        """设置用户性格，None表示删除"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_like_status(self, like_key: str, status: Optional[Dict]):
+        """设置用户like状态，None表示删除"""
+        raise NotImplementedError
+
+    def apply_batch(self, memories: List[Tuple[str, str, str]], personalities: Dict[str, Any],
+                    like_status: Dict[str, Optional[Dict]]):
+        """批量写入一组变更
+
+        memories为 (memory_key, role, content) 列表，personalities和like_status为键到新值的映射（None表示删除）
+        """
+        for memory_key, role, content in memories:
+            self.append_memory(memory_key, role, content)
+        for memory_key, personality_data in personalities.items():
+            self.set_personality(memory_key, personality_data)
+        for like_key, status in like_status.items():
+            self.set_like_status(like_key, status)
+
+    def flush(self):
+        """将缓冲中的变更写入存储，无缓冲的后端无需处理"""
+        pass
+
+    @abc.abstractmethod
+    def save_all(self, state: Dict[str, Dict]):
+        """用给定状态完整替换存储内容"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def trim_memories(self, max_count: int = MAX_MEMORY_COUNT) -> int:
+        """将每个记忆键的记忆截断到max_count条，返回删除的条数"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def compact(self):
+        """整理存储（合并日志、回收空间等）"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_like_ranking(self, limit: int = None) -> List[Tuple[str, Dict]]:
+        """按总好感度从高到低返回 (like_key, like状态) 列表"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def archive(self, keep_user_personality: bool = True) -> Optional[Dict[str, Any]]:
+        """将当前数据移入回收站并清空记忆和like状态
+
+        返回保留下来的user_personality，存储中没有数据时返回None
+        """
+        raise NotImplementedError
+
+    def watch_paths(self) -> List[str]:
+        """返回需要监听变化的目录"""
+        return []
+
+    def read_changes(self, paths: List[str] = None) -> Dict[str, Any]:
+        """读取其他实例写入的变更
+
+        paths为发生变化的文件（None表示检查全部）。返回 {"records": 变更记录列表, "reload": 是否需要完整重新加载}，
+        记录格式与日志记录相同：mem记录表示该memory_key的对话记忆有新增，personality/like记录带有最新值。
+        """
+        return {"records": [], "reload": False}
+
+    def close(self):
+        """释放存储占用的资源"""
+        pass
+
+
+class JsonMemoryStore(MemoryStore):
+    """JSON快照 + 追加日志的存储后端，适合小规模部署
+
+    性格和like状态保存在主快照中；对话记忆按memory_key哈希分桶，
+    每个分桶是独立的快照+日志，按需读取，写入时只涉及对应的分桶。
+    """
+
+    def __init__(self, file_path: str = MEMORY_FILE, journal_path: str = None, shard_dir: str = None):
+        self.file_path = file_path
+        is_default = os.path.abspath(file_path) == os.path.abspath(MEMORY_FILE)
+        if journal_path is None and is_default:
+            journal_path = MEMORY_JOURNAL_FILE
+        if shard_dir is None:
+            shard_dir = MEMORY_SHARD_DIR if is_default else os.path.splitext(file_path)[0] + "_shards"
+        self.shard_dir = shard_dir
+        # 提前创建目录，便于监听其中的文件变化
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        os.makedirs(shard_dir, exist_ok=True)
+        self.journal = MemoryJournal(file_path, journal_path)
+        self.lock = self.journal.lock
+        self._shards: Dict[int, MemoryJournal] = {}
+        # 最近读取过的分桶：分桶序号 -> (快照签名, 日志读取位置, 解析后的状态)
+        self._shard_states: "OrderedDict[int, Tuple[Any, Tuple[int, int], Dict]]" = OrderedDict()
+        self._shard_states_lock = threading.Lock()
+        # 本实例的标识，写入每条记录，变更同步时据此跳过自己写入的记录
+        self.source_id = uuid.uuid4().hex[:12]
+        # 每个日志文件已读取到的位置，以及主快照的inode
+        self._positions: Dict[str, Tuple[int, int]] = {}
+        self._snapshot_ino = 0
+        # 合并日志前读到、尚未交给调用方的外部变更
+        self._undelivered: List[Dict[str, Any]] = []
+        self._reload_pending = False
+        self._migrate_inline_memories()
+        self._reset_positions()
+
+    def _shard_index(self, memory_key: str) -> int:
+        """计算memory_key所在的分桶（使用稳定的哈希，保证不同进程结果一致）"""
+        return zlib.crc32(memory_key.encode('utf-8')) % MEMORY_SHARD_COUNT
+
+    def _get_shard(self, index: int) -> MemoryJournal:
+        if index not in self._shards:
+            base = os.path.join(self.shard_dir, f"{index:03d}")
+            self._shards[index] = MemoryJournal(base + ".json", base + ".journal",
+                                                MEMORY_SHARD_COMPACT_THRESHOLD, quiet=True)
+        return self._shards[index]
+
+    def _load_shard(self, index: int) -> Dict[str, Dict]:
+        """读取分桶状态，快照没有被替换时只重放上次读取之后新增的日志记录"""
+        shard = self._get_shard(index)
+        with shard.lock:
+            signature = _snapshot_signature(shard.snapshot_path)
+            with self._shard_states_lock:
+                cached = self._shard_states.get(index)
+            state = None
+            if cached is not None and cached[0] == signature:
+                records, position, truncated = shard.read_since(cached[1])
+                if not truncated:
+                    state = cached[2]
+                    for record in records:
+                        apply_record(state, record)
+            if state is None:
+                state, position = shard.load_with_position()
+            with self._shard_states_lock:
+                self._shard_states[index] = (signature, position, state)
+                self._shard_states.move_to_end(index)
+                while len(self._shard_states) > MEMORY_SHARD_CACHE_SIZE:
+                    self._shard_states.popitem(last=False)
+            return state
+
+    def _existing_shards(self) -> List[MemoryJournal]:
+        """返回磁盘上已存在的分桶"""
+        shards = []
+        for index in range(MEMORY_SHARD_COUNT):
+            shard = self._get_shard(index)
+            if os.path.exists(shard.snapshot_path) or os.path.exists(shard.journal_path):
+                shards.append(shard)
+        return shards
+
+    def _snapshot_inode(self) -> int:
+        try:
+            return os.stat(self.journal.snapshot_path).st_ino
+        except FileNotFoundError:
+            return 0
+
+    def _reset_positions(self):
+        """把所有日志的读取位置设为当前末尾（此前的内容已包含在加载的数据中）"""
+        self._positions = {}
+        for journal in [self.journal] + self._existing_shards():
+            self._positions[journal.journal_path] = journal.tail_position()
+        self._snapshot_ino = self._snapshot_inode()
+
+    def _collect(self, journal: MemoryJournal):
+        """读取日志中新增的外部记录，暂存到待交付列表"""
+        records, position, truncated = journal.read_since(self._positions.get(journal.journal_path))
+        self._positions[journal.journal_path] = position
+        if truncated:
+            self._reload_pending = True
+        self._undelivered.extend(record for record in records if record.get('src') != self.source_id)
+
+    def _after_rewrite(self, journal: MemoryJournal):
+        """本实例重写快照或清空日志后，更新读取位置，避免把自己的操作当作外部变更"""
+        self._positions[journal.journal_path] = journal.tail_position()
+        if journal is self.journal:
+            self._snapshot_ino = self._snapshot_inode()
+
+    def _compact_journal(self, journal: MemoryJournal):
+        with journal.lock:
+            self._collect(journal)
+            journal.compact()
+            self._after_rewrite(journal)
+
+    def _write_snapshot(self, journal: MemoryJournal, state: Dict[str, Dict]):
+        with journal.lock:
+            self._collect(journal)
+            journal.write_snapshot(state)
+            self._after_rewrite(journal)
+
+    def _write_shards(self, memory_storage: Dict[str, List[Dict[str, str]]], merge: bool = False,
+                      summaries: Dict[str, str] = None):
+        """将记忆（和长期记忆摘要）按分桶写入，merge为True时与分桶中已有的记忆合并"""
+        grouped: Dict[int, Dict[str, List]] = {}
+        for memory_key, memories in memory_storage.items():
+            grouped.setdefault(self._shard_index(memory_key), {})[memory_key] = memories
+        grouped_summaries: Dict[int, Dict[str, str]] = {}
+        for memory_key, summary in (summaries or {}).items():
+            index = self._shard_index(memory_key)
+            grouped.setdefault(index, {})
+            grouped_summaries.setdefault(index, {})[memory_key] = summary
+        for index, memories_in_shard in grouped.items():
+            shard = self._get_shard(index)
+            with shard.lock:
+                shard_state = shard.load() if merge else empty_state()
+                for memory_key, memories in memories_in_shard.items():
+                    existing = shard_state['memory_storage'].get(memory_key, [])
+                    shard_state['memory_storage'][memory_key] = (memories + existing)[-MAX_MEMORY_COUNT:]
+                shard_state['memory_summaries'].update(grouped_summaries.get(index, {}))
+                self._write_snapshot(shard, shard_state)
+        if not merge:
+            # 清空不再包含任何记忆的旧分桶
+            for shard in self._existing_shards():
+                index = int(os.path.basename(shard.snapshot_path).split('.')[0])
+                if index not in grouped:
+                    self._write_snapshot(shard, empty_state())
+
+    def _migrate_inline_memories(self):
+        """将旧版本保存在主文件中的记忆迁移到分桶"""
+        try:
+            with self.lock:
+                if not self.exists():
+                    return
+                state = self.journal.load()
+                if not state['memory_storage']:
+                    return
+                self._write_shards(state['memory_storage'], merge=True)
+                print(f"📦 已将 {len(state['memory_storage'])} 个用户记忆迁移到分桶目录 {self.shard_dir}")
+                state['memory_storage'] = {}
+                self.journal.write_snapshot(state)
+        except Exception as e:
+            print(f"❌ 迁移记忆到分桶失败: {e}")
+
+    def _append(self, *records: Dict[str, Any]):
+        with self.lock:
+            self.journal.append_many([dict(record, src=self.source_id) for record in records])
+            if self.journal.should_compact():
+                self._compact_journal(self.journal)
+
+    def _append_memories(self, memories: List[Tuple[str, str, str]]):
+        """按分桶追加记忆记录"""
+        grouped: Dict[int, List[Dict[str, Any]]] = {}
+        for memory_key, role, content in memories:
+            grouped.setdefault(self._shard_index(memory_key), []).append(
+                {"op": "mem", "key": memory_key, "role": role, "content": content, "src": self.source_id})
+        for index, records in grouped.items():
+            shard = self._get_shard(index)
+            with shard.lock:
+                shard.append_many(records)
+                if shard.should_compact():
+                    self._compact_journal(shard)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.journal.snapshot_path) or os.path.exists(self.journal.journal_path)
+
+    def load(self) -> Dict[str, Dict]:
+        state = self.load_profiles()
+        for shard in self._existing_shards():
+            shard_state = shard.load()
+            state['memory_storage'].update(shard_state['memory_storage'])
+            state['memory_summaries'].update(shard_state['memory_summaries'])
+        return state
+
+    def load_profiles(self) -> Dict[str, Dict]:
+        with self.lock:
+            state = self.journal.load()
+            state['memory_storage'] = {}
+            # 重新加载后，之前未交付的变更都已包含在内
+            self._reset_positions()
+            self._undelivered = []
+            self._reload_pending = False
+            return state
+
+    def load_memory(self, memory_key: str) -> List[Dict[str, str]]:
+        # 返回副本，缓存中的列表之后还会被新的日志记录修改
+        return list(self._load_shard(self._shard_index(memory_key))['memory_storage'].get(memory_key, []))
+
+    def load_summary(self, memory_key: str) -> Optional[str]:
+        return self._load_shard(self._shard_index(memory_key))['memory_summaries'].get(memory_key)
+
+    def append_memory(self, memory_key: str, role: str, content: str):
+        self._append_memories([(memory_key, role, content)])
+
+    def set_summary(self, memory_key: str, summary: Optional[str], drop: int = 0):
+        # 摘要和它折叠掉的记忆写在同一个分桶日志中，重放时保持一致
+        shard = self._get_shard(self._shard_index(memory_key))
+        with shard.lock:
+            shard.append({"op": "summary", "key": memory_key, "value": summary, "drop": drop, "src": self.source_id})
+            if shard.should_compact():
+                self._compact_journal(shard)
+
+    def set_personality(self, memory_key: str, personality_data: Any):
+        self._append({"op": "personality", "key": memory_key, "value": personality_data})
+
+    def set_like_status(self, like_key: str, status: Optional[Dict]):
+        self._append({"op": "like", "key": like_key, "value": status})
+
+    def apply_batch(self, memories: List[Tuple[str, str, str]], personalities: Dict[str, Any],
+                    like_status: Dict[str, Optional[Dict]]):
+        if memories:
+            self._append_memories(memories)
+        records = [{"op": "personality", "key": memory_key, "value": value}
+                   for memory_key, value in personalities.items()]
+        records.extend({"op": "like", "key": like_key, "value": status}
+                       for like_key, status in like_status.items())
+        if records:
+            self._append(*records)
+
+    def save_all(self, state: Dict[str, Dict]):
+        with self.lock:
+            self._write_shards(state.get('memory_storage', {}), summaries=state.get('memory_summaries', {}))
+            profiles = empty_state()
+            profiles['user_personality'] = state.get('user_personality', {})
+            profiles['user_like_status'] = state.get('user_like_status', {})
+            self._write_snapshot(self.journal, profiles)
+
+    def trim_memories(self, max_count: int = MAX_MEMORY_COUNT) -> int:
+        removed = 0
+        for shard in self._existing_shards():
+            with shard.lock:
+                shard_state = shard.load()
+                for memory_key, memories in shard_state['memory_storage'].items():
+                    if len(memories) > max_count:
+                        removed += len(memories) - max_count
+                        shard_state['memory_storage'][memory_key] = memories[-max_count:]
+                self._write_snapshot(shard, shard_state)
+        return removed
+
+    def compact(self):
+        self._compact_journal(self.journal)
+        for shard in self._existing_shards():
+            if shard.tail_position()[1] > 0:
+                self._compact_journal(shard)
+
+    def get_like_ranking(self, limit: int = None) -> List[Tuple[str, Dict]]:
+        with self.lock:
+            like_status = self.journal.load()['user_like_status']
+        ranking = sorted(like_status.items(), key=lambda item: item[1].get('total_like', 0), reverse=True)
+        return ranking[:limit] if limit else ranking
+
+    def archive(self, keep_user_personality: bool = True) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            # 先将未合并的日志写入快照，保证回收站中的数据完整
+            self._compact_journal(self.journal)
+
+            if not os.path.isfile(self.file_path):
+                print(f"文件不存在: {self.file_path}")
+                return None
+            # 读取原文件内容
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            user_personality = {}
+            if keep_user_personality and isinstance(data, dict):
+                user_personality = data.get('user_personality', {})
+
+            # 移动到回收站（主文件和记忆分桶目录）
+            dest_dir = RECYCLE_BIN
+            os.makedirs(dest_dir, exist_ok=True)
+            filename = os.path.basename(self.file_path)
+            dest_file = os.path.join(dest_dir, filename)
+            os.replace(self.file_path, dest_file)
+            self.journal.truncate()
+            print(f"已移动文件: {self.file_path} -> {dest_file}")
+            if os.path.isdir(self.shard_dir):
+                dest_shard_dir = os.path.join(dest_dir, os.path.basename(os.path.normpath(self.shard_dir)))
+                if os.path.isdir(dest_shard_dir):
+                    shutil.rmtree(dest_shard_dir)
+                shutil.move(self.shard_dir, dest_shard_dir)
+                self._shards = {}
+                print(f"已移动记忆分桶: {self.shard_dir} -> {dest_shard_dir}")
+            print(f"✅ 已将文件 {self.file_path} 移动到回收站 {dest_dir}")
+
+            if keep_user_personality:
+                # 在源目录创建新文件
+                new_data = empty_state()
+                new_data['user_personality'] = user_personality
+                self.journal.write_snapshot(new_data)
+                print(f"✅ 已在源目录创建新文件: {self.file_path}，是否保留user_personality: {keep_user_personality}")
+            self._reset_positions()
+            return user_personality
+
+    def watch_paths(self) -> List[str]:
+        return [os.path.abspath(os.path.dirname(self.file_path) or "."), os.path.abspath(self.shard_dir)]
+
+    def _journal_for_path(self, path: str) -> Optional[MemoryJournal]:
+        """根据发生变化的文件路径找到对应的日志"""
+        path = os.path.abspath(path)
+        if path in (os.path.abspath(self.journal.journal_path), os.path.abspath(self.journal.snapshot_path)):
+            return self.journal
+        if os.path.dirname(path) == os.path.abspath(self.shard_dir):
+            name = os.path.basename(path)
+            if name.endswith(".journal") and name[:-len(".journal")].isdigit():
+                return self._get_shard(int(name[:-len(".journal")]))
+        return None
+
+    def read_changes(self, paths: List[str] = None) -> Dict[str, Any]:
+        with self.lock:
+            if paths is None:
+                journals = [self.journal] + self._existing_shards()
+                check_snapshot = True
+            else:
+                journals = []
+                for path in paths:
+                    journal = self._journal_for_path(path)
+                    if journal is not None and journal not in journals:
+                        journals.append(journal)
+                check_snapshot = self.journal in journals
+
+            for journal in journals:
+                with journal.lock:
+                    self._collect(journal)
+
+            # 主快照被其他实例替换（整体保存、归档等）时需要完整重新加载
+            if check_snapshot:
+                snapshot_ino = self._snapshot_inode()
+                if snapshot_ino != self._snapshot_ino:
+                    self._snapshot_ino = snapshot_ino
+                    self._reload_pending = True
+
+            changes = {"records": self._undelivered, "reload": self._reload_pending}
+            self._undelivered = []
+            self._reload_pending = False
+            return changes
+
+
+class SqliteMemoryStore(MemoryStore):
+    """SQLite存储后端，按memory_key和用户索引，单次变更只触及对应的行"""
+
+    def __init__(self, db_path: str = MEMORY_DB_FILE):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS memories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                memory_key TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_memories_key ON memories(memory_key, id);
+            CREATE TABLE IF NOT EXISTS personalities (
+                memory_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS like_status (
+                like_key TEXT PRIMARY KEY,
+                total_like REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_like_total ON like_status(total_like);
+            CREATE TABLE IF NOT EXISTS memory_summaries (
+                memory_key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                op TEXT NOT NULL,
+                key TEXT
+            );
+        """)
+        self.conn.commit()
+        # 本实例的标识，变更同步时据此跳过自己写入的变更
+        self.source_id = uuid.uuid4().hex[:12]
+        self._change_cursor = self._latest_change_id()
+
+    def _latest_change_id(self) -> int:
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+
+    def _record_change(self, op: str, key: str = None):
+        self.conn.execute("INSERT INTO changes (source, op, key) VALUES (?, ?, ?)", (self.source_id, op, key))
+
+    def exists(self) -> bool:
+        return True
+
+    def load(self) -> Dict[str, Dict]:
+        with self.lock:
+            self._change_cursor = self._latest_change_id()
+            state = empty_state()
+            for memory_key, role, content in self.conn.execute(
+                    "SELECT memory_key, role, content FROM memories ORDER BY memory_key, id"):
+                state['memory_storage'].setdefault(memory_key, []).append({"role": role, "content": content})
+            for memory_key, value in self.conn.execute("SELECT memory_key, value FROM personalities"):
+                state['user_personality'][memory_key] = json.loads(value)
+            for like_key, status in self.conn.execute("SELECT like_key, status FROM like_status"):
+                state['user_like_status'][like_key] = json.loads(status)
+            for memory_key, summary in self.conn.execute("SELECT memory_key, summary FROM memory_summaries"):
+                state['memory_summaries'][memory_key] = summary
+            return state
+
+    def load_profiles(self) -> Dict[str, Dict]:
+        with self.lock:
+            self._change_cursor = self._latest_change_id()
+            state = empty_state()
+            for memory_key, value in self.conn.execute("SELECT memory_key, value FROM personalities"):
+                state['user_personality'][memory_key] = json.loads(value)
+            for like_key, status in self.conn.execute("SELECT like_key, status FROM like_status"):
+                state['user_like_status'][like_key] = json.loads(status)
+            return state
+
+    def load_memory(self, memory_key: str) -> List[Dict[str, str]]:
+        with self.lock:
+            return [{"role": role, "content": content} for role, content in self.conn.execute(
+                "SELECT role, content FROM memories WHERE memory_key = ? ORDER BY id", (memory_key,))]
+
+    def load_summary(self, memory_key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT summary FROM memory_summaries WHERE memory_key = ?", (memory_key,)).fetchone()
+            return row[0] if row else None
+
+    def set_summary(self, memory_key: str, summary: Optional[str], drop: int = 0):
+        with self.lock, self.conn:
+            if summary is None:
+                self.conn.execute("DELETE FROM memory_summaries WHERE memory_key = ?", (memory_key,))
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO memory_summaries (memory_key, summary) VALUES (?, ?)",
+                    (memory_key, summary))
+            if drop:
+                self.conn.execute(
+                    "DELETE FROM memories WHERE id IN "
+                    "(SELECT id FROM memories WHERE memory_key = ? ORDER BY id LIMIT ?)",
+                    (memory_key, drop))
+            self._record_change("summary", memory_key)
+
+    def append_memory(self, memory_key: str, role: str, content: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO memories (memory_key, role, content) VALUES (?, ?, ?)",
+                (memory_key, role, content))
+            # 只保留该记忆键最近的MAX_MEMORY_COUNT条
+            self.conn.execute(
+                "DELETE FROM memories WHERE memory_key = ? AND id <= "
+                "(SELECT id FROM memories WHERE memory_key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (memory_key, memory_key, MAX_MEMORY_COUNT))
+            self._record_change("mem", memory_key)
+
+    def _write_personality(self, memory_key: str, personality_data: Any):
+        self._record_change("personality", memory_key)
+        if personality_data is None:
+            self.conn.execute("DELETE FROM personalities WHERE memory_key = ?", (memory_key,))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO personalities (memory_key, value) VALUES (?, ?)",
+                (memory_key, json.dumps(personality_data, ensure_ascii=False)))
+
+    def _write_like_status(self, like_key: str, status: Optional[Dict]):
+        self._record_change("like", like_key)
+        if status is None:
+            self.conn.execute("DELETE FROM like_status WHERE like_key = ?", (like_key,))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO like_status (like_key, total_like, status) VALUES (?, ?, ?)",
+                (like_key, status.get('total_like', 0), json.dumps(status, ensure_ascii=False)))
+
+    def set_personality(self, memory_key: str, personality_data: Any):
+        with self.lock, self.conn:
+            self._write_personality(memory_key, personality_data)
+
+    def set_like_status(self, like_key: str, status: Optional[Dict]):
+        with self.lock, self.conn:
+            self._write_like_status(like_key, status)
+
+    def apply_batch(self, memories: List[Tuple[str, str, str]], personalities: Dict[str, Any],
+                    like_status: Dict[str, Optional[Dict]]):
+        # 整批变更在一个事务中提交
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO memories (memory_key, role, content) VALUES (?, ?, ?)", memories)
+            for memory_key in {memory[0] for memory in memories}:
+                self.conn.execute(
+                    "DELETE FROM memories WHERE memory_key = ? AND id <= "
+                    "(SELECT id FROM memories WHERE memory_key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (memory_key, memory_key, MAX_MEMORY_COUNT))
+                self._record_change("mem", memory_key)
+            for memory_key, personality_data in personalities.items():
+                self._write_personality(memory_key, personality_data)
+            for like_key, status in like_status.items():
+                self._write_like_status(like_key, status)
+
+    def save_all(self, state: Dict[str, Dict]):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM memories")
+            self.conn.execute("DELETE FROM personalities")
+            self.conn.execute("DELETE FROM like_status")
+            self.conn.execute("DELETE FROM memory_summaries")
+            self.conn.executemany(
+                "INSERT INTO memory_summaries (memory_key, summary) VALUES (?, ?)",
+                [(memory_key, summary) for memory_key, summary in state.get('memory_summaries', {}).items()
+                 if summary is not None])
+            self.conn.executemany(
+                "INSERT INTO memories (memory_key, role, content) VALUES (?, ?, ?)",
+                [(memory_key, m.get('role'), m.get('content'))
+                 for memory_key, memories in state.get('memory_storage', {}).items()
+                 for m in memories[-MAX_MEMORY_COUNT:]])
+            self.conn.executemany(
+                "INSERT INTO personalities (memory_key, value) VALUES (?, ?)",
+                [(memory_key, json.dumps(value, ensure_ascii=False))
+                 for memory_key, value in state.get('user_personality', {}).items() if value is not None])
+            self.conn.executemany(
+                "INSERT INTO like_status (like_key, total_like, status) VALUES (?, ?, ?)",
+                [(like_key, status.get('total_like', 0), json.dumps(status, ensure_ascii=False))
+                 for like_key, status in state.get('user_like_status', {}).items()])
+            self._record_change("reload")
+
+    def trim_memories(self, max_count: int = MAX_MEMORY_COUNT) -> int:
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM memories WHERE id IN ("
+                "SELECT id FROM (SELECT id, ROW_NUMBER() OVER "
+                "(PARTITION BY memory_key ORDER BY id DESC) AS rn FROM memories) WHERE rn > ?)",
+                (max_count,))
+            return cursor.rowcount
+
+    def compact(self):
+        with self.lock:
+            # 变更表只保留最近的一部分，足够其他实例追上
+            with self.conn:
+                self.conn.execute("DELETE FROM changes WHERE id <= ?",
+                                  (self._latest_change_id() - _CHANGE_LOG_KEEP,))
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.execute("PRAGMA optimize")
+
+    def get_like_ranking(self, limit: int = None) -> List[Tuple[str, Dict]]:
+        with self.lock:
+            sql = "SELECT like_key, status FROM like_status ORDER BY total_like DESC"
+            params = ()
+            if limit:
+                sql += " LIMIT ?"
+                params = (limit,)
+            return [(like_key, json.loads(status)) for like_key, status in self.conn.execute(sql, params)]
+
+    def archive(self, keep_user_personality: bool = True) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            # 备份整个数据库到回收站
+            dest_dir = RECYCLE_BIN
+            os.makedirs(dest_dir, exist_ok=True)
+            dest_file = os.path.join(dest_dir, os.path.basename(self.db_path))
+            if os.path.exists(dest_file):
+                os.remove(dest_file)
+            backup_conn = sqlite3.connect(dest_file)
+            try:
+                self.conn.backup(backup_conn)
+            finally:
+                backup_conn.close()
+            print(f"✅ 已将数据库 {self.db_path} 备份到回收站 {dest_file}")
+
+            user_personality = {}
+            with self.conn:
+                self.conn.execute("DELETE FROM memories")
+                self.conn.execute("DELETE FROM memory_summaries")
+                self.conn.execute("DELETE FROM like_status")
+                if keep_user_personality:
+                    for memory_key, value in self.conn.execute("SELECT memory_key, value FROM personalities"):
+                        user_personality[memory_key] = json.loads(value)
+                else:
+                    self.conn.execute("DELETE FROM personalities")
+                self._record_change("reload")
+            print(f"✅ 已清空记忆和like状态，是否保留user_personality: {keep_user_personality}")
+            return user_personality
+
+    def watch_paths(self) -> List[str]:
+        return [os.path.abspath(os.path.dirname(self.db_path) or ".")]
+
+    def read_changes(self, paths: List[str] = None) -> Dict[str, Any]:
+        if paths is not None and not any(
+                os.path.basename(path).startswith(os.path.basename(self.db_path)) for path in paths):
+            return {"records": [], "reload": False}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, source, op, key FROM changes WHERE id > ? ORDER BY id",
+                (self._change_cursor,)).fetchall()
+            if not rows:
+                return {"records": [], "reload": False}
+            self._change_cursor = rows[-1][0]
+
+            records = []
+            reload = False
+            seen = set()
+            for _, source, op, key in rows:
+                if source == self.source_id or (op, key) in seen:
+                    continue
+                seen.add((op, key))
+                if op == "reload":
+                    reload = True
+                elif op in ("mem", "summary"):
+                    records.append({"op": op, "key": key})
+                elif op == "personality":
+                    row = self.conn.execute("SELECT value FROM personalities WHERE memory_key = ?", (key,)).fetchone()
+                    records.append({"op": "personality", "key": key, "value": json.loads(row[0]) if row else None})
+                elif op == "like":
+                    row = self.conn.execute("SELECT status FROM like_status WHERE like_key = ?", (key,)).fetchone()
+                    records.append({"op": "like", "key": key, "value": json.loads(row[0]) if row else None})
+            return {"records": records, "reload": reload}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# 所有带写缓冲的存储，由同一个后台线程定期写入
+_BUFFERED_STORES = weakref.WeakSet()
+_FLUSHER_GUARD = threading.Lock()
+_flusher_thread = None
+
+
+def flush_all_memory_stores():
+    """立即写入所有存储中缓冲的变更（后台线程定期调用，进程退出时也会调用）"""
+    for store in list(_BUFFERED_STORES):
+        store.flush()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(MEMORY_FLUSH_INTERVAL)
+        try:
+            flush_all_memory_stores()
+        except Exception as e:
+            print(f"❌ 后台写入记忆失败: {e}")
+
+
+def _ensure_flusher_started():
+    global _flusher_thread
+    with _FLUSHER_GUARD:
+        if _flusher_thread is None:
+            _flusher_thread = threading.Thread(target=_flush_loop, name="memory-flusher", daemon=True)
+            _flusher_thread.start()
+            atexit.register(flush_all_memory_stores)
+
+
+class BufferedMemoryStore(MemoryStore):
+    """带写缓冲的存储包装
+
+    热路径上的变更只记录到待写队列中（同一键的性格和like状态只保留最新值），
+    由后台线程每隔MEMORY_FLUSH_INTERVAL秒合并为一次批量写入。
+    读取、整理、归档等操作以及进程退出前都会先写入待写变更。
+    """
+
+    def __init__(self, inner: MemoryStore):
+        self.inner = inner
+        # lock保护待写队列，flush_lock保证批量写入与整体写入不会交错
+        self.lock = threading.RLock()
+        self.flush_lock = threading.RLock()
+        self._pending_memories: List[Tuple[str, str, str]] = []
+        self._pending_personalities: Dict[str, Any] = {}
+        self._pending_like_status: Dict[str, Optional[Dict]] = {}
+        _BUFFERED_STORES.add(self)
+        _ensure_flusher_started()
+
+    def is_dirty(self) -> bool:
+        """是否有尚未写入的变更"""
+        with self.lock:
+            return bool(self._pending_memories or self._pending_personalities or self._pending_like_status)
+
+    def _clear_pending(self):
+        self._pending_memories = []
+        self._pending_personalities = {}
+        self._pending_like_status = {}
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.is_dirty():
+                    return
+                memories = self._pending_memories
+                personalities = self._pending_personalities
+                like_status = self._pending_like_status
+                self._clear_pending()
+            try:
+                self.inner.apply_batch(memories, personalities, like_status)
+            except Exception as e:
+                print(f"❌ 写入记忆变更失败，将在下次重试: {e}")
+                # 放回待写队列，保持原有顺序
+                with self.lock:
+                    self._pending_memories = memories + self._pending_memories
+                    personalities.update(self._pending_personalities)
+                    like_status.update(self._pending_like_status)
+                    self._pending_personalities = personalities
+                    self._pending_like_status = like_status
+
+    def exists(self) -> bool:
+        return self.is_dirty() or self.inner.exists()
+
+    def load(self) -> Dict[str, Dict]:
+        self.flush()
+        return self.inner.load()
+
+    def load_profiles(self) -> Dict[str, Dict]:
+        self.flush()
+        return self.inner.load_profiles()
+
+    def load_memory(self, memory_key: str) -> List[Dict[str, str]]:
+        self.flush()
+        return self.inner.load_memory(memory_key)
+
+    def load_summary(self, memory_key: str) -> Optional[str]:
+        self.flush()
+        return self.inner.load_summary(memory_key)
+
+    def set_summary(self, memory_key: str, summary: Optional[str], drop: int = 0):
+        # 先写入待写的记忆，保证drop针对的是已经落盘的最早记忆
+        with self.flush_lock:
+            self.flush()
+            self.inner.set_summary(memory_key, summary, drop)
+
+    def append_memory(self, memory_key: str, role: str, content: str):
+        with self.lock:
+            self._pending_memories.append((memory_key, role, content))
+
+    def set_personality(self, memory_key: str, personality_data: Any):
+        with self.lock:
+            self._pending_personalities[memory_key] = personality_data
+
+    def set_like_status(self, like_key: str, status: Optional[Dict]):
+        # 复制一份，避免调用方之后修改状态时与后台写入冲突
+        with self.lock:
+            self._pending_like_status[like_key] = copy.deepcopy(status)
+
+    def apply_batch(self, memories: List[Tuple[str, str, str]], personalities: Dict[str, Any],
+                    like_status: Dict[str, Optional[Dict]]):
+        with self.lock:
+            self._pending_memories.extend(memories)
+            self._pending_personalities.update(personalities)
+            self._pending_like_status.update(copy.deepcopy(like_status))
+
+    def save_all(self, state: Dict[str, Dict]):
+        # 整体写入已包含所有待写变更，直接丢弃待写队列
+        with self.flush_lock:
+            with self.lock:
+                self._clear_pending()
+            self.inner.save_all(state)
+
+    def trim_memories(self, max_count: int = MAX_MEMORY_COUNT) -> int:
+        with self.flush_lock:
+            self.flush()
+            return self.inner.trim_memories(max_count)
+
+    def compact(self):
+        with self.flush_lock:
+            self.flush()
+            self.inner.compact()
+
+    def get_like_ranking(self, limit: int = None) -> List[Tuple[str, Dict]]:
+        self.flush()
+        return self.inner.get_like_ranking(limit)
+
+    def archive(self, keep_user_personality: bool = True) -> Optional[Dict[str, Any]]:
+        with self.flush_lock:
+            self.flush()
+            return self.inner.archive(keep_user_personality)
+
+    def watch_paths(self) -> List[str]:
+        return self.inner.watch_paths()
+
+    def read_changes(self, paths: List[str] = None) -> Dict[str, Any]:
+        return self.inner.read_changes(paths)
+
+    def close(self):
+        self.flush()
+        _BUFFERED_STORES.discard(self)
+        self.inner.close()
+
+
+def create_memory_store(backend: str = None) -> MemoryStore:
+    """根据配置创建记忆存储后端"""
+    backend = (backend or MEMORY_BACKEND).lower()
+    if backend == "sqlite":
+        store = SqliteMemoryStore(MEMORY_DB_FILE)
+    else:
+        store = JsonMemoryStore(MEMORY_FILE, MEMORY_JOURNAL_FILE)
+    if MEMORY_FLUSH_INTERVAL > 0:
+        return BufferedMemoryStore(store)
+    return store
+
+
+def migrate_memory(source: MemoryStore, target: MemoryStore) -> Dict[str, int]:
+    """将source中的全部数据一次性写入target，返回迁移的数量统计"""
+    state = source.load()
+    target.save_all(state)
+    return {
+        "memory_keys": len(state['memory_storage']),
+        "personalities": len(state['user_personality']),
+        "like_status": len(state['user_like_status'])
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="小天记忆存储迁移工具")
+    parser.add_argument("--to", choices=["sqlite", "json"], required=True, help="迁移目标后端")
+    args = parser.parse_args()
+
+    if args.to == "sqlite":
+        source_store, target_store = create_memory_store("json"), create_memory_store("sqlite")
+    else:
+        source_store, target_store = create_memory_store("sqlite"), create_memory_store("json")
+
+    result = migrate_memory(source_store, target_store)
+    source_store.close()
+    target_store.close()
+    print(f"✅ 迁移完成：{result['memory_keys']} 个记忆键，{result['personalities']} 个性格，{result['like_status']} 个like状态")
+    print(f"💡 请在config.py中将 MEMORY_BACKEND 设置为 \"{args.to}\"")
@@ -0,0 +1,101 @@
+"""
+小天的长期记忆模块
+对话记忆过长时，在后台把最早的几轮对话折叠成每个用户一段的长期记忆摘要，
+摘要随系统提示词发送，既保持对话连贯，又让每次请求的提示词保持简短
+"""
+
+import threading
+import time
+from typing import Dict
+
+from ..manage.config import (
+    MEMORY_SUMMARY_PROMPT, MEMORY_SUMMARY_THRESHOLD, MEMORY_SUMMARY_BATCH,
+    MEMORY_SUMMARY_MAX_CHARS, MEMORY_SUMMARY_DELAY
+)
+from .llm_limiter import PRIORITY_BACKGROUND
+
+
+class MemorySummarizer:
+    """后台长期记忆摘要器
+
+    聊天时只登记需要折叠的memory_key，由后台线程每隔MEMORY_SUMMARY_DELAY秒合批处理，
+    以后台优先级调用模型，不占用聊天的并发名额和调用额度。
+    """
+
+    def __init__(self, ai, delay: float = MEMORY_SUMMARY_DELAY):
+        self.ai = ai
+        self.delay = delay
+        self.lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # memory_key -> 超出token预算被省略的记忆条数
+        self._pending: Dict[str, int] = {}
+        self._thread = None
+
+    def should_summarize(self, history_length: int, dropped: int = 0) -> bool:
+        """记忆超出token预算或达到条数阈值时需要折叠"""
+        return dropped > 0 or history_length >= MEMORY_SUMMARY_THRESHOLD
+
+    def schedule(self, memory_key: str, dropped: int = 0):
+        """登记一个需要折叠的memory_key（重复登记会合并）"""
+        with self.lock:
+            self._pending[memory_key] = max(self._pending.get(memory_key, 0), dropped)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-summarizer", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # 稍等片刻，把同一时间段内登记的键合并成一批
+            time.sleep(self.delay)
+            with self.lock:
+                self._wakeup.clear()
+                batch = self._pending
+                self._pending = {}
+            for memory_key, dropped in batch.items():
+                try:
+                    self.summarize(memory_key, dropped)
+                except Exception as e:
+                    print(f"❌ 整理长期记忆失败 {memory_key}: {e}")
+
+    def _fold_count(self, history, dropped: int) -> int:
+        """计算要折叠的最早记忆条数，至少保留最近一轮对话，且不从一轮对话中间截断"""
+        if not self.should_summarize(len(history), dropped):
+            return 0
+        count = min(max(dropped, MEMORY_SUMMARY_BATCH), len(history) - 2)
+        # 折叠部分以完整的一轮结束：后面紧跟的回复也一起折叠
+        while 0 < count < len(history) and history[count].get('role') == 'assistant':
+            count += 1
+        return max(count, 0)
+
+    def summarize(self, memory_key: str, dropped: int = 0):
+        """把memory_key最早的一批对话折叠进长期记忆"""
+        with self.ai.memory_lock:
+            history = list(self.ai.get_memory(memory_key))
+        count = self._fold_count(history, dropped)
+        if count <= 0:
+            return
+
+        conversation = "\n".join(
+            f"{'用户' if m.get('role') == 'user' else '你'}：{m.get('content', '')}" for m in history[:count])
+        prompt = MEMORY_SUMMARY_PROMPT.replace("{summary}", self.ai.get_memory_summary(memory_key) or "（无）")
+        prompt = prompt.replace("{max_chars}", str(MEMORY_SUMMARY_MAX_CHARS))
+        prompt = prompt.replace("{conversation}", conversation)
+
+        response = self.ai.create_completion(
+            PRIORITY_BACKGROUND,
+            model=self.ai.current_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3
+        )
+        summary = self.ai._strip_md(response.choices[0].message.content.strip())
+        if not summary:
+            return
+        # 按对象移除折叠的记忆，调用模型期间被截掉的不会重复删除
+        removed = self.ai.apply_memory_summary(memory_key, summary, history[:count])
+        if not removed:
+            # 下次对话时记忆仍然过长，会重新登记折叠
+            print(f"⚠️ {memory_key} 的记忆在整理期间被重新载入，放弃这次长期记忆摘要")
+            return
+        print(f"🧠 已将 {memory_key} 最早的 {removed} 条记忆折叠进长期记忆（{len(summary)}字）")
@@ -0,0 +1,200 @@
+"""
+小天的记忆变更监听模块
+监听记忆存储文件的变化，只把其他实例写入的变更同步给订阅者
+Linux下使用inotify，其他平台或inotify不可用时退化为后台轮询
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..manage.config import MEMORY_WATCH_POLL_INTERVAL
+
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+# inotify模式下没有事件时，多久检查一次监听目录是否被替换（秒）
+_WATCH_REFRESH_INTERVAL = 30
+
+
+class _Inotify:
+    """通过ctypes调用libc的inotify接口，监听若干目录"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        # wd -> 目录，目录 -> (wd, inode)
+        self._dirs: Dict[int, str] = {}
+        self._watches: Dict[str, Tuple[int, int]] = {}
+
+    def watch(self, directory: str):
+        """监听目录；目录被移动或重建后重新建立监听"""
+        try:
+            inode = os.stat(directory).st_ino
+        except FileNotFoundError:
+            return
+        current = self._watches.get(directory)
+        if current and current[1] == inode:
+            return
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            print(f"⚠️ 无法监听目录 {directory}: errno {ctypes.get_errno()}")
+            return
+        if current and current[0] != wd:
+            # 旧的监听跟着被移走的目录，不再需要
+            self._libc.inotify_rm_watch(self.fd, current[0])
+            self._dirs.pop(current[0], None)
+        self._dirs[wd] = directory
+        self._watches[directory] = (wd, inode)
+
+    def read_events(self, timeout: float) -> Set[str]:
+        """等待事件，返回发生变化的文件路径"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return set()
+
+        paths = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode('utf-8', errors='ignore')
+            offset += length
+
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # 目录本身被移动或删除，下一轮重新建立监听
+                if self._watches.get(directory, (None,))[0] == wd:
+                    del self._watches[directory]
+                continue
+            # 忽略原子写入过程中的临时文件
+            if name and not name.endswith(".tmp"):
+                paths.add(os.path.join(directory, name))
+        return paths
+
+
+class MemoryWatcher:
+    """记忆存储变更监听器
+
+    进程内共用一个后台线程。订阅者提供存储和回调，存储的watch_paths中有文件变化时，
+    调用存储的read_changes读取其他实例写入的变更，并交给回调处理。
+    """
+
+    def __init__(self, poll_interval: float = MEMORY_WATCH_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers: List[Tuple[weakref.ref, Callable]] = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._inotify: Optional[_Inotify] = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except Exception as e:
+                print(f"⚠️ inotify不可用，记忆同步改为每 {poll_interval} 秒轮询: {e}")
+
+    def subscribe(self, store, callback: Callable):
+        """订阅存储的外部变更；存储或回调所属对象被回收后自动取消订阅"""
+        if hasattr(callback, '__self__'):
+            callback_ref = weakref.WeakMethod(callback)
+        else:
+            callback_ref = lambda: callback
+        with self._lock:
+            self._subscribers.append((weakref.ref(store), callback_ref))
+            if self._inotify is not None:
+                for directory in store.watch_paths():
+                    self._inotify.watch(directory)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-watcher", daemon=True)
+                self._thread.start()
+
+    def _live_subscribers(self) -> List[Tuple[object, Callable]]:
+        with self._lock:
+            alive = []
+            remaining = []
+            for store_ref, callback_ref in self._subscribers:
+                store, callback = store_ref(), callback_ref()
+                if store is not None and callback is not None:
+                    alive.append((store, callback))
+                    remaining.append((store_ref, callback_ref))
+            self._subscribers = remaining
+            return alive
+
+    def _wait_for_changes(self, subscribers) -> Optional[Set[str]]:
+        """等待文件变化；返回变化的路径集合，轮询模式返回None表示全部检查"""
+        if self._inotify is None:
+            time.sleep(self.poll_interval)
+            return None
+
+        for store, _ in subscribers:
+            for directory in store.watch_paths():
+                self._inotify.watch(directory)
+        paths = self._inotify.read_events(_WATCH_REFRESH_INTERVAL)
+        if paths:
+            # 短暂等待，把同一批写入产生的连续事件合并处理
+            time.sleep(0.05)
+            paths |= self._inotify.read_events(0)
+        return paths
+
+    def _run(self):
+        while True:
+            subscribers = self._live_subscribers()
+            try:
+                paths = self._wait_for_changes(subscribers)
+            except Exception as e:
+                print(f"❌ 监听记忆文件失败: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            if paths is not None and not paths:
+                continue
+
+            for store, callback in subscribers:
+                try:
+                    if paths is None:
+                        relevant = None
+                    else:
+                        directories = set(store.watch_paths())
+                        relevant = [path for path in paths if os.path.dirname(path) in directories]
+                        if not relevant:
+                            continue
+                    changes = store.read_changes(relevant)
+                    if changes["records"] or changes["reload"]:
+                        callback(changes)
+                except Exception as e:
+                    print(f"❌ 同步记忆变更失败: {e}")
+
+
+_WATCHER = None
+_WATCHER_GUARD = threading.Lock()
+
+
+def get_memory_watcher() -> MemoryWatcher:
+    """获取进程内共用的记忆变更监听器"""
+    global _WATCHER
+    with _WATCHER_GUARD:
+        if _WATCHER is None:
+            _WATCHER = MemoryWatcher()
+        return _WATCHER
@@ -0,0 +1,134 @@
+"""
+小天的性格引用模块
+用户性格只保存引用而不是完整文本：
+    整数          内置性格 XIAOTIAN_SYSTEM_PROMPT 的索引
+    "@gentle:i"   增强温和性格 ENHANCED_GENTLE_PERSONALITIES 的索引
+    "@sharp:i"    增强锐利性格 ENHANCED_SHARP_PERSONALITIES 的索引
+    "#哈希"       自定义性格，文本按内容哈希去重保存在性格表文件中
+旧版本直接保存的完整文本仍可解析，加载时会迁移为引用
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from ..manage.config import (
+    PERSONALITY_TABLE_FILE, XIAOTIAN_SYSTEM_PROMPT,
+    ENHANCED_GENTLE_PERSONALITIES, ENHANCED_SHARP_PERSONALITIES
+)
+
+_ENHANCED_LISTS = {
+    "gentle": ENHANCED_GENTLE_PERSONALITIES,
+    "sharp": ENHANCED_SHARP_PERSONALITIES,
+}
+_ENHANCED_REF = re.compile(r"^@(gentle|sharp):(\d+)$")
+_HASH_REF = re.compile(r"^#[0-9a-f]{16}$")
+
+
+def enhanced_ref(kind: str, index: int) -> str:
+    """生成增强性格的引用，kind为 "gentle" 或 "sharp" """
+    return f"@{kind}:{index}"
+
+
+def is_reference(value: Any) -> bool:
+    """判断性格数据是否已经是引用（而不是旧版本的完整文本）"""
+    if isinstance(value, int) or value is None:
+        return True
+    return isinstance(value, str) and bool(_ENHANCED_REF.match(value) or _HASH_REF.match(value))
+
+
+class PersonalityTable:
+    """去重的自定义性格文本表
+
+    同一段文本只保存一份，用户性格中只记录它的内容哈希。
+    表中的条目只增不改，多个实例共用同一个文件时遇到未知哈希会重新读取文件。
+    """
+
+    def __init__(self, file_path: str = PERSONALITY_TABLE_FILE):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.texts: Dict[str, str] = {}
+        # 完整文本 -> 引用，用于识别内置和增强性格
+        self._builtin_refs: Dict[str, Any] = {}
+        for index, text in enumerate(XIAOTIAN_SYSTEM_PROMPT):
+            self._builtin_refs.setdefault(text, index)
+        for kind, texts in _ENHANCED_LISTS.items():
+            for index, text in enumerate(texts):
+                self._builtin_refs.setdefault(text, enhanced_ref(kind, index))
+        self.load()
+
+    def load(self):
+        """从文件读取性格表"""
+        try:
+            if os.path.exists(self.file_path):
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                with self.lock:
+                    self.texts.update(data)
+        except Exception as e:
+            print(f"⚠️ 加载性格表失败: {e}")
+
+    def _save(self):
+        """原子地写入性格表（调用方持有锁）"""
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.texts, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+    def intern(self, text: str) -> Any:
+        """把完整的性格文本转换为引用，自定义文本写入性格表"""
+        if text in self._builtin_refs:
+            return self._builtin_refs[text]
+        ref = "#" + hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+        with self.lock:
+            if ref not in self.texts:
+                # 先合并其他实例写入的条目，避免覆盖
+                if os.path.exists(self.file_path):
+                    try:
+                        with open(self.file_path, 'r', encoding='utf-8') as f:
+                            self.texts.update(json.load(f))
+                    except Exception as e:
+                        print(f"⚠️ 读取性格表失败: {e}")
+                self.texts[ref] = text
+                self._save()
+        return ref
+
+    def resolve(self, value: Any) -> Optional[str]:
+        """把引用解析为性格文本，无法解析时返回None"""
+        if isinstance(value, int):
+            if 0 <= value < len(XIAOTIAN_SYSTEM_PROMPT):
+                return XIAOTIAN_SYSTEM_PROMPT[value]
+            return None
+        if not isinstance(value, str):
+            return None
+        match = _ENHANCED_REF.match(value)
+        if match:
+            texts = _ENHANCED_LISTS[match.group(1)]
+            index = int(match.group(2))
+            return texts[index] if index < len(texts) else None
+        if _HASH_REF.match(value):
+            text = self.texts.get(value)
+            if text is None:
+                # 可能是其他实例刚写入的条目
+                self.load()
+                text = self.texts.get(value)
+            return text
+        # 旧版本保存的完整文本
+        return value
+
+
+_TABLE = None
+_TABLE_GUARD = threading.Lock()
+
+
+def get_personality_table() -> PersonalityTable:
+    """获取进程内共用的性格表"""
+    global _TABLE
+    with _TABLE_GUARD:
+        if _TABLE is None:
+            _TABLE = PersonalityTable()
+        return _TABLE
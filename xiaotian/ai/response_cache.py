@@ -0,0 +1,131 @@
+"""
+小天的回复缓存模块
+缓存系统提示词的一次性查询（海报格言、天文点评、天气JSON等），
+相同的模型、提示词和温度在有效期内直接复用上次的回复
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from ..manage.config import RESPONSE_CACHE_FILE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE
+
+
+def make_cache_key(request: Dict[str, Any]) -> str:
+    """根据请求内容（模型、消息、温度、返回格式）计算缓存键"""
+    content = {
+        'model': request.get('model'),
+        'messages': request.get('messages'),
+        'temperature': request.get('temperature'),
+        'response_format': request.get('response_format'),
+    }
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """按内容寻址的回复缓存，带有效期和条数上限，写入磁盘以便重启后继续使用"""
+
+    def __init__(self, file_path: str = RESPONSE_CACHE_FILE, ttl: float = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_SIZE):
+        self.file_path = file_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # 缓存键 -> {"value": 回复, "expires": 过期时间戳}，按最近使用排序
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """从磁盘加载缓存，丢弃已过期的条目"""
+        try:
+            if not os.path.exists(self.file_path):
+                return
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            with self.lock:
+                self.entries.clear()
+                for key, entry in data.get('entries', []):
+                    if entry.get('expires', 0) > now:
+                        self.entries[key] = entry
+                self._evict()
+        except Exception as e:
+            print(f"⚠️ 加载回复缓存失败: {e}")
+
+    def save(self):
+        """原子地写入缓存文件"""
+        try:
+            with self.lock:
+                data = {'entries': list(self.entries.items())}
+            os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            print(f"❌ 保存回复缓存失败: {e}")
+
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        """查询缓存，未命中或已过期时返回None"""
+        key = make_cache_key(request)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['expires'] <= time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+
+    def put(self, request: Dict[str, Any], value: str):
+        """写入一条回复并持久化"""
+        if not value:
+            return
+        key = make_cache_key(request)
+        with self.lock:
+            self.entries[key] = {'value': value, 'expires': time.time() + self.ttl}
+            self.entries.move_to_end(key)
+            self._evict()
+        self.save()
+
+    def clear(self) -> int:
+        """清空缓存，返回清除的条数"""
+        with self.lock:
+            count = len(self.entries)
+            self.entries.clear()
+        self.save()
+        return count
+
+    def _evict(self):
+        """超出条数上限时淘汰最久未使用的条目（调用方持有锁）"""
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_stats(self) -> str:
+        """返回缓存命中情况"""
+        with self.lock:
+            total = self.hits + self.misses
+            rate = self.hits / total * 100 if total else 0
+            return f"💾 回复缓存：{len(self.entries)}/{self.max_entries} 条，命中 {self.hits} 次，未命中 {self.misses} 次（命中率 {rate:.1f}%）"
+
+
+_CACHE = None
+_CACHE_GUARD = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取进程内共用的回复缓存"""
+    global _CACHE
+    with _CACHE_GUARD:
+        if _CACHE is None:
+            _CACHE = ResponseCache()
+        return _CACHE
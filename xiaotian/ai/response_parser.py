@@ -0,0 +1,207 @@
+"""
+小天的回复解析模块
+strip_markdown 去掉模型回复中的markdown格式，
+read_reply_json 宽松地读取 {"data": [...], "like": n} 形式的回复JSON，
+容忍模型输出中未转义的换行和引号
+"""
+
+import json
+import re
+from typing import Any
+
+# markdown清理规则：(预编译的正则, 替换, 触发字符)，按顺序依次应用，
+# 文本中不含某条规则的触发字符时该规则不可能匹配，直接跳过
+_MD_RULES = (
+    (re.compile(r'```.*?```', re.DOTALL), '', ('```',)),  # 代码块
+    (re.compile(r'`([^`]+)`'), r'\1', ('`',)),  # 行内代码
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1', ('![',)),  # 图片
+    (re.compile(r'\[([^\]]+)\]\([^)]*\)'), r'\1', ('](',)),  # 链接
+    (re.compile(r'\*\*\*([^*]+)\*\*\*'), r'\1', ('***',)),  # 粗斜体
+    (re.compile(r'___([^_]+)___'), r'\1', ('___',)),
+    (re.compile(r'\*\*([^*]+)\*\*'), r'\1', ('**',)),  # 粗体
+    (re.compile(r'__([^_]+)__'), r'\1', ('__',)),
+    (re.compile(r'\*([^*]+)\*'), r'\1', ('*',)),  # 斜体
+    (re.compile(r'_([^_]+)_'), r'\1', ('_',)),
+    (re.compile(r'~~([^~]+)~~'), r'\1', ('~~',)),  # 删除线
+    (re.compile(r'^\s{0,3}#{1,6}\s*', re.MULTILINE), '', ('#',)),  # 标题前缀
+    (re.compile(r'^\s{0,3}>\s?', re.MULTILINE), '', ('>',)),  # 引用符号
+    (re.compile(r'^\s*[-*+]\s+', re.MULTILINE), '', ('-', '*', '+')),  # 列表项目符号
+    (re.compile(r'^\s*\d+\.\s+', re.MULTILINE), '', ('.',)),
+    (re.compile(r'^\s*([-*_]\s*){3,}$', re.MULTILINE), '', ('-', '*', '_')),  # 水平线
+    (re.compile(r'\n{3,}'), '\n\n', ('\n\n\n',)),  # 连续空行
+)
+
+
+def strip_markdown(text: str) -> str:
+    """去掉markdown格式，只保留文字
+
+    与原来逐条re.sub的结果完全一致：规则按原顺序应用，正则只编译一次，
+    文本中没有触发字符的规则直接跳过（大部分回复只是普通文字，几乎所有规则都会被跳过）。
+    """
+    if not text:
+        return text
+    for pattern, repl, triggers in _MD_RULES:
+        if any(trigger in text for trigger in triggers):
+            text = pattern.sub(repl, text)
+    return text.strip()
+
+
+_WHITESPACE = ' \t\r\n'
+# 字符串中不需要特殊处理的连续片段
+_STRING_CHUNK = re.compile(r'[^"\\]*')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_LITERALS = {'true': True, 'false': False, 'null': None}
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+# 字符串结束引号后面允许出现的字符
+_STRING_END_FOLLOW = ',:}]'
+
+
+class _TolerantReader:
+    """宽松的JSON读取器
+
+    与标准JSON的区别：字符串中允许原始换行等控制字符；
+    字符串中的引号只有后面紧跟（忽略空白）逗号、冒号、右括号或文本结尾时才视为结束，
+    否则当作内容中的普通引号。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def read(self) -> Any:
+        value = self._value()
+        self._skip_whitespace()
+        if self.pos != len(self.text):
+            raise ValueError(f"JSON之后有多余内容（位置{self.pos}）")
+        return value
+
+    def _skip_whitespace(self):
+        text = self.text
+        pos = self.pos
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def _expect(self, ch: str):
+        self._skip_whitespace()
+        if self.pos >= len(self.text) or self.text[self.pos] != ch:
+            raise ValueError(f"位置{self.pos}处应为 {ch}")
+        self.pos += 1
+
+    def _value(self) -> Any:
+        self._skip_whitespace()
+        if self.pos >= len(self.text):
+            raise ValueError("JSON意外结束")
+        ch = self.text[self.pos]
+        if ch == '{':
+            return self._object()
+        if ch == '[':
+            return self._array()
+        if ch == '"':
+            return self._string()
+        for word, value in _LITERALS.items():
+            if self.text.startswith(word, self.pos):
+                self.pos += len(word)
+                return value
+        match = _NUMBER.match(self.text, self.pos)
+        if not match:
+            raise ValueError(f"位置{self.pos}处无法解析")
+        self.pos = match.end()
+        number = match.group()
+        return float(number) if any(c in number for c in '.eE') else int(number)
+
+    def _object(self) -> dict:
+        self.pos += 1
+        result = {}
+        self._skip_whitespace()
+        if self.text.startswith('}', self.pos):
+            self.pos += 1
+            return result
+        while True:
+            self._skip_whitespace()
+            if not self.text.startswith('"', self.pos):
+                raise ValueError(f"位置{self.pos}处应为键名")
+            key = self._string()
+            self._expect(':')
+            result[key] = self._value()
+            self._skip_whitespace()
+            if self.text.startswith(',', self.pos):
+                self.pos += 1
+                continue
+            self._expect('}')
+            return result
+
+    def _array(self) -> list:
+        self.pos += 1
+        result = []
+        self._skip_whitespace()
+        if self.text.startswith(']', self.pos):
+            self.pos += 1
+            return result
+        while True:
+            result.append(self._value())
+            self._skip_whitespace()
+            if self.text.startswith(',', self.pos):
+                self.pos += 1
+                continue
+            self._expect(']')
+            return result
+
+    def _string(self) -> str:
+        text = self.text
+        pos = self.pos + 1
+        parts = []
+        while True:
+            match = _STRING_CHUNK.match(text, pos)
+            parts.append(match.group())
+            pos = match.end()
+            if pos >= len(text):
+                raise ValueError("字符串没有结束")
+            if text[pos] == '\\':
+                escape = text[pos + 1:pos + 2]
+                if escape == 'u' and re.fullmatch(r'[0-9a-fA-F]{4}', text[pos + 2:pos + 6]):
+                    parts.append(chr(int(text[pos + 2:pos + 6], 16)))
+                    pos += 6
+                else:
+                    # 未知的转义原样保留
+                    parts.append(_ESCAPES.get(escape, '\\' + escape))
+                    pos += 2
+                continue
+            # 遇到引号：判断是字符串结束还是内容中的引号
+            end = pos + 1
+            while end < len(text) and text[end] in _WHITESPACE:
+                end += 1
+            if end >= len(text) or text[end] in _STRING_END_FOLLOW:
+                self.pos = pos + 1
+                value = ''.join(parts)
+                if any('\ud800' <= c <= '\udfff' for c in value):
+                    # 合并 \\uXXXX 形式的代理对
+                    value = value.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+                return value
+            parts.append('"')
+            pos += 1
+
+
+def read_reply_json(text: str) -> Any:
+    """读取回复中的JSON，先用标准解析，失败时使用宽松解析
+
+    允许回复被 ```json 代码块包裹。不是JSON或无法解析时返回None。
+    """
+    if not text:
+        return None
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.strip('`').strip()
+        if text.startswith('json'):
+            text = text[4:]
+        text = text.strip()
+    if not text.startswith(('{', '[')):
+        return None
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    try:
+        return _TolerantReader(text).read()
+    except (ValueError, IndexError):
+        return None
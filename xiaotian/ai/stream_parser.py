@@ -0,0 +1,96 @@
+"""
+小天的流式回复解析模块
+模型以流的形式返回 {"data": [{"wait_time": .., "content": ..}, ...], "like": ..} 时，
+在data数组中的每个对象闭合后立即取出，不必等待整段回复生成完毕
+"""
+
+import json
+from typing import Any, Dict, List
+
+
+class DataArrayStreamParser:
+    """增量解析回复JSON中的data数组
+
+    逐段喂入模型输出，按字符跟踪字符串、转义和括号深度，
+    data数组中某个对象的右括号出现时就解析并返回该对象。
+    一旦遇到无法解析的对象（例如模型输出了未转义的引号），停止增量解析，
+    剩余部分交给完整回复的解析逻辑处理。
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # 当前字符串的起点，以及最近一个顶层字符串（用于识别 "data" 键）
+        self._string_start = -1
+        self._last_key = None
+        # data数组所在的深度（数组本身在第2层）和当前对象的起点
+        self._in_data = False
+        self._item_start = -1
+        self.broken = False
+        self.finished = False
+        self.items: List[Dict[str, Any]] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """喂入一段新的输出，返回这段输出中新闭合的data对象"""
+        if not text or self.broken or self.finished:
+            return []
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = buffer[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in '{[':
+                self._depth += 1
+                if ch == '[' and self._depth == 2 and self._last_key == 'data':
+                    self._in_data = True
+                elif ch == '{' and self._in_data and self._depth == 3:
+                    self._item_start = i
+            elif ch in '}]':
+                if ch == '}' and self._in_data and self._depth == 3 and self._item_start >= 0:
+                    item = self._parse_item(buffer[self._item_start:i + 1])
+                    self._item_start = -1
+                    if item is None:
+                        self.broken = True
+                        self._pos = i + 1
+                        return completed
+                    self.items.append(item)
+                    completed.append(item)
+                elif ch == ']' and self._in_data and self._depth == 2:
+                    self._in_data = False
+                    self.finished = True
+                    self._pos = i + 1
+                    return completed
+                self._depth -= 1
+                if self._depth < 0:
+                    self.broken = True
+                    break
+            elif ch == ',' and self._depth == 1:
+                self._last_key = None
+        self._pos = len(buffer)
+        return completed
+
+    @staticmethod
+    def _parse_item(text: str):
+        """解析单个data对象，允许字符串中出现原始换行"""
+        try:
+            item = json.loads(text, strict=False)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
@@ -0,0 +1,109 @@
+"""
+小天的命令路由模块
+命令以模板声明（如 "{name}，查看设置"），按当前的吉祥物名称等配置展开后编入前缀树，
+每条消息只需沿前缀树走一遍即可找到对应的命令。
+吉祥物名称、唤醒词或竞答名称被修改后，下一次路由时自动重建前缀树。
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import config
+
+
+def current_names() -> Dict[str, str]:
+    """命令模板中可以使用的占位符及其当前值"""
+    return {
+        'name': config.XIAOTIAN_NAME,
+        'trigger': config.TRIGGER_WORDS[0] if config.TRIGGER_WORDS else f"{config.XIAOTIAN_NAME}，",
+        'quiz': config.QUIZ_NAME,
+    }
+
+
+class _Node:
+    __slots__ = ('children', 'exact', 'prefix')
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # 整条消息等于该路径时执行的命令，以及以该路径开头时执行的命令
+        self.exact: Optional[Callable] = None
+        self.prefix: Optional[Callable] = None
+
+
+class CommandRouter:
+    """基于前缀树的命令路由
+
+    exact() 注册整条消息完全相同时触发的命令，prefix() 注册以模板开头时触发的命令，
+    处理函数以 handler(剩余文本, *参数) 的形式调用；返回None表示不处理，
+    继续尝试更短的匹配，全部不处理时 dispatch() 返回None。
+    """
+
+    def __init__(self, names: Callable[[], Dict[str, str]] = current_names):
+        self._names = names
+        self._commands: List[Tuple[str, bool, Callable]] = []
+        self._root = _Node()
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def exact(self, template: str, handler: Callable) -> "CommandRouter":
+        """注册完全匹配的命令"""
+        return self._add(template, True, handler)
+
+    def prefix(self, template: str, handler: Callable) -> "CommandRouter":
+        """注册前缀匹配的命令，处理函数收到前缀之后的文本"""
+        return self._add(template, False, handler)
+
+    def _add(self, template: str, exact: bool, handler: Callable) -> "CommandRouter":
+        with self._lock:
+            self._commands.append((template, exact, handler))
+            self._signature = None
+        return self
+
+    def _ensure_built(self):
+        """配置中的名称变化后重建前缀树"""
+        names = self._names()
+        signature = tuple(sorted(names.items()))
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            root = _Node()
+            for template, exact, handler in self._commands:
+                node = root
+                for ch in template.format(**names):
+                    node = node.children.setdefault(ch, _Node())
+                # 同一模板重复注册时保留最先注册的命令，与原来按顺序判断的行为一致
+                if exact and node.exact is None:
+                    node.exact = handler
+                elif not exact and node.prefix is None:
+                    node.prefix = handler
+            self._root = root
+            self._signature = signature
+
+    def match(self, message: str) -> List[Tuple[Callable, str]]:
+        """返回所有匹配的 (处理函数, 剩余文本)，越长的匹配越靠前"""
+        self._ensure_built()
+        matches = []
+        node = self._root
+        for i, ch in enumerate(message):
+            if node.prefix is not None:
+                matches.append((node.prefix, message[i:]))
+            node = node.children.get(ch)
+            if node is None:
+                break
+        else:
+            if node.prefix is not None:
+                matches.append((node.prefix, ""))
+            if node.exact is not None:
+                matches.append((node.exact, ""))
+        matches.reverse()
+        return matches
+
+    def dispatch(self, message: str, *args) -> Any:
+        """执行匹配的命令，返回第一个不为None的处理结果"""
+        for handler, rest in self.match(message):
+            result = handler(rest, *args)
+            if result is not None:
+                return result
+        return None
@@ -77,12 +77,33 @@ def reload_config():
 reload_config()
 
 # DAILY_ASTRONOMY_MESSAGE 已在reload_config中设置
-MAX_MEMORY_COUNT = 20  # 最大记忆消息数
+MAX_MEMORY_COUNT = 40  # 每个对话最多保存的记忆消息数（实际发给模型的条数由下面的token预算决定）
 USE_MODEL = "moonshot-v1-8k"
+# 每个模型单次请求可用的上下文token预算（系统提示词+记忆+当前消息），需为回复预留空间
+MODEL_CONTEXT_BUDGETS = {
+    "moonshot-v1-8k": 6000,
+    "moonshot-v1-32k": 24000,
+    "moonshot-v1-128k": 100000,
+}
+DEFAULT_CONTEXT_BUDGET = 6000  # 未在上表中的模型使用的预算
+MEMORY_SUMMARY_THRESHOLD = 30  # 单个对话的记忆达到此条数（或超出token预算）时，把最早的部分折叠进长期记忆
+MEMORY_SUMMARY_BATCH = 10  # 每次至少折叠的最早记忆条数
+MEMORY_SUMMARY_MAX_CHARS = 300  # 长期记忆摘要的最大字数
+MEMORY_SUMMARY_DELAY = 5  # 后台摘要任务的合批等待时间（秒）
 # API限速配置
 GLOBAL_RATE_LIMIT = 120  # 每分钟全局调用次数
 USER_RATE_LIMIT = 60     # 每分钟每个用户调用次数
+LLM_MAX_CONCURRENCY = 4  # 同时进行的模型请求上限，超出的请求按优先级排队
+STREAM_RESPONSES = True  # 流式请求聊天回复，每条消息生成完毕立即发送
 COOLDOWN_SECONDS = 0.01    # 用户冷却时间（秒）
+WAKEUP_TIMEOUT = 25  # 群聊中用唤醒词唤醒后保持唤醒的时间（秒），AI回复耗时不计入
+WAKEUP_CONTINUE_TIMEOUT = 15  # 唤醒状态中同一用户继续发消息后重新计时的时间（秒）
+WAKEUP_OTHER_USER_TIMEOUT = 5  # 唤醒状态中群里其他用户发言时缩短到的超时时间（秒）
+# 群聊情绪关键词（命中cold优先于hot），可由Root命令修改或添加其他分类
+EMOTION_KEYWORDS = {
+    'cold': ['无聊', '没意思', '算了', '不想', '冷', '沉默', '不说话'],
+    'hot': ['激动', '兴奋', '开心', '高兴', '棒', '太好了', 'amazing', '牛逼', '厉害', '哇', '超级'],
+}
 
 # 定时任务配置
 DAILY_WEATHER_TIME = "18:00"  # 每晚6点获取天气
@@ -90,9 +111,32 @@ DAILY_ASTRONOMY_TIME = "20:00"  # 每天晚8点发送天文海报
 MONTHLY_ASTRONOMY_TIME = "09:00"  # 每月1号发送上月合集
 MONTHLY_LIKE_REWARD_TIME = "10:00"  # 每月1号上午10点发送好感度奖励
 CLEANUP_TIME = "03:00"  # 每天凌晨3点清理过期数据
+JOB_WORKERS = 4  # 执行定时任务的线程数，同一个群的任务按顺序执行，不同群的任务并行执行
+POSTER_RENDER_WORKERS = 2  # 海报渲染进程数
+POSTER_PREFETCH_WAIT = 30  # 生成海报时等待预取的格言和预渲染版面的最长时间（秒）
+# 发送消息限速（令牌桶：每秒补充的条数，最多累积的条数）
+OUTBOUND_TARGET_RATE = 0.5  # 每个群/私聊每秒最多发送的消息数
+OUTBOUND_TARGET_BURST = 3  # 每个群/私聊允许连续发送的条数
+OUTBOUND_GLOBAL_RATE = 5  # 所有目标合计每秒最多发送的消息数
+OUTBOUND_GLOBAL_BURST = 10
 
 # 文件路径
 MEMORY_FILE = "xiaotian/data/memory.json"
+MEMORY_JOURNAL_FILE = "xiaotian/data/memory.journal"  # 记忆变更日志（追加写入）
+MEMORY_JOURNAL_COMPACT_THRESHOLD = 2000  # 日志记录数超过此值时合并进快照
+MEMORY_BACKEND = "json"  # 记忆存储后端："json"（小规模部署）或 "sqlite"
+MEMORY_DB_FILE = "xiaotian/data/memory.db"  # SQLite后端的数据库文件
+MEMORY_FLUSH_INTERVAL = 2  # 记忆变更的后台批量写入间隔（秒），0表示每次变更立即写入
+MEMORY_SHARD_DIR = "xiaotian/data/memory_shards/"  # JSON后端的对话记忆分桶目录
+MEMORY_SHARD_COUNT = 256  # 对话记忆分桶数量（修改后需重新迁移数据）
+MEMORY_SHARD_COMPACT_THRESHOLD = 200  # 单个分桶日志记录数超过此值时合并
+MEMORY_SHARD_CACHE_SIZE = 64  # JSON后端缓存解析结果的分桶数量，命中时只需读取新增的日志记录
+MEMORY_CACHE_SIZE = 500  # 内存中最多常驻的对话记忆数量（按最近使用淘汰）
+MEMORY_WATCH_POLL_INTERVAL = 2  # 无法使用inotify时，检查其他实例写入变更的轮询间隔（秒）
+RESPONSE_CACHE_FILE = "xiaotian/data/response_cache.json"  # 系统提示词一次性查询的回复缓存
+RESPONSE_CACHE_TTL = 6 * 3600  # 缓存回复的有效期（秒）
+RESPONSE_CACHE_SIZE = 200  # 最多缓存的回复条数（按最近使用淘汰）
+PERSONALITY_TABLE_FILE = "xiaotian/data/personalities.json"  # 自定义性格文本表（按内容哈希去重，用户性格只保存引用）
 RECYCLE_BIN = "xiaotian/data/recycle/"
 POSTER_OUTPUT_DIR = "xiaotian/output/posters/"
 ASTRONOMY_IMAGES_DIR = "xiaotian/data/astronomy_images/"
@@ -178,6 +222,20 @@ CHANGE_PERSONALITY_PROMPT = """请根据用户的需求，生成一个统一格
 3. 不要添加任何额外的说明或标记
 4. 只返回性格设定文本"""  # 切换性格的命令
 
+MEMORY_SUMMARY_PROMPT = """下面是你和一位用户较早的聊天记录，以及之前整理的长期记忆。请把它们合并成一段新的长期记忆。
+
+之前的长期记忆：
+{summary}
+
+较早的聊天记录：
+{conversation}
+
+要求：
+1. 用第三人称记录用户的身份、喜好、经历、你们的约定和重要的话题
+2. 删除寒暄和不重要的细节，保留之后聊天需要的信息
+3. 不超过{max_chars}字，不要使用markdown格式
+4. 只返回长期记忆文本"""  # 折叠较早对话的摘要提示词
+
 BASIC_PROMPT = """现在你运行在qq上，你现在就是真正的人，所有的对话尽量以聊天的形式回复，一句一句回复，且你可以根据对方的数量决定你的回复多少（必须使用json格式，格式为：
 {
   "data": [
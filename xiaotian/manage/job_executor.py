@@ -0,0 +1,97 @@
+"""
+小天的任务执行模块
+定时器到期后只把任务放进执行器，由线程池执行。
+任务按通道（如某个群、某个用户）排队：同一通道内按提交顺序逐个执行，不同通道之间并行执行，
+一个群的超时处理不会拖慢其他群。需要延时的后续步骤用 submit_later 登记为新的任务，而不是在任务中sleep。
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, Tuple
+
+from .config import JOB_WORKERS
+from .timer_service import Timer, TimerService
+
+
+def group_lane(group_id: str) -> tuple:
+    """群聊任务通道"""
+    return ('group', group_id)
+
+
+def private_lane(user_id: str) -> tuple:
+    """私聊任务通道"""
+    return ('private', user_id)
+
+
+class JobExecutor:
+    """按通道串行、通道之间并行的任务执行器"""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, timers: TimerService = None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="xiaotian-job")
+        self.timers = timers or TimerService("job-timers")
+        self.lock = threading.Lock()
+        # 通道 -> 等待执行的任务；通道在字典中表示该通道有任务正在执行
+        self.lanes: Dict[Hashable, Deque[Tuple[Future, Callable, tuple]]] = {}
+
+    def submit(self, lane: Hashable, func: Callable, *args) -> Future:
+        """把任务放进通道，返回任务结果的Future"""
+        future = Future()
+        with self.lock:
+            queue = self.lanes.get(lane)
+            if queue is not None:
+                queue.append((future, func, args))
+                return future
+            self.lanes[lane] = deque()
+        self.pool.submit(self._run, lane, future, func, args)
+        return future
+
+    def submit_at(self, when: float, lane: Hashable, func: Callable, *args, key: Hashable = None) -> Timer:
+        """在时间戳when把任务放进通道"""
+        self.timers.start()
+        return self.timers.call_at(when, self.submit, lane, func, *args, key=key)
+
+    def submit_later(self, delay: float, lane: Hashable, func: Callable, *args, key: Hashable = None) -> Timer:
+        """delay秒后把任务放进通道，用于代替任务中的sleep"""
+        self.timers.start()
+        return self.timers.call_later(delay, self.submit, lane, func, *args, key=key)
+
+    def _run(self, lane: Hashable, future: Future, func: Callable, args: tuple):
+        """执行一个任务，然后把同一通道的下一个任务交给线程池"""
+        if future.set_running_or_notify_cancel():
+            try:
+                result = func(*args)
+            except Exception as e:
+                print(f"❌ 任务执行失败（{lane}）：{e}")
+                import traceback
+                print(traceback.format_exc())
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        with self.lock:
+            queue = self.lanes[lane]
+            if not queue:
+                del self.lanes[lane]
+                return
+            next_job = queue.popleft()
+        # 重新提交而不是在当前线程中循环，繁忙的通道不会一直占用同一个线程
+        self.pool.submit(self._run, lane, *next_job)
+
+    def pending(self) -> int:
+        """正在排队的任务数量（不含正在执行的任务）"""
+        with self.lock:
+            return sum(len(queue) for queue in self.lanes.values())
+
+
+_EXECUTOR = None
+_EXECUTOR_GUARD = threading.Lock()
+
+
+def get_job_executor() -> JobExecutor:
+    """获取进程内共用的任务执行器"""
+    global _EXECUTOR
+    with _EXECUTOR_GUARD:
+        if _EXECUTOR is None:
+            _EXECUTOR = JobExecutor()
+        return _EXECUTOR
@@ -39,9 +39,8 @@ class LikeManager:
             
         result = {}
         
-        # 遍历所有用户的like状态
-        self.ai.load_memory(MEMORY_FILE)
-        for memory_key, status in self.ai.user_like_status.items():
+        # 直接从存储中按好感度从高到低查询所有用户的like状态
+        for memory_key, status in self.ai.memory_store.get_like_ranking():
             # 提取用户ID
             user_id = self.ai._extract_user_id_from_memory_key(memory_key)
             if user_id:
@@ -106,7 +105,8 @@ class LikeManager:
             if not self.ai:
                 return "⚠️ AI实例未初始化"
             
-            # 重置前先保存记录
+            # 重置前先写入缓冲中的变更，再保存记录
+            self.ai.flush_memory()
             save_result = self.save_monthly_record()
             
             # 确保MEMORY_FILE变量存在
@@ -0,0 +1,158 @@
+"""
+小天的消息发送队列模块
+所有主动发送的消息放进发送队列，由独立线程中的asyncio事件循环发送：
+每个发送目标（群或私聊）一个队列，同一目标按顺序发送，不同目标并行发送；
+每个目标和全局各有一个令牌桶限速，调用方拿到的Future在消息发出后完成，不需要等待发送。
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+
+from .config import (
+    OUTBOUND_TARGET_RATE, OUTBOUND_TARGET_BURST,
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST
+)
+
+
+class TokenBucket:
+    """令牌桶限速：每秒补充rate个令牌，最多累积burst个，每条消息消耗一个"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """等待直到有可用的令牌（只在事件循环线程中调用）"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboundDispatcher:
+    """按目标排队、并行发送并限速的消息发送器
+
+    send_func(msg_type, target_id, message, image_path) 负责实际发送，可以是普通函数或协程函数；
+    普通函数在线程池中执行，不会阻塞事件循环。
+    """
+
+    def __init__(self, send_func: Callable, name: str = "outbound-dispatcher"):
+        self.send_func = send_func
+        self.name = name
+        self._is_coroutine = inspect.iscoroutinefunction(send_func)
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # 以下状态只在事件循环线程中访问
+        self._queues: Dict[Tuple[str, str], asyncio.Queue] = {}
+        self._workers: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._global_bucket = TokenBucket(OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST)
+        self.sent_count = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, args=(loop,), name=self.name, daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def enqueue(self, msg_type: str, target_id: str, message: str = None,
+                image_path: str = None, delay: float = 0) -> Future:
+        """把消息放进目标的发送队列，delay为轮到该消息后发送前的等待时间（模拟打字）
+
+        返回的Future在消息发出后完成，结果为send_func的返回值。
+        """
+        future = Future()
+        item = (future, message, image_path, max(0.0, delay))
+        self._ensure_loop().call_soon_threadsafe(self._put, (msg_type, str(target_id)), item)
+        return future
+
+    def _put(self, target: Tuple[str, str], item: tuple):
+        queue = self._queues.get(target)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[target] = queue
+            self._workers[target] = asyncio.ensure_future(self._worker(target, queue))
+        queue.put_nowait(item)
+
+    async def _worker(self, target: Tuple[str, str], queue: asyncio.Queue):
+        """按顺序发送一个目标的消息，队列发空后退出，下一条消息到来时重新启动"""
+        bucket = self._buckets.get(target)
+        if bucket is None:
+            bucket = self._buckets[target] = TokenBucket(OUTBOUND_TARGET_RATE, OUTBOUND_TARGET_BURST)
+        msg_type, target_id = target
+        while not queue.empty():
+            future, message, image_path, delay = queue.get_nowait()
+            if future.cancelled():
+                continue
+            try:
+                if delay:
+                    await asyncio.sleep(delay)
+                await bucket.acquire()
+                await self._global_bucket.acquire()
+                # 等待期间被调用方取消的消息不再发送
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if self._is_coroutine:
+                    result = await self.send_func(msg_type, target_id, message, image_path)
+                else:
+                    result = await asyncio.to_thread(self.send_func, msg_type, target_id, message, image_path)
+                self.sent_count += 1
+                future.set_result(result)
+            except asyncio.CancelledError:
+                if future.running():
+                    future.set_exception(asyncio.CancelledError())
+                else:
+                    future.cancel()
+                raise
+            except Exception as e:
+                print(f"❌ 发送消息到 {msg_type}({target_id}) 失败：{e}")
+                future.set_exception(e)
+        del self._queues[target]
+        del self._workers[target]
+
+    def get_status(self) -> str:
+        """返回发送队列的状态"""
+        pending = sum(queue.qsize() for queue in list(self._queues.values()))
+        return f"📮 发送队列：{len(self._queues)}个目标，排队{pending}条，已发送{self.sent_count}条"
+
+    def stop(self):
+        """停止事件循环，未发送的消息不再发送"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(loop), loop)
+
+    async def _shutdown(self, loop: asyncio.AbstractEventLoop):
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # 取消还在排队的消息，等待结果的调用方不会一直阻塞
+        for queue in self._queues.values():
+            while not queue.empty():
+                queue.get_nowait()[0].cancel()
+        self._queues.clear()
+        self._workers.clear()
+        loop.stop()
@@ -11,7 +11,9 @@ import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Any, Optional
 import glob
-from .config import ROOT_ADMIN_DATA_FILE, ASTRONOMY_IMAGES_DIR, ASTRONOMY_FONTS_DIR, XIAOTIAN_NAME
+from .config import ROOT_ADMIN_DATA_FILE, ASTRONOMY_IMAGES_DIR, ASTRONOMY_FONTS_DIR, EMOTION_KEYWORDS
+from .command_router import CommandRouter
+from ..ai.keyword_matcher import get_keyword_matcher
 
 
 class RootManager:
@@ -19,6 +21,7 @@ class RootManager:
         self.root_id = root_id
         self.settings_file = ROOT_ADMIN_DATA_FILE
         self.load_settings()
+        self._apply_keyword_lists()
         
         # AI实例（运行时设置）
         self.ai = None
@@ -28,6 +31,9 @@ class RootManager:
         
         # 等待图片的用户命令
         self.pending_operations = {}  # user_id: {"type": "image", "name": "filename"}
+        
+        # Root命令路由，吉祥物名称修改后自动重建
+        self.command_router = self._build_command_router()
 
         # 确保必要的目录存在
         os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
@@ -53,6 +59,7 @@ class RootManager:
                 'target_groups': data.get('target_groups', []),  # 目标群组
                 'weather_city': data.get('weather_city', '双流'),  # 天气城市
                 'permanent_admins': data.get('permanent_admins', []),  # 常驻管理员QQ号列表
+                'keyword_lists': data.get('keyword_lists', {}),  # 自定义关键词分类，覆盖默认的情绪关键词
                 'enabled_features': data.get('enabled_features', {
                     'daily_weather': True,
                     'daily_astronomy': True,
@@ -71,6 +78,7 @@ class RootManager:
                 'target_groups': [],
                 'weather_city': '双流',
                 'permanent_admins': [],  # 常驻管理员QQ号列表
+                'keyword_lists': {},
                 'enabled_features': {
                     'daily_weather': True,
                     'daily_astronomy': True,
@@ -170,163 +178,87 @@ class RootManager:
                 del self.pending_operations[user_id]
                 return result
         
-        # 保存图片命令 - 第一步
-        if message.startswith(f"{XIAOTIAN_NAME}，保存图片："):
-            filename = message.replace(f"{XIAOTIAN_NAME}，保存图片：", "").strip()
-            # 记录等待上传图片
-            self.pending_operations[user_id] = {"type": "image", "name": filename}
-            return ("📸 请发送要保存的图片", None)
-        
-        
-        # 设置目标群组
-        if message.startswith(f"{XIAOTIAN_NAME}，设置目标群组："):
-            groups = message.replace(f"{XIAOTIAN_NAME}，设置目标群组：", "").strip().split(',')
-            return self._set_target_groups([g.strip() for g in groups if g.strip()])
-        
-        # 移除目标群组
-        if message.startswith(f"{XIAOTIAN_NAME}，移除目标群组："):
-            groups = message.replace(f"{XIAOTIAN_NAME}，移除目标群组：", "").strip().split(',')
-            return self._remove_target_groups([g.strip() for g in groups if g.strip()])
-        
-        # 添加自动触发群组
-        if message.startswith(f"{XIAOTIAN_NAME}，添加自动触发群组："):
-            groups = message.replace(f"{XIAOTIAN_NAME}，添加自动触发群组：", "").strip().split(',')
-            return self._add_auto_trigger_groups([g.strip() for g in groups if g.strip()])
+        return self.command_router.dispatch(message, user_id)
+    
+    def _build_command_router(self) -> CommandRouter:
+        """声明所有Root命令，{name}为当前的吉祥物名称"""
+        router = CommandRouter()
         
-        # 移除自动触发群组
-        if message.startswith(f"{XIAOTIAN_NAME}，移除自动触发群组："):
-            groups = message.replace(f"{XIAOTIAN_NAME}，移除自动触发群组：", "").strip().split(',')
-            return self._remove_auto_trigger_groups([g.strip() for g in groups if g.strip()])
+        # 保存图片命令 - 第一步
+        router.prefix("{name}，保存图片：", self._request_image)
         
-        # 设置每日触发限制
-        if message.startswith(f"{XIAOTIAN_NAME}，设置触发限制："):
-            try:
-                limit = int(message.replace(f"{XIAOTIAN_NAME}，设置触发限制：", "").strip())
-                return self._set_trigger_limit(limit)
-            except ValueError:
-                return ("❌ 触发限制必须是数字", None)
+        # 群组设置
+        router.prefix("{name}，设置目标群组：", lambda rest, user_id: self._set_target_groups(self._split_groups(rest)))
+        router.prefix("{name}，移除目标群组：", lambda rest, user_id: self._remove_target_groups(self._split_groups(rest)))
+        router.prefix("{name}，添加自动触发群组：", lambda rest, user_id: self._add_auto_trigger_groups(self._split_groups(rest)))
+        router.prefix("{name}，移除自动触发群组：", lambda rest, user_id: self._remove_auto_trigger_groups(self._split_groups(rest)))
         
-        # 重置今日触发次数
-        if message == f"{XIAOTIAN_NAME}，重置触发次数":
-            return self._reset_trigger_count()
+        # 触发次数、天气城市、模型
+        router.prefix("{name}，设置触发限制：", lambda rest, user_id: self._parse_trigger_limit(rest))
+        router.exact("{name}，重置触发次数", lambda rest, user_id: self._reset_trigger_count())
+        router.prefix("{name}，设置天气城市：", lambda rest, user_id: self._set_weather_city(rest.strip()))
+        router.prefix("{name}，更换模型", lambda rest, user_id: self._change_model(rest.strip().lstrip("：:").strip()))
         
-        # 设置天气城市
-        if message.startswith(f"{XIAOTIAN_NAME}，设置天气城市："):
-            city = message.replace(f"{XIAOTIAN_NAME}，设置天气城市：", "").strip()
-            return self._set_weather_city(city)
+        # 清理和查看
+        router.exact("{name}，清理输出", lambda rest, user_id: self._cleanup_outputs())
+        router.exact("{name}，清除回复缓存", lambda rest, user_id: self._clear_response_cache())
+        router.exact("{name}，查看设置", lambda rest, user_id: self._show_settings())
+        router.exact("{name}，查看自定义设置", lambda rest, user_id: self._show_custom_settings())
         
-        # 更换模型
-        if message.startswith(f"{XIAOTIAN_NAME}，更换模型"):
-            # 提取模型参数
-            model_param = message.replace(f"{XIAOTIAN_NAME}，更换模型", "").strip()
-            if model_param.startswith("：") or model_param.startswith(":"):
-                model_param = model_param[1:].strip()
-            
-            return self._change_model(model_param)
+        # 管理员命令
+        router.prefix("{name}，添加临时管理员：", lambda rest, user_id: self._add_temp_admin(rest.strip()))
+        router.prefix("{name}，添加常驻管理员：", lambda rest, user_id: self._add_permanent_admin(rest.strip()))
+        router.prefix("{name}，移除临时管理员：", lambda rest, user_id: self._remove_temp_admin(rest.strip()))
+        router.prefix("{name}，移除常驻管理员：", lambda rest, user_id: self._remove_permanent_admin(rest.strip()))
+        router.exact("{name}，查看管理员", lambda rest, user_id: self._list_admins())
         
-        # 清理输出文件
-        if message == f"{XIAOTIAN_NAME}，清理输出":
-            return self._cleanup_outputs()
+        # 题库管理命令（需要AI实例）
+        router.prefix("{name}，添加题目：", lambda rest, user_id: self._add_quiz_question(rest.strip()) if self.ai else None)
+        router.prefix("{name}，修改题目：", lambda rest, user_id: self._edit_quiz_question(rest.strip()) if self.ai else None)
+        router.prefix("{name}，删除题目：", lambda rest, user_id: self._delete_quiz_question(rest.strip()) if self.ai else None)
+        router.exact("{name}，查看题库", lambda rest, user_id: self._list_quiz_questions() if self.ai else None)
         
-        # 查看设置
-        if message == f"{XIAOTIAN_NAME}，查看设置":
-            return self._show_settings()
-            
-        # 查看自定义设置
-        if message == f"{XIAOTIAN_NAME}，查看自定义设置":
-            return self._show_custom_settings()
-            
-        # 管理员命令
-        # 添加临时管理员
-        if message.startswith(f"{XIAOTIAN_NAME}，添加临时管理员："):
-            admin_id = message.replace(f"{XIAOTIAN_NAME}，添加临时管理员：", "").strip()
-            return self._add_temp_admin(admin_id)
-            
-        # 添加常驻管理员
-        if message.startswith(f"{XIAOTIAN_NAME}，添加常驻管理员："):
-            admin_id = message.replace(f"{XIAOTIAN_NAME}，添加常驻管理员：", "").strip()
-            return self._add_permanent_admin(admin_id)
-            
-        # 移除临时管理员
-        if message.startswith(f"{XIAOTIAN_NAME}，移除临时管理员："):
-            admin_id = message.replace(f"{XIAOTIAN_NAME}，移除临时管理员：", "").strip()
-            return self._remove_temp_admin(admin_id)
-            
-        # 移除常驻管理员
-        if message.startswith(f"{XIAOTIAN_NAME}，移除常驻管理员："):
-            admin_id = message.replace(f"{XIAOTIAN_NAME}，移除常驻管理员：", "").strip()
-            return self._remove_permanent_admin(admin_id)
-            
-        # 查看管理员列表
-        if message == f"{XIAOTIAN_NAME}，查看管理员":
-            return self._list_admins()
-            
-        # 题库管理命令
-        # 添加题目
-        if message.startswith(f"{XIAOTIAN_NAME}，添加题目：") and self.ai:
-            content = message.replace(f"{XIAOTIAN_NAME}，添加题目：", "").strip()
-            return self._add_quiz_question(content)
-            
-        # 修改题目
-        if message.startswith(f"{XIAOTIAN_NAME}，修改题目：") and self.ai:
-            content = message.replace(f"{XIAOTIAN_NAME}，修改题目：", "").strip()
-            return self._edit_quiz_question(content)
-            
-        # 删除题目
-        if message.startswith(f"{XIAOTIAN_NAME}，删除题目：") and self.ai:
-            content = message.replace(f"{XIAOTIAN_NAME}，删除题目：", "").strip()
-            return self._delete_quiz_question(content)
-            
-        # 查看题库
-        if message == f"{XIAOTIAN_NAME}，查看题库" and self.ai:
-            return self._list_quiz_questions()
+        # 关键词分类
+        router.prefix("{name}，设置关键词：", lambda rest, user_id: self._set_keywords(rest))
+        router.exact("{name}，查看关键词", lambda rest, user_id: self._list_keywords())
         
         # 启用/禁用功能
-        if message.startswith(f"{XIAOTIAN_NAME}，启用功能："):
-            feature = message.replace(f"{XIAOTIAN_NAME}，启用功能：", "").strip()
-            return self._toggle_feature(feature, True)
-        
-        if message.startswith(f"{XIAOTIAN_NAME}，禁用功能："):
-            feature = message.replace(f"{XIAOTIAN_NAME}，禁用功能：", "").strip()
-            return self._toggle_feature(feature, False)
+        router.prefix("{name}，启用功能：", lambda rest, user_id: self._toggle_feature(rest.strip(), True))
+        router.prefix("{name}，禁用功能：", lambda rest, user_id: self._toggle_feature(rest.strip(), False))
         
         # 列出可用图片和字体
-        if message == f"{XIAOTIAN_NAME}，列出图片":
-            return self._list_images()
-        
-        if message == f"{XIAOTIAN_NAME}，列出字体":
-            return self._list_fonts()
-        
-        # 发送天气报告
-        if message == f"{XIAOTIAN_NAME}，发送天气":
-            return ("SEND_WEATHER", None)
-        
-        # 发送天文海报
-        if message == f"{XIAOTIAN_NAME}，发送海报":
-            return ("SEND_ASTRONOMY", None)
+        router.exact("{name}，列出图片", lambda rest, user_id: self._list_images())
+        router.exact("{name}，列出字体", lambda rest, user_id: self._list_fonts())
         
         # 通用助手设置命令
-        if message.startswith("set：") or message.startswith("set:"):
-            return self._handle_custom_settings(message)
-            
-        # 生成月度合集
-        if message == f"{XIAOTIAN_NAME}，生成月度合集":
-            return ("GENERATE_MONTHLY", None)
-        
-        # 立即执行清理
-        if message == f"{XIAOTIAN_NAME}，立即清理":
-            return ("CLEANUP_NOW", None)
-        
-        # 重置用户like系统
-        if message.startswith(f"{XIAOTIAN_NAME}，重置like系统："):
-            user_key = message.replace(f"{XIAOTIAN_NAME}，重置like系统：", "").strip()
-            return ("RESET_LIKE_SYSTEM", user_key)
+        router.prefix("set：", lambda rest, user_id: self._handle_custom_settings(rest))
+        router.prefix("set:", lambda rest, user_id: self._handle_custom_settings(rest))
         
-        # 重置所有like系统
-        if message == f"{XIAOTIAN_NAME}，重置所有like系统":
-            return ("RESET_ALL_LIKE_SYSTEMS", None)
-        
-        return None
+        # 交给调度器执行的命令
+        router.exact("{name}，发送天气", lambda rest, user_id: ("SEND_WEATHER", None))
+        router.exact("{name}，发送海报", lambda rest, user_id: ("SEND_ASTRONOMY", None))
+        router.exact("{name}，生成月度合集", lambda rest, user_id: ("GENERATE_MONTHLY", None))
+        router.exact("{name}，立即清理", lambda rest, user_id: ("CLEANUP_NOW", None))
+        router.prefix("{name}，重置like系统：", lambda rest, user_id: ("RESET_LIKE_SYSTEM", rest.strip()))
+        router.exact("{name}，重置所有like系统", lambda rest, user_id: ("RESET_ALL_LIKE_SYSTEMS", None))
+        return router
+    
+    def _request_image(self, filename: str, user_id: str) -> Tuple[str, None]:
+        """记录等待上传的图片，收到图片后保存为filename"""
+        self.pending_operations[user_id] = {"type": "image", "name": filename.strip()}
+        return ("📸 请发送要保存的图片", None)
+    
+    @staticmethod
+    def _split_groups(text: str) -> List[str]:
+        """把逗号分隔的群号拆成列表"""
+        return [g.strip() for g in text.strip().split(',') if g.strip()]
+    
+    def _parse_trigger_limit(self, text: str) -> Tuple[str, None]:
+        """设置每日触发限制"""
+        try:
+            return self._set_trigger_limit(int(text.strip()))
+        except ValueError:
+            return ("❌ 触发限制必须是数字", None)
     
     def _save_image(self, filename: str, image_data: bytes) -> Tuple[str, None]:
         """保存图片文件"""
@@ -409,8 +341,6 @@ class RootManager:
         """向目标群组发送欢迎消息和图片
         参考 MessageSender.send_message_to_groups 的实现
         """
-        import os
-        import time
         import random
         
         if self.settings['qq_send_callback'] and group_id:
@@ -424,16 +354,15 @@ class RootManager:
                 print(f"正在发送欢迎消息到群组 {group_id}...")
                 # 处理图片路径
                 wait_time = 3
-                time.sleep(wait_time + random.uniform(-1, 1))
-                # 先发送图片，后发送文本
+                # 先发送图片，后发送文本（延时在该群的发送队列中计时）
                 print(f"先发送图片到群组 {group_id}")
-                self.settings['qq_send_callback']('group', group_id, None, image_path )
-                    # 添加短暂延时，确保图片发送完成
-                time.sleep(10 + random.uniform(0, 1))
-                # 如果有文本消息，再发送文本
+                self.settings['qq_send_callback']('group', group_id, None, image_path,
+                                                  delay=wait_time + random.uniform(-1, 1))
+                # 图片发出后稍等再发送文本
                 if message:
                     print(f"再发送文本到群组 {group_id}")
-                    self.settings['qq_send_callback']('group', group_id, message, None)
+                    self.settings['qq_send_callback']('group', group_id, message, None,
+                                                      delay=10 + random.uniform(0, 1))
             except Exception as e:
                 print(f"发送欢迎消息到群组 {group_id} 失败：{e}")
                 # 静默处理错误
@@ -513,8 +442,59 @@ class RootManager:
             status = "✅" if enabled else "❌"
             settings_text += f"  {status} {feature}\n"
         
+        # 模型调用排队情况
+        from ..ai.llm_limiter import get_llm_limiter
+        from ..ai.response_cache import get_response_cache
+        settings_text += "\n" + get_llm_limiter().get_status()
+        settings_text += "\n" + get_response_cache().get_stats()
+        settings_text += "\n" + get_keyword_matcher().get_status()
+        
         return (settings_text.strip(), None)
     
+    def _clear_response_cache(self) -> Tuple[str, None]:
+        """清除系统提示词查询的回复缓存"""
+        from ..ai.response_cache import get_response_cache
+        count = get_response_cache().clear()
+        return (f"🧹 已清除 {count} 条回复缓存", None)
+    
+    def _apply_keyword_lists(self):
+        """把保存的自定义关键词分类载入关键词匹配器"""
+        matcher = get_keyword_matcher()
+        for category, keywords in self.settings.get('keyword_lists', {}).items():
+            matcher.set_category(category, keywords)
+    
+    def _set_keywords(self, content: str) -> Tuple[str, None]:
+        """设置一个关键词分类，格式：分类 词1,词2,...；不给关键词时恢复默认（自定义分类则删除）"""
+        parts = content.strip().split(None, 1)
+        if not parts:
+            return ("❌ 请使用格式：设置关键词：分类 词1,词2", None)
+        category = parts[0]
+        if category == 'trigger':
+            return ("❌ 唤醒词随吉祥物名称变化，请使用set命令修改", None)
+        keywords = [k.strip() for k in re.split(r'[,，]', parts[1]) if k.strip()] if len(parts) > 1 else []
+        
+        keyword_lists = self.settings.setdefault('keyword_lists', {})
+        if keywords:
+            keyword_lists[category] = keywords
+        else:
+            keyword_lists.pop(category, None)
+            keywords = EMOTION_KEYWORDS.get(category, [])
+        get_keyword_matcher().set_category(category, keywords)
+        self.save_settings()
+        
+        if keywords:
+            return (f"✅ 关键词分类 {category} 已更新，共{len(keywords)}个：{'，'.join(keywords)}", None)
+        return (f"✅ 已删除关键词分类 {category}", None)
+    
+    def _list_keywords(self) -> Tuple[str, None]:
+        """列出所有关键词分类"""
+        matcher = get_keyword_matcher()
+        lines = ["🔑 关键词分类："]
+        for category in matcher.categories:
+            custom = "（自定义）" if category in self.settings.get('keyword_lists', {}) else ""
+            lines.append(f"{category}{custom}：{'，'.join(matcher.get_category(category))}")
+        return ("\n".join(lines), None)
+    
     def _show_custom_settings(self) -> Tuple[str, None]:
         """显示当前自定义设置"""
         try:
@@ -674,14 +654,10 @@ class RootManager:
         """获取目标群组"""
         return self.settings['target_groups']
     
-    def _handle_custom_settings(self, message: str) -> Tuple[str, Any]:
-        """处理通用助手设置命令"""
+    def _handle_custom_settings(self, content: str) -> Tuple[str, Any]:
+        """处理通用助手设置命令，content为 "set：" 之后的内容"""
         try:
-            # 移除前缀
-            if message.startswith("set："):
-                content = message[3:].strip()
-            else:  # set:
-                content = message[4:].strip()
+            content = content.strip()
                 
             # 解析参数：吉祥物名称+性格+海报名字+竞答名字
             parts = content.split(' ')
@@ -0,0 +1,151 @@
+"""
+小天的定时器模块
+所有定时任务（每日任务、竞答题目超时、案件超时、海报等图超时）按精确的到期时间放进一个最小堆，
+定时线程只在最近的到期时间醒来，没有定时器时一直休眠，不再轮询
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class Timer:
+    """一个已登记的定时器，可以取消"""
+
+    __slots__ = ('when', 'func', 'args', 'key', 'cancelled')
+
+    def __init__(self, when: float, func: Callable, args: tuple, key: Hashable = None):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.key = key
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerService:
+    """基于最小堆的定时器服务
+
+    call_at/call_later 登记一次性定时器；带key登记时会替换同一key的旧定时器，
+    适合"每个群一个题目截止时间"这类会反复改期的定时器。
+    daily_at 登记每天固定时刻执行的任务，执行后自动登记下一次。
+    回调在定时线程中执行，应尽快返回；耗时的任务交给 JobExecutor 执行。
+    """
+
+    def __init__(self, name: str = "timer-service"):
+        self.name = name
+        self._heap: List[Tuple[float, int, Timer]] = []
+        self._keyed: Dict[Hashable, Timer] = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+    def start(self):
+        """启动定时线程"""
+        with self._cond:
+            if self.is_running:
+                return
+            self.is_running = True
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止定时线程，未到期的定时器不再执行"""
+        with self._cond:
+            self.is_running = False
+            self._cond.notify()
+
+    def call_at(self, when: float, func: Callable, *args, key: Hashable = None) -> Timer:
+        """在时间戳when执行func(*args)"""
+        timer = Timer(when, func, args, key)
+        with self._cond:
+            if key is not None:
+                old = self._keyed.get(key)
+                if old is not None:
+                    old.cancel()
+                self._keyed[key] = timer
+            heapq.heappush(self._heap, (when, next(self._counter), timer))
+            # 新定时器成为最早到期的定时器时唤醒定时线程重新计算等待时间
+            if self._heap[0][2] is timer:
+                self._cond.notify()
+        return timer
+
+    def call_later(self, delay: float, func: Callable, *args, key: Hashable = None) -> Timer:
+        """在delay秒后执行func(*args)"""
+        return self.call_at(time.time() + delay, func, *args, key=key)
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消指定key的定时器"""
+        with self._cond:
+            timer = self._keyed.pop(key, None)
+        if timer is None:
+            return False
+        timer.cancel()
+        return True
+
+    def scheduled(self, key: Hashable) -> Optional[float]:
+        """返回指定key的定时器的到期时间，没有时返回None"""
+        timer = self._keyed.get(key)
+        return None if timer is None or timer.cancelled else timer.when
+
+    def daily_at(self, time_str: str, func: Callable, *args) -> Timer:
+        """每天在time_str（HH:MM）执行func(*args)，从下一个到达的时刻开始"""
+        hour, minute = map(int, time_str.split(':'))
+
+        key = ('daily', hour, minute, func, args)
+
+        def run_daily():
+            # 先登记明天的任务，本次执行失败也不影响之后的调度
+            self._schedule_daily(hour, minute, run_daily, key)
+            func(*args)
+
+        return self._schedule_daily(hour, minute, run_daily, key)
+
+    def _schedule_daily(self, hour: int, minute: int, run_daily: Callable, key: Hashable) -> Timer:
+        now = datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return self.call_at(next_run.timestamp(), run_daily, key=key)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                timer = None
+                while self.is_running and timer is None:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    _, _, timer = heapq.heappop(self._heap)
+                    if timer.cancelled:
+                        timer = None
+                        continue
+                    if timer.key is not None and self._keyed.get(timer.key) is timer:
+                        del self._keyed[timer.key]
+                if not self.is_running:
+                    return
+            self._fire(timer)
+
+    def _fire(self, timer: Timer):
+        """执行到期的定时器"""
+        try:
+            timer.func(*timer.args)
+        except Exception as e:
+            print(f"❌ 定时任务执行失败：{e}")
+            import traceback
+            print(traceback.format_exc())
+
+    def pending(self) -> int:
+        """未执行的定时器数量（包括已取消但尚未出堆的）"""
+        with self._cond:
+            return len(self._heap)
@@ -0,0 +1,144 @@
+"""
+小天的唤醒状态模块
+每个(群, 用户)单独记录唤醒状态，可以同时在多个群中保持唤醒；
+到期时间放在最小堆中，过期的唤醒状态从堆顶取出清理，不需要遍历所有状态
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from .config import WAKEUP_TIMEOUT, WAKEUP_CONTINUE_TIMEOUT, WAKEUP_OTHER_USER_TIMEOUT
+
+
+class WakeupSession:
+    """一个用户在一个群中的唤醒状态
+
+    到期时间 = 开始时间 + 超时时间 + 回复等待时间累计，
+    AI生成和发送回复所花的时间不计入超时。
+    """
+
+    __slots__ = ('group_id', 'user_id', 'started', 'timeout', 'response_time', 'scheduled')
+
+    def __init__(self, group_id: str, user_id: str):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.started = 0.0
+        self.timeout = 0.0
+        self.response_time = 0.0
+        # 堆中仍然有效的到期时间（较晚的旧条目在取出时被忽略）
+        self.scheduled: Optional[float] = None
+
+    @property
+    def deadline(self) -> float:
+        return self.started + self.timeout + self.response_time
+
+
+class WakeupSessions:
+    """按(群, 用户)索引的唤醒状态表"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: Dict[Tuple[str, str], WakeupSession] = {}
+        # 群 -> 该群中处于唤醒状态的用户
+        self.by_group: Dict[str, Set[str]] = {}
+        self._heap: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._counter = itertools.count()
+
+    def _schedule(self, session: WakeupSession):
+        """到期时间早于堆中已有的条目时放入新条目（调用方持有锁）
+
+        延长到期时间不需要入堆，旧条目到期取出时会按新的到期时间重新放入。
+        """
+        deadline = session.deadline
+        if session.scheduled is None or deadline < session.scheduled:
+            heapq.heappush(self._heap, (deadline, next(self._counter), (session.group_id, session.user_id)))
+            session.scheduled = deadline
+
+    def _reap(self, now: float) -> List[WakeupSession]:
+        """取出所有已到期的唤醒状态（调用方持有锁）"""
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            session = self.sessions.get(key)
+            if session is None or session.scheduled != deadline:
+                continue
+            session.scheduled = None
+            if session.deadline > now:
+                # 期间被延长过，按新的到期时间重新入堆
+                self._schedule(session)
+                continue
+            del self.sessions[key]
+            users = self.by_group.get(session.group_id)
+            if users is not None:
+                users.discard(session.user_id)
+                if not users:
+                    del self.by_group[session.group_id]
+            expired.append(session)
+        return expired
+
+    def reap(self, now: float = None) -> List[WakeupSession]:
+        """清理已到期的唤醒状态，返回被清理的状态"""
+        with self.lock:
+            expired = self._reap(time.time() if now is None else now)
+        for session in expired:
+            print(f"群 {session.group_id} 用户 {session.user_id} 的唤醒状态超时，已自动关闭")
+        return expired
+
+    def is_awake(self, group_id: str, user_id: str) -> bool:
+        """检查用户在该群中是否处于唤醒状态"""
+        self.reap()
+        return (group_id, user_id) in self.sessions
+
+    def group_awake(self, group_id: str) -> bool:
+        """检查该群中是否有用户处于唤醒状态"""
+        self.reap()
+        return group_id in self.by_group
+
+    def wake(self, group_id: str, user_id: str, timeout: float = WAKEUP_TIMEOUT) -> WakeupSession:
+        """唤醒或重新计时，回复等待时间累计清零"""
+        key = (group_id, user_id)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = WakeupSession(group_id, user_id)
+                self.sessions[key] = session
+                self.by_group.setdefault(group_id, set()).add(user_id)
+            session.started = time.time()
+            session.timeout = timeout
+            session.response_time = 0.0
+            self._schedule(session)
+        return session
+
+    def touch(self, group_id: str, user_id: str) -> WakeupSession:
+        """唤醒状态中的同一用户继续发消息，重新计时"""
+        return self.wake(group_id, user_id, WAKEUP_CONTINUE_TIMEOUT)
+
+    def shorten_others(self, group_id: str, user_id: str, timeout: float = WAKEUP_OTHER_USER_TIMEOUT) -> int:
+        """群里其他用户发言时缩短该群其余唤醒状态的超时时间，返回受影响的数量"""
+        count = 0
+        with self.lock:
+            for other in self.by_group.get(group_id, ()):
+                if other == user_id:
+                    continue
+                session = self.sessions[(group_id, other)]
+                if session.timeout > timeout:
+                    session.timeout = timeout
+                    self._schedule(session)
+                    count += 1
+        return count
+
+    def add_response_time(self, group_id: str, user_id: str, seconds: float) -> Optional[float]:
+        """累加回复等待时间，返回新的累计值，不在唤醒状态时返回None"""
+        with self.lock:
+            session = self.sessions.get((group_id, user_id))
+            if session is None:
+                return None
+            session.response_time += seconds
+            return session.response_time
+
+    def __len__(self):
+        return len(self.sessions)
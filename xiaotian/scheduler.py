@@ -6,20 +6,23 @@
 import os
 import re
 import random
-from datetime import datetime as dt, datetime, timedelta
-from threading import Thread
-from typing import List, Callable, Tuple, Optional, Any, Dict
+import asyncio
+import threading
+from datetime import datetime as dt, timedelta
+from typing import List, Callable, Tuple, Optional, Any, Dict, Union
 import time
 import requests
 import tempfile
 
 from .manage.config import (
-    DAILY_WEATHER_TIME, TRIGGER_WORDS,
+    DAILY_WEATHER_TIME,
     DAILY_ASTRONOMY_TIME, MONTHLY_ASTRONOMY_TIME, CLEANUP_TIME,
-    MONTHLY_LIKE_REWARD_TIME, MAX_MEMORY_COUNT, MEMORY_FILE,
-    DAILY_ASTRONOMY_MESSAGE, XIAOTIAN_NAME
+    MONTHLY_LIKE_REWARD_TIME, MAX_MEMORY_COUNT,
+    DAILY_ASTRONOMY_MESSAGE, XIAOTIAN_NAME, STREAM_RESPONSES, WAKEUP_OTHER_USER_TIMEOUT
 )
-from .ai.ai_core import XiaotianAI
+from .ai.ai_core import XiaotianAI, get_shared_ai
+from .ai.llm_limiter import PRIORITY_URGENT, PRIORITY_CHAT
+from .ai.keyword_matcher import get_keyword_matcher, leading_keyword
 
 from .tools.weather_tools import WeatherTools
 from .tools.astronomy import AstronomyPoster
@@ -28,56 +31,73 @@ from .tools.criminal import CriminalCase
 from .tools.welcome import WelcomeManager
 from .manage.root_manager import RootManager
 from .manage.like_manager import LikeManager
+from .manage.command_router import CommandRouter, current_names
+from .manage.wakeup_sessions import WakeupSessions
+from .manage.job_executor import get_job_executor, group_lane, private_lane
+from .tools.poster_render import get_poster_renderer
 from .tools.message import MessageSender
 
+# 竞答命令后的题目数量，以及对冲命令 "与[@用户]对冲[金额]" / "与[QQ号]对冲[金额]" 中的参数
+_QUIZ_COUNT = re.compile(r'\s*(\d+)')
+_HEDGING_AT = re.compile(r'\s*\[CQ:at,qq=(\d+)\]\s*对冲\s*([0-9.]+)')
+_HEDGING_ID = re.compile(r'\s*([^\s]+)\s*对冲\s*([0-9.]+)')
 
-class SimpleScheduler:
-    """定时任务调度器"""
-    def __init__(self):
-        self.tasks = []
-        self.is_running = False
-    
-    def daily_at(self, time_str: str, func):
-        """添加每日定时任务"""
-        hour, minute = map(int, time_str.split(':'))
-        self.tasks.append({
-            'type': 'daily',
-            'hour': hour,
-            'minute': minute,
-            'func': func,
-            'last_run': None
-        })
-    
-    def run_pending(self):
-        """检查并执行待运行的任务"""
-        now = dt.now()
-        for task in self.tasks:
-            if task['type'] == 'daily':
-                task_time = now.replace(hour=task['hour'], minute=task['minute'], second=0, microsecond=0)
-                
-                # 如果当前时间已过任务时间，且今天还没运行过，且不是刚启动
-                if (now >= task_time and 
-                    (task['last_run'] is None or task['last_run'].date() < now.date()) and
-                    task.get('initialized', False)):  # 防止启动时立即执行
-                    try:
-                        task_name = task['func'].__name__
-                        print(f"⏰ {now.strftime('%H:%M:%S')} - 执行定时任务: {task_name}")
-                        task['func']()
-                        task['last_run'] = now
-                        print(f"✅ {now.strftime('%H:%M:%S')} - 定时任务完成: {task_name}")
-                    except Exception as e:
-                        print(f"❌ 定时任务执行失败：{e}")
-                        import traceback
-                        print(traceback.format_exc())
-                
-                # 标记任务已初始化
-                if not task.get('initialized', False):
-                    task['initialized'] = True
+
+class ChatRequest:
+    """需要交给AI生成回复的对话请求
+
+    消息路由只决定要问AI什么，真正的模型调用由同步或异步的处理入口完成，
+    这样异步入口可以在等待模型时让出事件循环。
+    """
+
+    def __init__(self, content: str, user_id: str, group_id: str = None,
+                 use_tools: bool = False, track_time: bool = False, priority: int = PRIORITY_CHAT):
+        self.content = content
+        self.user_id = user_id
+        self.group_id = group_id
+        self.use_tools = use_tools
+        # 模型调用排队优先级
+        self.priority = priority
+        # 是否把AI耗时累加到唤醒超时计算中
+        self.track_time = track_time
+
+
+class Reply:
+    """不经过AI、由命令直接生成的回复
+
+    parts为按顺序发送的 (wait_time, content) 列表，like为要累加到用户好感度上的变化值。
+    发送端直接使用这些字段，只有模型生成的文本才需要按JSON解析。
+    """
+
+    def __init__(self, parts: List[Tuple[float, str]] = None, like: float = 0, not_even_wrong: bool = False):
+        self.parts = [(wait_time, content) for wait_time, content in (parts or []) if content]
+        self.like = like
+        self.not_even_wrong = not_even_wrong
+
+    @classmethod
+    def text(cls, content: str, wait_time: float = 3) -> "Reply":
+        """只有一条消息的回复"""
+        return cls([(wait_time, content)])
+
+    @property
+    def wait_times(self) -> List[float]:
+        return [wait_time for wait_time, _ in self.parts]
+
+    @property
+    def contents(self) -> List[str]:
+        return [content for _, content in self.parts]
+
+    def __bool__(self):
+        return bool(self.parts) or bool(self.like)
+
+    def __repr__(self):
+        return f"Reply(parts={self.parts!r}, like={self.like!r}, not_even_wrong={self.not_even_wrong!r})"
 
 
 class XiaotianScheduler:
     def __init__(self, root_id: str = None, qq_send_callback=None, ai = None):
-        # 初始化核心组件
+        # 初始化核心组件，所有工具共用同一个AI实例
+        ai = ai or get_shared_ai()
         self.ai = ai
         
         # 先初始化 RootManager，因为其他组件依赖它
@@ -88,301 +108,402 @@ class XiaotianScheduler:
             self.root_manager.set_ai_instance(ai)
         
         # 然后初始化需要 RootManager 的组件
-        self.weather_tools = WeatherTools(root_manager=self.root_manager)
-        self.scheduler = SimpleScheduler()
+        self.weather_tools = WeatherTools(root_manager=self.root_manager, ai_core=ai)
+        # 定时器到期后只登记任务，任务由执行器按群串行、跨群并行地执行
+        self.jobs = get_job_executor()
+        self.timers = self.jobs.timers
         
         # 初始化新功能组件
-        self.astronomy = AstronomyPoster(root_manager=self.root_manager)
+        self.astronomy = AstronomyPoster(root_manager=self.root_manager, ai_core=ai)
         self.astronomy_quiz = AstronomyQuiz(root_manager=self.root_manager, ai_core=ai)  # 初始化天文竞答
         self.criminal_case = CriminalCase(root_manager=self.root_manager, ai_core=ai)  # 初始化案件还原功能
         self.welcome_manager = WelcomeManager(root_manager=self.root_manager, ai=ai)  # 初始化欢迎管理器
         self.like_manager = LikeManager(root_manager=self.root_manager, ai=ai)  # 初始化好感度管理器
-        self.wait_for_wakeup = False
-        self.wakeup_time = 0  # 唤醒时间戳
-        self.waiting_time = 20  # 默认唤醒超时时间（20秒）
-        self.ai_response_time = 0  # AI回复等待时间累计
-        self.last_user_id: str = None  # 最后一个用户ID
-        self.last_group_id: str = None  # 最后一个群组ID
+        # 每个(群, 用户)的唤醒状态
+        self.wakeup_sessions = WakeupSessions()
 
         # 设置QQ发送回调
         if qq_send_callback:
             self.root_manager.set_qq_callback(qq_send_callback)
         self.message_sender = MessageSender(self.root_manager, self.ai)
         
-        self.is_running = False
-        
-    def add_response_wait_time(self, wait_seconds: float):
-        """累加回复等待时间，用于唤醒状态超时计算"""
-        if self.wait_for_wakeup:
-            self.ai_response_time += wait_seconds
-            print(f"⏱️ 累加等待时间: {wait_seconds:.2f}秒，总计: {self.ai_response_time:.2f}秒")
-        
-    def _check_special_user_commands(self, user_id: str, message: str, group_id: str = None) -> Optional[str]:
-        """检查用户特殊提示词命令"""
-        memory_key = self.ai._get_memory_key(user_id, group_id)
+        # 用户特殊命令路由，吉祥物名称修改后自动重建
+        self.command_router = self._build_command_router()
         
-        # 检查天文竞答命令
-        from .manage.config import XIAOTIAN_NAME, QUIZ_NAME
-        mascot_name = XIAOTIAN_NAME
-        quiz_name = QUIZ_NAME if 'QUIZ_NAME' in globals() else "天文竞答"
+        # 消息路由会修改竞答、案件等按群保存的状态，同一个群（私聊按用户）的路由需要串行，
+        # 不同群之间互不阻塞，一个群里等待模型的命令不会拖住其他群
+        self._lane_locks: Dict[tuple, threading.Lock] = {}
+        self._lane_locks_guard = threading.Lock()
         
-        # 动态构建匹配模式
-        quiz_pattern = f"{mascot_name} {quiz_name}"
+        self.is_running = False
         
-        if message.strip().startswith(quiz_pattern) and group_id:
+    def _lane_lock(self, user_id: str = None, group_id: str = None) -> threading.Lock:
+        """获取该群（私聊为该用户）的路由锁"""
+        lane = group_lane(group_id) if group_id else private_lane(user_id)
+        with self._lane_locks_guard:
+            lock = self._lane_locks.get(lane)
+            if lock is None:
+                lock = self._lane_locks[lane] = threading.Lock()
+            return lock
+
+    def add_response_wait_time(self, wait_seconds: float, user_id: str = None, group_id: str = None):
+        """累加回复等待时间，用于该用户唤醒状态的超时计算"""
+        if group_id is None:
+            return
+        total = self.wakeup_sessions.add_response_time(group_id, user_id, wait_seconds)
+        if total is not None:
+            print(f"⏱️ 累加等待时间: {wait_seconds:.2f}秒，总计: {total:.2f}秒")
+        
+    def _build_command_router(self) -> CommandRouter:
+        """声明用户特殊命令，{name}为吉祥物名称，{trigger}为唤醒词，{quiz}为竞答名称"""
+        router = CommandRouter()
+        router.prefix("{name} {quiz}", self._start_quiz_command)
+        router.exact("{name} 案件还原", self._start_case_command)
+        router.exact("结算", self._finish_quiz_command)
+        router.exact("结束竞答", self._finish_quiz_command)
+        router.prefix("{trigger}更改性格", self._change_personality_command)
+        router.exact("{trigger}回到最初的性格", self._reset_personality_command)
+        router.prefix("{name}，与", self._hedging_command)
+        return router
+
+    def _check_special_user_commands(self, user_id: str, message: str, group_id: str = None) -> Optional[Reply]:
+        """检查用户特殊提示词命令"""
+        return self.command_router.dispatch(message.strip(), user_id, group_id)
+
+    def _start_quiz_command(self, rest: str, user_id: str, group_id: str) -> Optional[Reply]:
+        """开启天文竞答，可以在命令后指定题目数量"""
+        if not group_id:
             # 只在群聊中开启竞答
-            question_count = 10  # 默认题目数量
-            
-            # 检查是否有指定题目数量
-            match = re.search(f"{mascot_name} {quiz_name}\\s*(\\d+)?", message.strip())
-            if match and match.group(1):
-                try:
-                    count = int(match.group(1))
-                    if 3 <= count <= 50:  # 限制范围在3-50之间
-                        question_count = count
-                    else:
-                        return f'{{"data": [{{"wait_time": 1, "content": "⚠️ 题目数量必须在3-50之间！将使用默认数量10题。"}}], "like": 0}}'
-                except ValueError:
-                    pass  # 解析失败，使用默认值
-                    
-            # 获取开始提示和第一题
-            result, message = self.astronomy_quiz.start_quiz(group_id, question_count)
-            if message:
-                # 分开发送这两条消息，中间延迟4秒
-                return f'{{"data": [{{"wait_time": 1, "content": "{result}"}}, {{"wait_time": 3, "content": "{message}"}}], "like": 0}}'
-            return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}], "like": 0}}'
-            
-        # 检查案件还原命令
-        from .manage.config import XIAOTIAN_NAME
-        mascot_name = XIAOTIAN_NAME
-        case_pattern = f"{mascot_name} 案件还原"
-        if message.strip() == case_pattern and group_id:
-            # 只在群聊中开启案件还原
-            result = self.criminal_case.start_case(group_id, user_id)
-            return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}], "like": 0}}'
-            
-        # 检查是否是竞答结束命令
-        if message.strip() in ["结算", "结束竞答"] and group_id and group_id in self.astronomy_quiz.active_quizzes:
-            result1, result2 = self.astronomy_quiz.finish_quiz(group_id, user_id)
-            # 分开发送结束通知和结果详情，中间延迟4秒
-            if result2:
-                return f'{{"data": [{{"wait_time": 3, "content": "{result1}"}}, {{"wait_time": 4, "content": "{result2}"}}], "like": 0}}'
+            return None
+        question_count = 10  # 默认题目数量
+        
+        # 检查是否有指定题目数量
+        match = _QUIZ_COUNT.match(rest)
+        if match:
+            count = int(match.group(1))
+            if 3 <= count <= 50:  # 限制范围在3-50之间
+                question_count = count
             else:
-                return f'{{"data": [{{"wait_time": 3, "content": "{result1}"}}], "like": 0}}'
+                return Reply.text("⚠️ 题目数量必须在3-50之间！将使用默认数量10题。", wait_time=1)
                 
-        # 非特殊模式下继续正常处理
-                    
-        # 动态构建更改性格命令
-        from .manage.config import TRIGGER_WORDS
-        trigger_word = TRIGGER_WORDS[0] if TRIGGER_WORDS else "小天，"
-        change_personality_command = f"{trigger_word}更改性格"
-        
-        # 检查更改性格命令
-        if message.startswith(change_personality_command):
-            # 检查用户like值是否达到条件
-            user_like_status = self.ai.get_user_like_status(self.ai._extract_user_id_from_memory_key(memory_key))
-            current_like = user_like_status['total_like']
-            
-            if abs(current_like) < 150:
-                return f'{{"wait_time": 3, "content": "❌ 更改性格需要like值达到150或低于-150！\\n你当前的like值：{current_like:.2f}"}}'
-            
-            # 提取新性格描述
-            command_len = len(change_personality_command)
-            if len(message) > command_len:
-                new_personality = message[command_len:].strip()
-                if new_personality:
-                    # 调用AI的性格更改工具
-                    result = self.ai.generate_custom_personality(new_personality, memory_key)
-                    return f'{"wait_time": 3, "content": "🎭 {result}"}'
-                else:
-                    return f'{{"wait_time": 3, "content": "❌ 请提供新的性格描述，例如：{change_personality_command}活泼开朗"}}'
-            else:
-                return f'{{"wait_time": 3, "content": "❌ 请提供新的性格描述，例如：{change_personality_command}活泼开朗"}}'
-        
-        # 检查回到最初性格命令
-        reset_personality_command = f"{trigger_word}回到最初的性格"
-        if message.strip() == reset_personality_command:
-            # 检查用户like值是否达到条件
-            user_like_status = self.ai.get_user_like_status(self.ai._extract_user_id_from_memory_key(memory_key))
-            current_like = user_like_status['total_like']
-            
-            if abs(current_like) < 150:
-                return f'{{"wait_time": 3, "content": "❌ 回到最初性格需要like值达到150或低于-150！\\n你当前的like值：{current_like:.2f}"}}'
-            
-            # 调用AI的恢复性格工具
-            result = self.ai.restore_original_personality(memory_key)
-            return f'{{"wait_time": 3, "content": "🔄 {result}"}}'
+        # 获取开始提示和第一题
+        result, message = self.astronomy_quiz.start_quiz(group_id, question_count)
+        if message:
+            # 分开发送这两条消息，中间延迟4秒
+            return Reply([(1, result), (3, message)])
+        return Reply.text(result)
+
+    def _start_case_command(self, rest: str, user_id: str, group_id: str) -> Optional[Reply]:
+        """开启案件还原（只在群聊中）"""
+        if not group_id:
+            return None
+        result = self.criminal_case.start_case(group_id, user_id)
+        return Reply.text(result)
+
+    def _finish_quiz_command(self, rest: str, user_id: str, group_id: str) -> Optional[Reply]:
+        """结束正在进行的竞答"""
+        if not group_id or group_id not in self.astronomy_quiz.active_quizzes:
+            return None
+        result1, result2 = self.astronomy_quiz.finish_quiz(group_id, user_id)
+        # 分开发送结束通知和结果详情，中间延迟4秒
+        if result2:
+            return Reply([(3, result1), (4, result2)])
+        return Reply.text(result1)
+
+    def _change_personality_command(self, rest: str, user_id: str, group_id: str) -> Reply:
+        """更改性格"""
+        memory_key = self.ai._get_memory_key(user_id, group_id)
+        # 检查用户like值是否达到条件
+        user_like_status = self.ai.get_user_like_status(self.ai._extract_user_id_from_memory_key(memory_key))
+        current_like = user_like_status['total_like']
+        
+        if abs(current_like) < 150:
+            return Reply.text(f"❌ 更改性格需要like值达到150或低于-150！\n你当前的like值：{current_like:.2f}")
+        
+        # 提取新性格描述
+        new_personality = rest.strip()
+        if not new_personality:
+            example = current_names()['trigger'] + "更改性格"
+            return Reply.text(f"❌ 请提供新的性格描述，例如：{example}活泼开朗")
+        # 调用AI的性格更改工具
+        result = self.ai.generate_custom_personality(new_personality, memory_key)
+        return Reply.text(f"🎭 {result}")
+
+    def _reset_personality_command(self, rest: str, user_id: str, group_id: str) -> Reply:
+        """回到最初的性格"""
+        memory_key = self.ai._get_memory_key(user_id, group_id)
+        # 检查用户like值是否达到条件
+        user_like_status = self.ai.get_user_like_status(self.ai._extract_user_id_from_memory_key(memory_key))
+        current_like = user_like_status['total_like']
         
-        # 检查对冲like值命令
-        from .manage.config import XIAOTIAN_NAME
-        mascot_name = XIAOTIAN_NAME  # 动态获取吉祥物名称
-        hedging_prefix = f"{mascot_name}，与"
+        if abs(current_like) < 150:
+            return Reply.text(f"❌ 回到最初性格需要like值达到150或低于-150！\n你当前的like值：{current_like:.2f}")
         
-        if message.startswith(hedging_prefix) and ("对冲" in message):
-            # 提取目标用户ID和对冲金额
-            try:
-                # 首先尝试匹配CQ码格式的@用户 - [CQ:at,qq=123456789]
-                at_pattern = re.compile(f'{re.escape(hedging_prefix)}\\s*\\[CQ:at,qq=(\\d+)\\]\\s*对冲\\s*([0-9.]+)')
-                at_match = at_pattern.search(message)
-                
-                if at_match:
-                    # 直接从CQ码中提取QQ号
-                    target_user_id = at_match.group(1).strip()
-                    transfer_amount = float(at_match.group(2).strip())
-                    
-                    if target_user_id and transfer_amount > 0:
-                        # 调用AI的like值转移功能（指定金额）
-                        result = self.ai.transfer_like_value(memory_key, target_user_id, transfer_amount, group_id)
-                        return f'{{"wait_time": 3, "content": "{result}"}}'
-                    else:
-                        return '{"wait_time": 3, "content": "❌ 请提供有效的用户和对冲金额"}'
-                
-                # 如果不是@格式，继续支持原有的QQ号格式
-                normal_pattern = re.compile(f'{re.escape(hedging_prefix)}\\s*([^\\s]+)\\s*对冲\\s*([0-9.]+)')
-                match = normal_pattern.search(message)
+        # 调用AI的恢复性格工具
+        result = self.ai.restore_original_personality(memory_key)
+        return Reply.text(f"🔄 {result}")
+
+    def _hedging_command(self, rest: str, user_id: str, group_id: str) -> Optional[Reply]:
+        """与其他用户对冲like值：{name}，与[@用户]对冲[金额] 或 {name}，与[QQ号]对冲[金额]"""
+        if "对冲" not in rest:
+            return None
+        memory_key = self.ai._get_memory_key(user_id, group_id)
+        try:
+            # 首先尝试匹配CQ码格式的@用户 - [CQ:at,qq=123456789]
+            at_match = _HEDGING_AT.match(rest)
+            if at_match:
+                # 直接从CQ码中提取QQ号
+                target_user_id = at_match.group(1).strip()
+                transfer_amount = float(at_match.group(2).strip())
                 
-                if match:
-                    target_partial_id = match.group(1).strip()
-                    transfer_amount = float(match.group(2).strip())
-                    if target_partial_id and transfer_amount > 0:
-                        # 调用AI的like值转移功能（指定金额）
-                        result = self.ai.transfer_like_value(memory_key, target_partial_id, transfer_amount, group_id)
-                        return f'{{"wait_time": 3, "content": "{result}"}}'
-                    else:
-                        return '{"wait_time": 3, "content": "❌ 请提供有效的QQ号和对冲金额"}'
-                else:
-                    return f'{{"wait_time": 3, "content": "❌ 命令格式错误，请使用：{mascot_name}，与[@用户]对冲[金额] 或 {mascot_name}，与[QQ号]对冲[金额]"}}'
-            except ValueError:
-                return '{"wait_time": 3, "content": "❌ 对冲金额必须是数字"}'
-            except Exception as e:
-                print(f"处理对冲like值命令时发生错误: {e}")
-                return '{"wait_time": 3, "content": "❌ 处理命令时发生错误，请稍后重试"}'
-        
-        return None
+                if target_user_id and transfer_amount > 0:
+                    # 调用AI的like值转移功能（指定金额）
+                    result = self.ai.transfer_like_value(memory_key, target_user_id, transfer_amount, group_id)
+                    return Reply.text(result)
+                return Reply.text("❌ 请提供有效的用户和对冲金额")
+            
+            # 如果不是@格式，继续支持原有的QQ号格式
+            match = _HEDGING_ID.match(rest)
+            if match:
+                target_partial_id = match.group(1).strip()
+                transfer_amount = float(match.group(2).strip())
+                if target_partial_id and transfer_amount > 0:
+                    # 调用AI的like值转移功能（指定金额）
+                    result = self.ai.transfer_like_value(memory_key, target_partial_id, transfer_amount, group_id)
+                    return Reply.text(result)
+                return Reply.text("❌ 请提供有效的QQ号和对冲金额")
+            mascot_name = current_names()['name']
+            return Reply.text(f"❌ 命令格式错误，请使用：{mascot_name}，与[@用户]对冲[金额] 或 {mascot_name}，与[QQ号]对冲[金额]")
+        except ValueError:
+            return Reply.text("❌ 对冲金额必须是数字")
+        except Exception as e:
+            print(f"处理对冲like值命令时发生错误: {e}")
+            return Reply.text("❌ 处理命令时发生错误，请稍后重试")
         
         
     def start_scheduler(self):
         """启动调度器"""
         # 设置定时任务
-        self.scheduler.daily_at(DAILY_WEATHER_TIME, self.weather_tools.daily_weather_task)
-        self.scheduler.daily_at(DAILY_ASTRONOMY_TIME, self.astronomy.daily_astronomy_task)
-        self.scheduler.daily_at(CLEANUP_TIME, self.daily_cleanup_task)
+        self._daily_job(DAILY_WEATHER_TIME, self.weather_tools.daily_weather_task)
+        self._daily_job(DAILY_ASTRONOMY_TIME, self._daily_astronomy_task)
+        self._daily_job(CLEANUP_TIME, self.daily_cleanup_task)
         
         # 设置月度任务 - 每月1号执行
         # 注意月度合集应该在1号生成上个月的合集
-        # self.scheduler.daily_at(MONTHLY_ASTRONOMY_TIME, self.astronomy.monthly_astronomy_task)
+        # self._daily_job(MONTHLY_ASTRONOMY_TIME, self.astronomy.monthly_astronomy_task)
         
-        self.scheduler.daily_at(MONTHLY_LIKE_REWARD_TIME, self.monthly_like_reward_task)
+        self._daily_job(MONTHLY_LIKE_REWARD_TIME, self.monthly_like_reward_task)
 
+        # 竞答、案件和海报的超时由消息处理时登记的定时器精确触发
         self.is_running = True
-        
-        # 在后台线程中运行调度器
-        def run_scheduler():
-            while self.is_running:
-                try:
-                    self.scheduler.run_pending()
-
-                    # 每5秒检查一次天文海报超时状态
-                    if self.astronomy.waiting_for_images:
-                        last_time = time.time()
-                        while self.astronomy.waiting_for_images and (time.time() - last_time < 70):
-                            self.astronomy._check_astronomy_timeout()
-                            time.sleep(5)
-                    # 检查是否有活跃的案件推理
-                    if hasattr(self, 'criminal_case') and self.criminal_case and self.criminal_case.active_cases:
-                        # 检查案件超时
-                        self._check_case_timeout()
-                    # 检查是否有活跃的天文竞答
-                    if hasattr(self, 'astronomy_quiz') and self.astronomy_quiz and self.astronomy_quiz.active_quizzes:
-                        # 有活跃竞答，进入频繁检查循环
-                        for _ in range(200):  # 200次循环，每次3秒，共600秒
-                            time.sleep(3)  # 每3秒检查一次
-
-                            # 检查是否还有活跃竞答
-                            if not self.astronomy_quiz.active_quizzes:
-                                break
-                                
-                            # 检查每个活跃竞答的超时
-                            for group_id, quiz in list(self.astronomy_quiz.active_quizzes.items()):
-                                if quiz and not quiz.get("participants"):  # 只在没人回答时检查超时
-                                    current_time = datetime.now()
-                                    if "start_time" in quiz and (current_time - quiz["start_time"]).total_seconds() > quiz["duration"]:
-                                        # 检查群组是否在目标群组列表中
-                                        target_groups = self.root_manager.get_target_groups()
-                                        if group_id not in target_groups:
-                                            print(f"警告：尝试向非目标群组 {group_id} 发送竞答超时消息，已阻止。")
-                                            continue
-                                            
-                                        # 如果当前题目已超时，处理超时
-                                        result_msg1, result_msg2 = self.astronomy_quiz.handle_question_timeout(group_id)
-                                        if self.root_manager.settings.get('qq_send_callback'):
-                                            try:
-                                                # 先发送超时通知
-                                                if result_msg1:
-                                                    self.root_manager.settings['qq_send_callback']('group', group_id, result_msg1, None)
-
-                                                # 延迟5秒后发送下一题或结果
-                                                if result_msg2:
-                                                    time.sleep(5)
-                                                    self.root_manager.settings['qq_send_callback']('group', group_id, result_msg2, None)
-                                            except Exception as e:
-                                                print(f"发送题目超时消息失败: {e}")
-                    else:
-                        # 没有活跃竞答，直接睡眠60秒
-                        time.sleep(60)
-                except Exception as e:
-                    print(f"调度器主循环异常: {e}")
-                    pass
-
-        scheduler_thread = Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        self.timers.start()
         print(f"🤖 {XIAOTIAN_NAME}调度器已启动...")
 
+    def _daily_job(self, time_str: str, func):
+        """每天在time_str把任务放进执行器，每个定时任务使用自己的通道"""
+        self.timers.daily_at(time_str, self.jobs.submit, ('daily', func.__name__), self._run_daily_task, func)
+
+    def _run_daily_task(self, func):
+        task_name = func.__name__
+        print(f"⏰ {dt.now().strftime('%H:%M:%S')} - 执行定时任务: {task_name}")
+        func()
+        print(f"✅ {dt.now().strftime('%H:%M:%S')} - 定时任务完成: {task_name}")
+
+    def _daily_astronomy_task(self):
+        """每日天文海报任务，可能进入等待图片状态"""
+        self.astronomy.daily_astronomy_task()
+        self._sync_poster_timer()
+
+    def _sync_timers(self, group_id: str = None):
+        """按当前的竞答、案件和海报状态登记或取消超时定时器"""
+        if group_id:
+            self._sync_quiz_timer(group_id)
+            self._sync_case_timer(group_id)
+        self._sync_poster_timer()
+
+    def _sync_quiz_timer(self, group_id: str):
+        """登记当前题目的截止时间，题目变化时自动改期"""
+        key = ('quiz', group_id)
+        quiz = self.astronomy_quiz.active_quizzes.get(group_id)
+        if not quiz or "start_time" not in quiz:
+            self.timers.cancel(key)
+            return
+        deadline = quiz["start_time"].timestamp() + quiz["duration"]
+        if self.timers.scheduled(key) != deadline:
+            self.jobs.submit_at(deadline, group_lane(group_id), self._on_quiz_timeout, group_id, key=key)
+
+    def _on_quiz_timeout(self, group_id: str):
+        """题目到期：没人回答时公布答案并进入下一题"""
+        quiz = self.astronomy_quiz.active_quizzes.get(group_id)
+        if not quiz or "start_time" not in quiz:
+            return
+        if time.time() < quiz["start_time"].timestamp() + quiz["duration"]:
+            # 题目已经换过，按新的截止时间重新登记
+            self._sync_quiz_timer(group_id)
+            return
+        if quiz.get("participants"):
+            # 只在没人回答时处理超时，有人回答时由答题流程推进
+            return
+        # 检查群组是否在目标群组列表中
+        target_groups = self.root_manager.get_target_groups()
+        if group_id not in target_groups:
+            print(f"警告：尝试向非目标群组 {group_id} 发送竞答超时消息，已阻止。")
+            return
+            
+        # 当前题目已超时，处理超时
+        with self._lane_lock(group_id=group_id):
+            result_msg1, result_msg2 = self.astronomy_quiz.handle_question_timeout(group_id)
+            self._sync_quiz_timer(group_id)
+        if self.root_manager.settings.get('qq_send_callback'):
+            # 先发送超时通知
+            if result_msg1:
+                self._send_group_text(group_id, result_msg1, "发送题目超时消息失败")
+
+            # 延迟5秒后发送下一题或结果
+            if result_msg2:
+                self.jobs.submit_later(5, group_lane(group_id), self._send_group_text,
+                                       group_id, result_msg2, "发送题目超时消息失败")
+
+    def _send_group_text(self, group_id: str, text: str, error_prefix: str = "发送群消息失败"):
+        """通过QQ回调向群发送一条文本消息"""
+        try:
+            self.root_manager.settings['qq_send_callback']('group', group_id, text, None)
+        except Exception as e:
+            print(f"{error_prefix}: {e}")
+
+    def _sync_case_timer(self, group_id: str):
+        """登记案件的超时时间"""
+        key = ('case', group_id)
+        case = self.criminal_case.active_cases.get(group_id)
+        if not case:
+            self.timers.cancel(key)
+            return
+        deadline = case["start_time"].timestamp() + self.criminal_case.case_timeout
+        if self.timers.scheduled(key) != deadline:
+            # 到期后稍等片刻，确保超过超时时间
+            self.jobs.submit_at(deadline + 0.01, group_lane(group_id), self._check_case_timeout,
+                                group_id, key=key)
+
+    def _sync_poster_timer(self):
+        """登记天文海报等待图片的截止时间"""
+        key = 'poster'
+        if not self.astronomy.waiting_for_images or not self.astronomy.waiting_start_time:
+            self.timers.cancel(key)
+            return
+        deadline = self.astronomy.waiting_start_time + 60  # 60秒等待时间
+        if self.timers.scheduled(key) != deadline:
+            self.jobs.submit_at(deadline, 'poster', self._on_poster_timeout, key=key)
+
+    def _on_poster_timeout(self):
+        """等待图片超时，自动生成并发送海报"""
+        self.astronomy._check_astronomy_timeout()
+        # 等待期间重新开始过等待时，按新的截止时间重新登记
+        self._sync_poster_timer()
+
     def stop_scheduler(self):
         """停止调度器"""
         self.is_running = False
+        self.timers.stop()
+        get_poster_renderer().shutdown()
+        # 停止前写入缓冲中的记忆变更
+        if self.ai:
+            self.ai.flush_memory()
         print(f"🤖 {XIAOTIAN_NAME}调度器已停止")
         
-    def _check_case_timeout(self):
-        """检查案件超时状态"""
-        # 获取所有超时的案件
-        timeout_cases = self.criminal_case.check_case_timeout()
+    def _check_case_timeout(self, group_id: str):
+        """检查该群的案件超时状态"""
+        with self._lane_lock(group_id=group_id):
+            timeout_cases = self.criminal_case.check_case_timeout(group_id)
         
         # 处理每个超时案件
         for group_id, (timeout_message, truth_message) in timeout_cases.items():
-            try:
-                print(f"🕰️ 案件在群 {group_id} 超时")
-                # 发送超时消息
-                if timeout_message:
-                    self.message_sender.send_message_to_groups(timeout_message, group_id=group_id)
-                
-                # 短暂延时后发送真相
-                if truth_message:
-                    time.sleep(4 + random.uniform(0, 1))  # 添加随机延时
-                    self.message_sender.send_message_to_groups(truth_message, group_id=group_id)
-            except Exception as e:
-                print(f"发送案件超时消息时出错: {e}")
-                import traceback
-                print(traceback.format_exc())
+            print(f"🕰️ 案件在群 {group_id} 超时")
+            # 发送超时消息
+            if timeout_message:
+                self._send_case_message(group_id, timeout_message)
+            
+            # 短暂延时后发送真相
+            if truth_message:
+                delay = 4 + random.uniform(0, 1)  # 添加随机延时
+                self.jobs.submit_later(delay, group_lane(group_id), self._send_case_message, group_id, truth_message)
+
+    def _send_case_message(self, group_id: str, message: str):
+        try:
+            self.message_sender.send_message_to_groups(message, group_id=group_id)
+        except Exception as e:
+            print(f"发送案件超时消息时出错: {e}")
+            import traceback
+            print(traceback.format_exc())
+
+
+    def process_message(self, user_id: str, message: str, group_id: str = None, image_data: bytes = None) -> Union[Reply, str]:
+        """处理用户消息，命令直接返回Reply，AI对话返回模型生成的文本"""
+        with self._lane_lock(user_id, group_id):
+            result = self._route_message(user_id, message, group_id, image_data)
+            self._sync_timers(group_id)
+        if not isinstance(result, ChatRequest):
+            return result
+        
+        ai_start_time = time.time()
+        response = self.ai.get_response(result.content, user_id=result.user_id, group_id=result.group_id,
+                                        use_tools=result.use_tools, priority=result.priority)
+        self._record_ai_duration(result, time.time() - ai_start_time)
+        return response
+
+    async def process_message_async(self, user_id: str, message: str, group_id: str = None, image_data: bytes = None,
+                                    on_part: Callable[[int, int, str], Any] = None) -> Union[Reply, str]:
+        """process_message的异步版本
+
+        路由（包括可能阻塞的命令处理）放到线程中执行，AI对话使用异步客户端，
+        多个群同时发消息时互不阻塞。
+        传入on_part时以流式方式请求AI，回复中的每条消息生成完毕就回调 on_part(index, wait_time, content)。
+        """
+        def route():
+            with self._lane_lock(user_id, group_id):
+                result = self._route_message(user_id, message, group_id, image_data)
+                self._sync_timers(group_id)
+                return result
 
+        result = await asyncio.to_thread(route)
+        if not isinstance(result, ChatRequest):
+            return result
+        
+        ai_start_time = time.time()
+        if on_part and STREAM_RESPONSES:
+            response = await self.ai.get_response_stream_async(result.content, user_id=result.user_id, group_id=result.group_id,
+                                                               use_tools=result.use_tools, priority=result.priority,
+                                                               on_part=on_part)
+        else:
+            response = await self.ai.get_response_async(result.content, user_id=result.user_id, group_id=result.group_id,
+                                                        use_tools=result.use_tools, priority=result.priority)
+        self._record_ai_duration(result, time.time() - ai_start_time)
+        return response
+
+    def _record_ai_duration(self, request: ChatRequest, ai_duration: float):
+        """累计AI回复等待时间，用于唤醒状态超时计算"""
+        if not request.track_time or request.group_id is None:
+            return
+        total = self.wakeup_sessions.add_response_time(request.group_id, request.user_id, ai_duration)
+        if total is not None:
+            print(f"AI回复耗时: {ai_duration:.2f}秒，累计: {total:.2f}秒")
 
-    def process_message(self, user_id: str, message: str, group_id: str = None, image_data: bytes = None) -> tuple[str, str, str]:
-        """处理用户消息"""
+    def _route_message(self, user_id: str, message: str, group_id: str = None, image_data: bytes = None):
+        """路由用户消息：返回直接发送的Reply，或需要AI回复的ChatRequest"""
+        # 吉祥物名称和唤醒词可在运行时修改，每次从配置模块读取
+        from .manage.config import XIAOTIAN_NAME, TRIGGER_WORDS
         
         # 检查是否处于特殊模式中(案件推理或天文竞答)
         in_case_mode = group_id and hasattr(self, 'criminal_case') and group_id in self.criminal_case.active_cases
         in_quiz_mode = group_id and hasattr(self, 'astronomy_quiz') and group_id in self.astronomy_quiz.active_quizzes
-        in_special_mode = in_case_mode or in_quiz_mode
         
         # 先处理案件推理模式中的消息，优先级最高
         if in_case_mode:
             # 检查是否是案件结束命令
-            from .manage.config import XIAOTIAN_NAME
             mascot_name = XIAOTIAN_NAME
             end_case_command = f"{mascot_name} 结束案件"
             if message.strip() in [end_case_command, "结束案件"]:
                 result = self.criminal_case.process_investigation(user_id, "结束案件", group_id)[0]
-                return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}], "like": 0}}'
+                return Reply.text(result)
             # 所有在案件模式下的消息都作为调查指令处理
             result, new_clues, solved = self.criminal_case.process_investigation(user_id, message, group_id)
             
@@ -391,13 +512,13 @@ class XiaotianScheduler:
                 like_reward = self.criminal_case.award_case_solved(user_id, group_id)
                 if like_reward > 0:
                     like_message = f"🎉 恭喜！你成功解决了案件，获得 {like_reward} 点好感度奖励！"
-                    return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}, {{"wait_time": 4, "content": "{like_message}"}}], "like": {like_reward}}}'
-                return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}], "like": 0}}'
+                    return Reply([(3, result), (4, like_message)], like=like_reward)
+                return Reply.text(result)
             elif new_clues:
                 # 分开发送调查结果和新线索，中间延迟4秒
-                return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}, {{"wait_time": 4, "content": "{new_clues}"}}], "like": 0}}'
+                return Reply([(3, result), (4, new_clues)])
             else:
-                return f'{{"data": [{{"wait_time": 3, "content": "{result}"}}], "like": 0}}'
+                return Reply.text(result)
                 
         # 处理天文竞答模式中的消息
         if in_quiz_mode:
@@ -406,44 +527,33 @@ class XiaotianScheduler:
                 result1, result2 = self.astronomy_quiz.finish_quiz(group_id, user_id)
                 # 分开发送结束通知和结果详情，中间延迟4秒
                 if result2:
-                    return f'{{"data": [{{"wait_time": 3, "content": "{result1}"}}, {{"wait_time": 4, "content": "{result2}"}}], "like": 0}}'
+                    return Reply([(3, result1), (4, result2)])
                 else:
-                    return f'{{"data": [{{"wait_time": 3, "content": "{result1}"}}], "like": 0}}'
+                    return Reply.text(result1)
             
             # 所有在竞答模式下的消息都视为答案
             response, next_question = self.astronomy_quiz.process_answer(user_id, message, group_id)
             if response and next_question:
                 # 分开发送答题反馈和下一题目，中间延迟4秒
-                return f'{{"data": [{{"wait_time": 3, "content": "{response}"}}, {{"wait_time": 4, "content": "{next_question}"}}], "like": 0}}'
+                return Reply([(3, response), (4, next_question)])
             elif response:
-                return f'{{"data": [{{"wait_time": 3, "content": "{response}"}}], "like": 0}}'
+                return Reply.text(response)
         
         
         # 检查用户特殊提示词(只有不在案件推理模式时才检查)
         special_command_result = self._check_special_user_commands(user_id, message, group_id)
-        if special_command_result:
+        if special_command_result is not None:
             return special_command_result
         
-        # 只有不在特殊模式时才检查唤醒状态超时
-        current_time = time.time()
-        if not in_special_mode and self.wait_for_wakeup and (current_time - self.wakeup_time - self.ai_response_time) > self.waiting_time:
-            self.wait_for_wakeup = False
-            self.ai_response_time = 0  # 重置AI回复时间累计
-            print(f"唤醒状态超时，已自动关闭")
-        
-        # 快速路径：检查是否是唤醒状态中的同一用户
-        is_wakeup_continue = (self.wait_for_wakeup and 
-                             self.last_user_id == user_id and 
-                             self.last_group_id == group_id)
-        
-        # 快速路径：检查是否包含唤醒词（优化：避免重复检测）
-        has_trigger_word = False
-        trigger_word_used = None
-        for trigger in TRIGGER_WORDS:
-            if message.startswith(trigger):
-                has_trigger_word = True
-                trigger_word_used = trigger
-                break
+        # 快速路径：检查该用户在这个群中是否处于唤醒状态（同时清理已超时的唤醒状态）
+        is_wakeup_continue = group_id is not None and self.wakeup_sessions.is_awake(group_id, user_id)
+        
+        # 一次扫描得到唤醒词和情绪关键词的所有命中
+        keyword_matcher = get_keyword_matcher()
+        keyword_matcher.set_category('trigger', TRIGGER_WORDS)
+        keyword_hits = keyword_matcher.find_all(message)
+        trigger_word_used = leading_keyword(keyword_hits, message, 'trigger')
+        has_trigger_word = trigger_word_used is not None
         # 私聊消息的处理
         if group_id is None:
             # 私聊中只处理Root命令和{DAILY_命令
@@ -471,7 +581,7 @@ class XiaotianScheduler:
             if any(message.startswith(prefix) for prefix in astronomy_prefixes):
                 # 否则就是普通天文内容处理
                 result = self.astronomy._handle_astronomy_poster(message, user_id)
-                return f'{{"wait_time": 3, "content": "{result}"}}'
+                return Reply.text(result)
 
             # 检查是否是给天文海报添加图片的消息
             if self.astronomy.waiting_for_images:
@@ -499,7 +609,7 @@ class XiaotianScheduler:
                                 
                                 # 处理用户消息和图片
                                 result = self.astronomy._handle_astronomy_image(user_id, image_path)
-                                return f'{{"wait_time": 3, "content": "{result}"}}'
+                                return Reply.text(result)
                             else:
                                 print(f"图片下载失败，状态码: {response.status_code}")
                         except Exception as e:
@@ -522,15 +632,15 @@ class XiaotianScheduler:
                             try:
                                 print(f"尝试向用户 {user_id} 发送立即生成的天文海报")
                                 self.root_manager.settings['qq_send_callback']('private', user_id, None, poster_path)
-                                time.sleep(2)  # 短暂延时
-                                self.root_manager.settings['qq_send_callback']('private', user_id, f"🌌 天文海报已生成！\n\n{response_message}", None)
+                                # 短暂延时后发送说明
+                                self.root_manager.settings['qq_send_callback']('private', user_id, f"🌌 天文海报已生成！\n\n{response_message}", None, delay=2)
                                 print(f"已向用户 {user_id} 发送立即生成的天文海报")
                             except Exception as send_err:
                                 print(f"向用户发送立即生成的天文海报失败: {send_err}")
 
-                        return f'{{"wait_time": 3, "content": "🎨 海报制作成功！\\n{response_message}"}}'
+                        return Reply.text(f"🎨 海报制作成功！\n{response_message}")
                     else:
-                        return f'{{"wait_time": 3, "content": "⚠️ {response_message}"}}'
+                        return Reply.text(f"⚠️ {response_message}")
                 
                 # 处理常规图片数据
                 elif image_data:
@@ -544,7 +654,7 @@ class XiaotianScheduler:
                         
                         # 处理用户消息和图片
                         result = self.astronomy._handle_astronomy_image(user_id, image_path)
-                        return f'{{"wait_time": 3, "content": "{result}"}}'
+                        return Reply.text(result)
                     except Exception as e:
                         print(f"处理用户图片失败: {e}")
             if self.root_manager.is_root(user_id):
@@ -554,20 +664,20 @@ class XiaotianScheduler:
                     # 处理特殊Root命令
                     if command == "SEND_WEATHER":
                         self.weather_tools.daily_weather_task()
-                        return "✅ 天气报告已发送"
+                        return Reply.text("✅ 天气报告已发送")
                     elif command == "SEND_ASTRONOMY":
                         self.astronomy.daily_astronomy_task()
-                        return "✅ 天文海报已发送"
+                        return Reply.text("✅ 天文海报已发送")
                     elif command == "GENERATE_MONTHLY":
                         self.astronomy.monthly_astronomy_task()
-                        return "✅ 月度合集已生成"
+                        return Reply.text("✅ 月度合集已生成")
                     elif command == "CLEANUP_NOW":
                         self.daily_cleanup_task()
-                        return "✅ 清理任务已执行"
+                        return Reply.text("✅ 清理任务已执行")
                     elif command == "RESET_LIKE_SYSTEM":
                         # 重置指定用户的like系统
                         result = self.ai.reset_user_like_system(data)
-                        return f'{{"wait_time": 3, "content": "{result}"}}'
+                        return Reply.text(result)
                     
                     elif command == "RESET_ALL_LIKE_SYSTEMS":
                         # 重置所有用户的like系统
@@ -575,43 +685,33 @@ class XiaotianScheduler:
                         for memory_key in list(self.ai.user_like_status.keys()):
                             self.ai.reset_user_like_system(memory_key)
                             count += 1
-                        return f'{{"wait_time": 3, "content": "✅ 已重置 {count} 个用户的like系统"}}'
+                        return Reply.text(f"✅ 已重置 {count} 个用户的like系统")
                     else:
                         # 返回普通Root命令结果
-                        return f'{{"wait_time": 3, "content": "{command}"}}'
+                        return Reply.text(command)
             # 私聊正常聊天功能
-            is_triggered = any(message.startswith(trigger) for trigger in TRIGGER_WORDS)
-            if is_triggered:
+            if has_trigger_word:
                 # 先检查这是否是一个root命令
                 if self.root_manager.is_root(user_id):
                     # 对于root用户，再次尝试处理命令
                     root_result = self.root_manager.process_root_command(user_id, message, None, image_data)
                     if root_result:
                         command, data = root_result
-                        return f'{{"wait_time": 3, "content": "{command}"}}'
+                        return Reply.text(command)
                 # 如果不是root命令，或者不是root用户，则当作普通聊天
-                for trigger in TRIGGER_WORDS:
-                    if message.startswith(trigger):
-                        parts = message.split(trigger, 1)
-                        if len(parts) > 1 and len(parts[1]) > 0 and parts[1][0] in ".,!?;:，。！？；：":
-                            content = ''.join(parts[1:]).strip()
-                            break
-                        else:
-                            content = parts[1].strip()
-                            break
+                content = message[len(trigger_word_used):].strip()
                 
-                response = self.ai.get_response(content, user_id=user_id, group_id=None)
-                return response
+                return ChatRequest(content, user_id=user_id, group_id=None, priority=PRIORITY_URGENT)
             
             # 非root用户私聊需要唤醒词
-            return f'{{"data": [{{"wait_time": 0, "content": ""}}], "like": 0}}'
+            return Reply()
         else:
             """处理普通聊天消息"""
         
             # 检测情绪并考虑自动触发（仅在群聊中）
             should_auto_trigger = False
             if group_id:
-                emotion = self.ai.detect_emotion(message)
+                emotion = self.ai.detect_emotion(message, keyword_hits)
                 if emotion in ('cold', 'hot'):
                     if self.root_manager.can_auto_trigger(group_id):
                         should_auto_trigger = True
@@ -640,19 +740,12 @@ class XiaotianScheduler:
                         else:
                             content = parts[1].strip()
                     # 设置唤醒状态，持续一段时间
-                    self.wait_for_wakeup = True
-                    self.wakeup_time = time.time()  # 记录唤醒时间
-                    self.ai_response_time = 0  # 重置AI回复时间累计
-                    self.waiting_time = 25  # 重置为25秒
-                    print(f"用户 {user_id} 唤醒了{XIAOTIAN_NAME}，超时时间: {self.waiting_time}秒")
+                    session = self.wakeup_sessions.wake(group_id, user_id)
+                    print(f"用户 {user_id} 在群 {group_id} 唤醒了{XIAOTIAN_NAME}，超时时间: {session.timeout}秒")
                 elif is_wakeup_continue:
-                    # 唤醒状态中的后续对话
-                    if self.last_user_id == user_id and self.last_group_id == group_id:
-                        # 同一用户继续发消息，重新计时
-                        self.wakeup_time = time.time()
-                        self.ai_response_time = 0  # 重置AI回复时间累计
-                        self.waiting_time = 15  # 重置为15秒
-                        print(f"用户 {user_id} 继续对话，重新计时: {self.waiting_time}秒")
+                    # 唤醒状态中的同一用户继续发消息，重新计时
+                    session = self.wakeup_sessions.touch(group_id, user_id)
+                    print(f"用户 {user_id} 继续对话，重新计时: {session.timeout}秒")
 
                 # 如果是自动触发，生成合适的回复
                 if should_auto_trigger and not has_trigger_word:
@@ -661,32 +754,18 @@ class XiaotianScheduler:
                     elif emotion == 'hot':
                         content = f"感觉很激动呢，一起开心一下！原消息：{message}"
 
-                # 更新最后交互的用户信息
-                self.last_user_id = user_id
-                self.last_group_id = group_id
-
                 # AI对话，传入群组信息以支持分别记忆
                 # 在群聊中允许使用工具，在私聊中只能聊天
                 use_tools = group_id is not None
 
-                # 记录AI响应开始时间
-                ai_start_time = time.time()
-                response = self.ai.get_response(content, user_id=user_id, group_id=group_id, use_tools=use_tools)
-                ai_end_time = time.time()
+                return ChatRequest(content, user_id=user_id, group_id=group_id,
+                                   use_tools=use_tools, track_time=True)
+            elif self.wakeup_sessions.shorten_others(group_id, user_id):
+                # 在唤醒状态中，其他用户发消息，缩短该群唤醒状态的超时时间
+                print(f"其他用户 {user_id} 在群 {group_id} 发消息，缩短超时时间到 {WAKEUP_OTHER_USER_TIMEOUT}秒")
 
-                # 累计AI回复等待时间
-                ai_duration = ai_end_time - ai_start_time
-                self.ai_response_time += ai_duration
-                print(f"AI回复耗时: {ai_duration:.2f}秒，累计: {self.ai_response_time:.2f}秒")
-
-                return response
-            elif self.wait_for_wakeup and self.last_group_id == group_id and self.last_user_id != user_id:
-                # 在唤醒状态中，其他用户发消息，缩短超时时间到5秒
-                self.waiting_time = 5
-                print(f"其他用户 {user_id} 在群 {group_id} 发消息，缩短超时时间到 {self.waiting_time}秒")
-
-            return f'{{"data": [{{"wait_time": 0, "content": ""}}], "like": 0}}'  # 未触发时返回空字符串
-        return f'{{"data": [{{"wait_time": 0, "content": ""}}], "like": 0}}'  # 未触发时返回空字符串
+            return Reply()  # 未触发时不回复
+        return Reply()  # 未触发时不回复
 
     def daily_cleanup_task(self):
         """每日数据清理任务"""
@@ -711,17 +790,10 @@ class XiaotianScheduler:
             
             # 清理过多的用户记忆
             memory_cleaned = 0
-            if self.ai and hasattr(self.ai, 'memory_storage'):
-                # 确保每个用户的记忆不超过MAX_MEMORY_COUNT
-                for memory_key, memories in self.ai.memory_storage.items():
-                    if len(memories) > MAX_MEMORY_COUNT:
-                        # 保留最新的MAX_MEMORY_COUNT条记忆
-                        original_count = len(memories)
-                        self.ai.memory_storage[memory_key] = memories[-MAX_MEMORY_COUNT:]
-                        memory_cleaned += (original_count - len(self.ai.memory_storage[memory_key]))
-                
-                # 保存清理后的记忆
-                self.ai.save_memory(MEMORY_FILE)
+            if self.ai and hasattr(self.ai, 'memory_store'):
+                # 确保存储中每个用户的记忆不超过MAX_MEMORY_COUNT，并整理存储
+                memory_cleaned = self.ai.memory_store.trim_memories(MAX_MEMORY_COUNT)
+                self.ai.memory_store.compact()
                 print(f"🧹 已清理过多的用户记忆：{memory_cleaned}条")
             
             print("🧹 数据清理完成")
@@ -9,11 +9,10 @@ import calendar
 from datetime import datetime as dt, timedelta
 import time
 from typing import Tuple, List, Dict, Optional, Union
-import textwrap
 import shutil
 from pathlib import Path
 
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageFilter
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -21,19 +20,21 @@ from matplotlib.font_manager import FontProperties
 
 from ..manage.config import (
     POSTER_OUTPUT_DIR, ASTRONOMY_IMAGES_DIR, ASTRONOMY_FONTS_DIR,
-    DEFAULT_FONT, TITLE_FONT, ARTISTIC_FONT, DATE_FONT,DAILY_ASTRONOMY_MESSAGE
+    DAILY_ASTRONOMY_MESSAGE, POSTER_PREFETCH_WAIT
 )
-from ..ai.ai_core import XiaotianAI
+from ..ai.ai_core import XiaotianAI, get_shared_ai
 from ..manage.root_manager import RootManager
+from ..manage.job_executor import get_job_executor, group_lane, private_lane
 from .message import MessageSender
+from .poster_render import PosterSpec, get_poster_renderer
 
 class AstronomyPoster:
-    def __init__(self, base_path="xiaotian", root_manager: RootManager = None):
+    def __init__(self, base_path="xiaotian", root_manager: RootManager = None, ai_core: XiaotianAI = None):
         self.base_path = base_path
         self.images_path = ASTRONOMY_IMAGES_DIR
         self.fonts_path = ASTRONOMY_FONTS_DIR
         self.output_path = POSTER_OUTPUT_DIR
-        self.ai_client = XiaotianAI()  # 初始化AI客户端
+        self.ai_client = ai_core or get_shared_ai()  # 使用共享的AI实例
         self.root_manager = root_manager
         self.message_sender = MessageSender(root_manager, self.ai_client)  # 初始化消息发送器
         
@@ -54,6 +55,8 @@ class AstronomyPoster:
         self.latest_ai_comment = None
         # 储存最近一次处理的天文文本和图片路径
         self.last_astronomy_post = None
+        # 等待图片期间预先获取的格言和预渲染的版面
+        self._prefetch = None
     
     def daily_astronomy_task(self):
         """每日天文海报任务"""
@@ -76,9 +79,7 @@ class AstronomyPoster:
 
                     # 延时10秒后发送AI点评
                     if self.latest_ai_comment:
-                        import threading
                         def send_ai_comment():
-                            time.sleep(10)  # 延时10秒
                             try:
                                 ai_comment_message = f"🌟 小天点评：{self.latest_ai_comment}"
                                 self.message_sender.send_message_to_groups(ai_comment_message, None)
@@ -86,9 +87,8 @@ class AstronomyPoster:
                             except Exception as e:
                                 print(f"❌ 发送AI点评失败：{e}")
 
-                        # 在后台线程中发送AI点评
-                        comment_thread = threading.Thread(target=send_ai_comment)
-                        comment_thread.start()
+                        # 登记为10秒后执行的任务
+                        get_job_executor().submit_later(10, 'daily_astronomy', send_ai_comment)
                         self.last_astronomy_post = None  # 清除最近的海报记录
                 else:
                     print("⚠️ 没有设置目标群组，天文海报未发送。请使用命令'小天，设置目标群组：群号1,群号2'来设置目标群组。")
@@ -120,8 +120,10 @@ class AstronomyPoster:
                         # 使用传入的user_id而不是尝试从消息中提取
                         # 向制作天文海报的用户发送私聊消息
                         self.root_manager.settings['qq_send_callback']('private', user_id, None, poster_path)
-                        time.sleep(1)  # 短暂延时
-                        self.root_manager.settings['qq_send_callback']('private', user_id, f"🌌 天文海报已生成！\n\n{message}", None)
+                        # 短暂延时后发送说明
+                        get_job_executor().submit_later(
+                            1, private_lane(user_id), self._send_delayed_text,
+                            'private', user_id, f"🌌 天文海报已生成！\n\n{message}")
                         
                         print(f"已向用户 {user_id} 发送私聊天文海报")
                     except Exception as send_err:
@@ -162,8 +164,10 @@ class AstronomyPoster:
                         # 向用户发送处理后的海报
                         self.root_manager.settings['qq_send_callback']('private', user_id, None, poster_path)
                         
-                        time.sleep(1)  # 短暂延时
-                        self.root_manager.settings['qq_send_callback']('private', user_id, f"🌌 添加图片后的天文海报已生成！\n\n{message}", None)
+                        # 短暂延时后发送说明
+                        get_job_executor().submit_later(
+                            1, private_lane(user_id), self._send_delayed_text,
+                            'private', user_id, f"🌌 添加图片后的天文海报已生成！\n\n{message}")
                         
                         print(f"已向用户 {user_id} 发送处理后的天文海报")
                     except Exception as send_err:
@@ -244,12 +248,7 @@ class AstronomyPoster:
         
         if 300 <= char_count <= 600:
             # 字数符合要求，开始等待用户图片
-            self.astronomy_text = astronomy_text
-            self.waiting_for_images = True
-            self.waiting_start_time = time.time()
-            self.waiting_user_id = user_id
-            self.waiting_group_id = group_id
-            self.user_images = []
+            self._start_waiting(astronomy_text, user_id, group_id)
             
             # 生成AI点评
             comment_prompt = f"请根据以下天文内容，生成一段50字以内的点评，风格可以是有趣、富有启发性或引人深思的：\n\n{astronomy_text}"
@@ -268,12 +267,7 @@ class AstronomyPoster:
                 try:
                     # 使用AI工具调整字数
                     optimized_text = ai_optimizer(astronomy_text)
-                    self.astronomy_text = optimized_text
-                    self.waiting_for_images = True
-                    self.waiting_start_time = time.time()
-                    self.waiting_user_id = user_id
-                    self.waiting_group_id = group_id
-                    self.user_images = []
+                    self._start_waiting(optimized_text, user_id, group_id)
                     
                     # 生成AI点评
                     comment_prompt = f"请根据以下天文内容，生成一段100字以内的点评，风格可以是有趣、富有启发性或引人深思的：\n\n{optimized_text}"
@@ -288,12 +282,7 @@ class AstronomyPoster:
                     return None, f"内容已优化（原{char_count}字，现{len(optimized_text)}字），将在1分钟内等待图片，如需添加图片请直接发送（最多2张），或回复\"不需要图片\"立即生成海报。\n\n小天点评：{ai_comment}"
                 except Exception as e:
                     # AI优化失败，使用原文等待图片
-                    self.astronomy_text = astronomy_text
-                    self.waiting_for_images = True
-                    self.waiting_start_time = time.time()
-                    self.waiting_user_id = user_id
-                    self.waiting_group_id = group_id
-                    self.user_images = []
+                    self._start_waiting(astronomy_text, user_id, group_id)
                     
                     # 生成AI点评
                     comment_prompt = f"请根据以下天文内容，生成一段50字以内的点评，风格可以是有趣、富有启发性或引人深思的：\n\n{astronomy_text}"
@@ -308,12 +297,7 @@ class AstronomyPoster:
                     return None, f"内容已接收（{char_count}字），将在1分钟内等待图片，如需添加图片请直接发送（最多2张），或回复\"不需要图片\"立即生成海报。\n\n小天点评：{ai_comment}"
             else:
                 # 没有提供AI优化器，使用原文等待图片
-                self.astronomy_text = astronomy_text
-                self.waiting_for_images = True
-                self.waiting_start_time = time.time()
-                self.waiting_user_id = user_id
-                self.waiting_group_id = group_id
-                self.user_images = []
+                self._start_waiting(astronomy_text, user_id, group_id)
                 
                 # 生成AI点评
                 comment_prompt = f"请根据以下天文内容，生成一段50字以内的点评，风格可以是有趣、富有启发性或引人深思的：\n\n{astronomy_text}"
@@ -331,6 +315,66 @@ class AstronomyPoster:
             return None, f"内容太短，无法生成海报。需要至少100字，当前: {char_count}字"
     
     
+    def _start_waiting(self, astronomy_text: str, user_id: str, group_id: str):
+        """文字已确定，开始等待用户图片，同时在后台准备格言和版面"""
+        self.astronomy_text = astronomy_text
+        self.waiting_for_images = True
+        self.waiting_start_time = time.time()
+        self.waiting_user_id = user_id
+        self.waiting_group_id = group_id
+        self.user_images = []
+        self._start_prefetch(astronomy_text)
+
+    def _start_prefetch(self, astronomy_text: str):
+        """在生成点评的同时获取页脚格言，格言到手后预渲染不含用户图片的版面"""
+        self._discard_layout(self._prefetch)
+        prefetch = {'text': astronomy_text, 'motto': None, 'layout': None}
+        self._prefetch = prefetch
+        prefetch['motto'] = get_job_executor().submit('poster_prefetch', self._prefetch_poster, prefetch)
+
+    def _prefetch_poster(self, prefetch: dict) -> str:
+        footer_text = self._generate_footer_text()
+        # 等待期间文字已被替换时不再预渲染
+        if self._prefetch is prefetch:
+            spec = self._build_spec(prefetch['text'], (), footer_text)
+            prefetch['layout'] = (spec, get_poster_renderer().submit_layout(spec))
+            print("🎨 已开始预渲染海报版面")
+        return footer_text
+
+    @staticmethod
+    def _discard_layout(prefetch: Optional[dict]):
+        """删除用过或不再需要的预渲染版面文件"""
+        if not prefetch or not prefetch['layout']:
+            return
+        future = prefetch['layout'][1]
+        prefetch['layout'] = None
+
+        def remove_layout(done):
+            # 还在渲染的版面等写出文件后再删除
+            if done.cancelled() or done.exception():
+                return
+            try:
+                os.remove(done.result()[0])
+            except OSError:
+                pass
+
+        future.add_done_callback(remove_layout)
+
+    def _prefetched_layout(self, spec: PosterSpec):
+        """返回与spec版面一致的预渲染结果，没有时返回None"""
+        prefetch = self._prefetch
+        if not prefetch or not prefetch['layout']:
+            return None
+        layout_spec, future = prefetch['layout']
+        if layout_spec != spec._replace(user_images=()):
+            return None
+        try:
+            # 预渲染还没完成时等它完成，仍然比从头绘制快
+            return future.result(POSTER_PREFETCH_WAIT)
+        except Exception as e:
+            print(f"预渲染版面不可用: {e}")
+            return None
+
     def _check_astronomy_timeout(self):
         """检查天文海报超时状态并自动发送"""
         
@@ -352,25 +396,8 @@ class AstronomyPoster:
                         # 私聊发送：先发图片，再发提示消息，最后发点评
                         self.root_manager.settings['qq_send_callback']('private', user_id, None, auto_poster_path)
                         
-                        # 延时发送提示消息和点评
-                        import threading
-                        def send_delayed_messages():
-                            time.sleep(2)  # 延时2秒
-                            try:
-                                # 发送提示消息
-                                self.root_manager.settings['qq_send_callback']('private', user_id, "🎨 等待图片超时，已自动生成海报", None)
-                                
-                                # 如果有AI点评，再发送点评
-                                if self.latest_ai_comment:
-                                    time.sleep(3)  # 再延时3秒
-                                    ai_comment_message = f"🌟 小天点评：{self.latest_ai_comment}"
-                                    self.root_manager.settings['qq_send_callback']('private', user_id, ai_comment_message, None)
-                                    print(f"已发送超时海报的AI点评给用户 {user_id}")
-                            except Exception as e:
-                                print(f"发送延时消息失败: {e}")
-                        
-                        # 在后台线程中发送延时消息
-                        threading.Thread(target=send_delayed_messages).start()
+                        # 延时2秒发送提示消息，如果有AI点评，再延时3秒发送点评
+                        self._send_timeout_followups('private', user_id, private_lane(user_id))
                         
                     else:
                         # 群聊发送：检查是否为目标群组
@@ -382,25 +409,8 @@ class AstronomyPoster:
                         # 群聊发送：先发图片，再发提示消息，最后发点评
                         self.root_manager.settings['qq_send_callback']('group', group_id, None, auto_poster_path)
                         
-                        # 延时发送提示消息和点评
-                        import threading
-                        def send_delayed_messages():
-                            time.sleep(2)  # 延时2秒
-                            try:
-                                # 发送提示消息
-                                self.root_manager.settings['qq_send_callback']('group', group_id, "🎨 等待图片超时，已自动生成海报", None)
-                                
-                                # 如果有AI点评，再发送点评
-                                if self.latest_ai_comment:
-                                    time.sleep(3)  # 再延时3秒
-                                    ai_comment_message = f"🌟 小天点评：{self.latest_ai_comment}"
-                                    self.root_manager.settings['qq_send_callback']('group', group_id, ai_comment_message, None)
-                                    print(f"已发送超时海报的AI点评到群 {group_id}")
-                            except Exception as e:
-                                print(f"发送延时消息失败: {e}")
-                        
-                        # 在后台线程中发送延时消息
-                        threading.Thread(target=send_delayed_messages).start()
+                        # 延时2秒发送提示消息，如果有AI点评，再延时3秒发送点评
+                        self._send_timeout_followups('group', group_id, group_lane(group_id))
                     
                     # 清除等待状态
                     self.waiting_user_id = None
@@ -412,6 +422,24 @@ class AstronomyPoster:
                 print("无法发送超时海报：回调函数不可用")
 
     
+    def _send_delayed_text(self, target_type: str, target_id: str, text: str) -> bool:
+        """作为延时任务发送一条文本消息"""
+        try:
+            self.root_manager.settings['qq_send_callback'](target_type, target_id, text, None)
+            return True
+        except Exception as e:
+            print(f"发送延时消息失败: {e}")
+            return False
+
+    def _send_timeout_followups(self, target_type: str, target_id: str, lane):
+        """超时海报发出后，登记提示消息和AI点评的延时发送任务"""
+        jobs = get_job_executor()
+        jobs.submit_later(2, lane, self._send_delayed_text, target_type, target_id, "🎨 等待图片超时，已自动生成海报")
+        if self.latest_ai_comment:
+            ai_comment_message = f"🌟 小天点评：{self.latest_ai_comment}"
+            jobs.submit_later(5, lane, self._send_delayed_text, target_type, target_id, ai_comment_message)
+            print(f"已登记超时海报的AI点评发送任务（{target_type} {target_id}）")
+
     def process_user_message(self, message: str, image_paths: List[str] = None) -> Tuple[Optional[str], str]:
         """处理用户消息，可能包含图片或终止等待的指令"""
         # 如果没有在等待图片，直接跳过
@@ -471,258 +499,8 @@ class AstronomyPoster:
             
         return True, int(remaining), None, ""
     
-    def create_poster(self, text: str, user_images: List[str] = None) -> str:
-        """创建天文海报，使用当月对应的图片
-        
-        Args:
-            text: 海报文字内容
-            user_images: 用户提供的图片路径列表，最多两张
-        """
-        today = dt.now()
-        month = today.month
-        date_str = today.strftime("%Y年%m月%d日")
-        
-        # 获取当月图片
-        image_path = os.path.join(self.images_path, f"{month}.jpg")
-        if not os.path.exists(image_path):
-            # 使用默认图片
-            image_path = os.path.join(self.images_path, "default.jpg")
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"无法找到月份图片 {month}.jpg 或默认图片")
-        
-        # 加载图片
-        img = Image.open(image_path).convert("RGBA")
-        
-        # 调整大小（标准海报尺寸）
-        img = img.resize((1200, 1800))
-        
-        # 创建绘图上下文
-        draw = ImageDraw.Draw(img)
-        
-        # 加载字体（从全局配置）
-        try:
-            print("加载字体（从配置）")
-            
-            # 使用全局配置中的字体路径
-            text_font_path = DEFAULT_FONT
-            title_font_path = TITLE_FONT
-            artistic_font_path = ARTISTIC_FONT
-            
-            # 首先尝试加载默认字体，用于基本文本（缩小字体）
-            try:
-                text_font = ImageFont.truetype(text_font_path, 32)  # 缩小正文字号
-                print(f"成功加载默認字体: {text_font_path}")
-            except Exception:
-                text_font = ImageFont.load_default()
-                print("默认字体加载失败，使用系统默认字体")
-            
-            # 尝试加载标题字体（增大字号）
-            try:
-                title_font = ImageFont.truetype(title_font_path, 110)  # 放大标题字号
-                print(f"成功加载标题字体: {title_font_path}")
-            except Exception:
-                title_font = text_font.font_variant(size=110)
-                print("标题字体加载失败，使用默认字体代替")
-            
-            # 尝试加载艺术字体
-            try:
-                date_font = ImageFont.truetype(artistic_font_path, 35) # 适中的页脚字号
-                print(f"成功加载艺术字体: {artistic_font_path}")
-            except Exception:
-                date_font = text_font.font_variant(size=35)
-                print("艺术字体加载失败，使用默认字体代替")
-            
-            # 尝试加载时间专用字体
-            try:
-                time_display_font = ImageFont.truetype(DATE_FONT, 47)  # 时间显示专用字体
-                print(f"成功加载时间字体: {DATE_FONT}")
-            except Exception:
-                time_display_font = text_font.font_variant(size=47)
-                print("时间字体加载失败，使用默认字体代替")
-                
-        except Exception as e:
-            print(f"加载字体失败: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            # 退回到默认字体
-            title_font = ImageFont.load_default()
-            date_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
-            time_display_font = ImageFont.load_default()
-            print("使用默认字体")
-        
-        # 添加半透明遮罩，让文字更易读
-        overlay = Image.new('RGBA', img.size, (0, 0, 0, 180))
-        img = Image.alpha_composite(img, overlay)
-        draw = ImageDraw.Draw(img)
-        
-        # 添加标题，放大字号
-        title_font_large = ImageFont.truetype(title_font_path, 110) if 'title_font_path' in locals() else title_font
-        draw.text((600, 120), DAILY_ASTRONOMY_MESSAGE, fill=(255, 255, 255, 255), font=title_font_large, anchor="mm")
-
-        # 在右上角添加正方形的日期框（纵向排列）- 优化版本
-        date_box_size = 180  # 进一步放大正方形边长
-        date_box_x = img.width - date_box_size - 135  # 进一步向左移动，距右边界100px
-        date_box_y = 30  # 距上边界30px
-        
-        # 绘制半透明白色背景框
-        draw.rectangle(
-            [(date_box_x, date_box_y), 
-             (date_box_x + date_box_size, date_box_y + date_box_size)],
-            fill=None,  # 去掉白色背景
-            outline=(255, 255, 255, 255),  # 保留白色边框
-            width=10
-        )
-        
-        # 在框内纵向排列年月日
-        year_str = today.strftime("%Y")
-        month_str = today.strftime("%m月")
-        day_str = today.strftime("%d日")
-        
-        # 使用时间专用字体，加粗放大
-        date_font_bold = time_display_font if 'time_display_font' in locals() else date_font.font_variant(size=200)
-        
-        # 计算位置 - 年份竖排在左边，月日在右边中间
-        date_center_x = date_box_x + date_box_size // 2
-        
-        # 年份竖排位置 - 在框的左边
-        year_x = date_box_x + 30  # 距离左边框25px
-        year_start_y = date_box_y + 30  # 起始位置
-        
-        # 月日在右边剩余空间的中间
-        right_center_x = date_box_x + date_box_size // 2 + 30  # 右边区域中心
-        month_y = date_box_y + 60
-        day_y = date_box_y + 110
-        
-        # 绘制年份（竖排）
-        color = '#7FBCDE'
-        year_chars = list(year_str)  # 将年份拆分为单个字符
-        for i, char in enumerate(year_chars):
-            char_y = year_start_y + i * 38  # 每个字符间距35px
-            # 更多偏移组合实现更粗的加粗效果
-            for offset in [(0, 0), (1, 0), (0, 1), (1, 1), (-1, 0), (0, -1), (-1, -1), (1, -1), (-1, 1)]:
-                draw.text((year_x + offset[0], char_y + offset[1]), char, fill='#FFFFFF', font=date_font_bold, anchor="mm")
-        
-        # 绘制年份与月日之间的分割线（白色竖直线）
-        line_x = (date_box_x + date_box_size // 2) - 32  # 在方框中间位置
-        line_start_y = date_box_y + 15  # 距离上边框15px
-        line_end_y = date_box_y + date_box_size - 15  # 距离下边框15px
-        draw.line([(line_x, line_start_y), (line_x, line_end_y)], fill=(255, 255, 255, 255), width=5)
-        
-        # 绘制月日（右边中间）
-        # 更多偏移组合实现更粗的加粗效果
-        for offset in [(0, 0), (1, 0), (0, 1), (1, 1), (-1, 0), (0, -1), (-1, -1), (1, -1), (-1, 1)]:
-            draw.text((right_center_x + offset[0], month_y + offset[1]), month_str, fill=color, font=date_font_bold, anchor="mm")
-            draw.text((right_center_x + offset[0], day_y + offset[1]), day_str, fill=color, font=date_font_bold, anchor="mm")
-        # 处理文本，保留用户的换行符（正文往上移动）
-        paragraphs = text.split('\n')
-        y_position = 240  # 上移正文位置，缩小与标题间距
-        text_width = img.width - 300  # 左右各留150px边距
-        max_y_position = 1300  # 为用户图片和页脚留出更多空间
-        for paragraph in paragraphs:
-            # 检查用户是否已经首行缩进
-            if paragraph.startswith("　　"):  # 判断是否以全角空格开头
-                indented_paragraph = paragraph
-            else:
-                # 每个段落首行缩进两个字符，同时预处理负号和加号
-                cleaned_paragraph = paragraph.replace('-', '负').replace('+', '')
-                indented_paragraph = "　　" + cleaned_paragraph  # 使用全角空格进行缩进
-            # 对每个段落进行自动换行
-            lines = textwrap.wrap(indented_paragraph, width=28)  # 减小宽度以适应全角空格缩进
-            
-            # 处理每一行
-            for i, line in enumerate(lines):
-                # 计算文本宽度来实现居中
-                try:
-                    text_size = draw.textlength(line, font=text_font)
-                    x_position = (img.width - text_size) / 2
-                except AttributeError:
-                    # 如果textlength方法不可用（旧版PIL），使用固定位置
-                    x_position = 150
-                
-                # 绘制文本及其阴影，提高可读性
-                draw.text((x_position+2, y_position+2), line, fill=(0, 0, 0, 180), font=text_font)  # 阴影
-                draw.text((x_position, y_position), line, fill=(255, 255, 255, 255), font=text_font)  # 文本
-                
-                y_position += 55  # 缩小行距
-                if y_position > max_y_position:  # 防止文字溢出
-                    draw.text((img.width/2, y_position), "...(内容过长)", fill=(255, 255, 255, 255), font=text_font, anchor="mt")
-                    y_position += 55  # 为省略号腾出空间
-                    break
-            
-            # 段落间额外添加一行间距
-            y_position += 15  # 缩小段落间距
-            if y_position > max_y_position:
-                break
-        
-        # 处理用户图片（智能调整大小避免与页脚重合）
-        if user_images and len(user_images) > 0:
-            # 计算图片区域，确保不与页脚重合
-            image_y_position = y_position + 40  # 在文字下方留出一定空间
-            footer_y_position = 1630  # 页脚位置
-            available_height = footer_y_position - image_y_position - 40  # 留出与页脚的间距
-            image_height = min(280, available_height)  # 动态调整图片高度
-            
-            # 处理用户提供的图片（最多两张）
-            valid_images = []
-            for img_path in user_images[:self.max_images]:
-                try:
-                    user_img = Image.open(img_path)
-                    valid_images.append(user_img)
-                except Exception as e:
-                    print(f"无法加载用户图片 {img_path}: {e}")
-            
-            if len(valid_images) == 1:
-                # 单张图片居中放置
-                user_img = valid_images[0]
-                
-                # 保持宽高比，调整大小
-                img_width = 600  # 单张图片宽度
-                img_height = int(user_img.height * (img_width / user_img.width))
-                if img_height > image_height:
-                    img_height = image_height
-                    img_width = int(user_img.width * (img_height / user_img.height))
-                
-                user_img = user_img.resize((img_width, img_height))
-                
-                # 计算居中位置
-                paste_x = (img.width - img_width) // 2
-                paste_y = image_y_position
-                
-                # 将用户图片粘贴到主图上
-                if user_img.mode == 'RGBA':
-                    img.paste(user_img, (paste_x, paste_y), user_img)
-                else:
-                    img.paste(user_img, (paste_x, paste_y))
-                
-            elif len(valid_images) == 2:
-                # 两张图片左右放置
-                img_width = 450  # 双图模式下每张图片宽度
-                
-                for i, user_img in enumerate(valid_images):
-                    # 保持宽高比，调整大小
-                    img_height = int(user_img.height * (img_width / user_img.width))
-                    if img_height > image_height:
-                        img_height = image_height
-                        img_width = int(user_img.width * (img_height / user_img.height))
-                    
-                    user_img = user_img.resize((img_width, img_height))
-                    
-                    # 计算放置位置
-                    if i == 0:  # 左侧图片
-                        paste_x = (img.width // 2) - img_width - 50
-                    else:  # 右侧图片
-                        paste_x = (img.width // 2) + 50
-                    
-                    paste_y = image_y_position
-                    
-                    # 将用户图片粘贴到主图上
-                    if user_img.mode == 'RGBA':
-                        img.paste(user_img, (paste_x, paste_y), user_img)
-                    else:
-                        img.paste(user_img, (paste_x, paste_y))
-        
-        # 添加页脚（调用AI生成格言，缩小字号并下移）
+    def _generate_footer_text(self) -> str:
+        """调用AI生成页脚格言"""
         try:
             # 调用AI生成格言
             motto_prompt = "请生成一句关于天文观测或宇宙探索的励志格言，要求简洁有力，15字以内，体现天文的浪漫与科学精神。"
@@ -732,44 +510,65 @@ class AstronomyPoster:
                 ai_motto = ai_motto.split("：")[-1].strip()
             if '"' in ai_motto:
                 ai_motto = ai_motto.replace('"', "").replace('"', "").strip()
-            footer_text = f"小天 · {ai_motto}"
+            return f"小天 · {ai_motto}"
         except Exception as e:
             print(f"AI格言生成失败: {e}")
-            footer_text = "小天 · 喵喵喵"
-        
-        # 使用较小字号的页脚字体
-        footer_font = ImageFont.truetype(artistic_font_path, 28) if 'artistic_font_path' in locals() else date_font.font_variant(size=28)
-        draw.text((600, 1650), footer_text, fill=(180, 180, 255, 255), font=footer_font, anchor="mm")
+            return "小天 · 喵喵喵"
+
+    def _build_spec(self, text: str, user_images, footer_text: str, date: dt = None, theme: str = None) -> PosterSpec:
+        # 日期只保留到天，预渲染的版面和最终海报的参数才能对得上
+        date = (date or dt.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        return PosterSpec(
+            text=text,
+            user_images=tuple(user_images or ()),
+            date=date,
+            theme=theme,
+            title=DAILY_ASTRONOMY_MESSAGE,
+            footer_text=footer_text,
+            max_images=self.max_images,
+            images_path=self.images_path,
+            fonts_path=self.fonts_path,
+            output_path=self.output_path,
+        )
+
+    def poster_spec(self, text: str, user_images: List[str] = None, date: dt = None, theme: str = None) -> PosterSpec:
+        """准备海报渲染参数，优先使用等待图片期间预先获取的格言
         
-        # 添加logo图片到左上角，确保在最顶层
-        logo_path = os.path.join(self.images_path, "logo.png")
-        if os.path.exists(logo_path):
+        Args:
+            text: 海报文字内容
+            user_images: 用户提供的图片路径列表，最多两张
+            date: 海报日期，默认今天
+            theme: 背景图片名，默认使用当月图片
+        """
+        footer_text = None
+        prefetch = self._prefetch
+        if prefetch and prefetch['text'] == text and prefetch['motto'] is not None:
             try:
-                logo = Image.open(logo_path).convert("RGBA")
-                # 调整logo大小为固定尺寸，和日期框一样大
-                date_box_size = 180  # 和后面日期框的大小保持一致
-                logo = logo.resize((date_box_size, date_box_size), Image.Resampling.LANCZOS)
-                
-                
-                # 计算logo位置（左上角，和日期框对称）
-                logo_x = 135  # 距左边135px，和日期框的右边距对称
-                logo_y = 30  # 距上边30px，和日期框一样
-                
-                # 粘贴logo到主图上（在最顶层）
-                img.paste(logo, (logo_x, logo_y), logo)
-                print(f"成功添加顶层logo: {logo_path}")
+                footer_text = prefetch['motto'].result(POSTER_PREFETCH_WAIT)
             except Exception as e:
-                print(f"添加logo失败: {e}")
-        else:
-            print(f"Logo文件不存在: {logo_path}")
+                print(f"预取的格言不可用: {e}")
+        if footer_text is None:
+            footer_text = self._generate_footer_text()
+        return self._build_spec(text, user_images, footer_text, date, theme)
+
+    def create_poster(self, text: str, user_images: List[str] = None, date: dt = None, theme: str = None) -> str:
+        """创建天文海报，使用当月对应的图片；绘制在渲染进程中完成
         
-        # 保存海报
-        output_filename = f"astronomy_{today.strftime('%Y%m%d')}.png"
-        output_path = os.path.join(self.output_path, output_filename)
-        img = img.convert("RGB")
-        img.save(output_path)
+        等待图片期间已经预渲染了版面时，只需贴上用户图片。
         
-        return output_path
+        Args:
+            text: 海报文字内容
+            user_images: 用户提供的图片路径列表，最多两张
+            date: 海报日期，默认今天
+            theme: 背景图片名，默认使用当月图片
+        """
+        spec = self.poster_spec(text, user_images, date, theme)
+        layout = self._prefetched_layout(spec)
+        poster_path = get_poster_renderer().render(spec, layout)
+        # 这段文字的海报已经生成，预渲染的版面无论是否用上都不再需要
+        if self._prefetch and self._prefetch['text'] == text:
+            self._discard_layout(self._prefetch)
+        return poster_path
         
     def create_monthly_collection(self) -> Optional[str]:
         """创建上个月所有天文海报的合集"""
@@ -830,3 +629,15 @@ class AstronomyPoster:
                         os.remove(os.path.join(self.output_path, file))
                 except Exception as e:
                     print(f"清理文件 {file} 失败: {str(e)}")
+
+        # 清理没有被删除的预渲染版面文件
+        layout_dir = os.path.join(self.output_path, "layouts")
+        if os.path.isdir(layout_dir):
+            layout_cutoff = (dt.now() - timedelta(days=1)).timestamp()
+            for file in os.listdir(layout_dir):
+                path = os.path.join(layout_dir, file)
+                try:
+                    if os.path.getmtime(path) < layout_cutoff:
+                        os.remove(path)
+                except Exception as e:
+                    print(f"清理版面文件 {file} 失败: {str(e)}")
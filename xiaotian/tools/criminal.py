@@ -5,14 +5,14 @@
 import os
 import time
 import json
-from openai import OpenAI
 import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional, Any
 
-from ..manage.config import TRIGGER_WORDS, MOONSHOT_API_KEY, MOONSHOT_BASE_URL
+from ..manage.config import TRIGGER_WORDS
 from ..manage.root_manager import RootManager
-from ..ai.ai_core import XiaotianAI
+from ..ai.ai_core import XiaotianAI, get_shared_ai
+from ..ai.llm_limiter import PRIORITY_URGENT
 
 
 class CriminalCase:
@@ -21,11 +21,7 @@ class CriminalCase:
     def __init__(self, root_manager: RootManager = None, ai_core: XiaotianAI = None):
         """初始化案件还原模块"""
         self.root_manager = root_manager
-        self.ai = ai_core
-        self.client = OpenAI(
-            api_key=MOONSHOT_API_KEY,
-            base_url=MOONSHOT_BASE_URL
-        )
+        self.ai = ai_core or get_shared_ai()
         # 案件状态(每个群独立)
         self.active_cases = {}  # 群ID -> 案件状态字典
         
@@ -73,7 +69,8 @@ class CriminalCase:
         
         try:
             # 使用AI的chat接口生成内容
-            response = self.client.chat.completions.create(
+            response = self.ai.create_completion(
+                PRIORITY_URGENT,
                 model=self.ai.current_model,
                 messages=[
                     {"role": "user", "content": case_prompt}
@@ -218,7 +215,8 @@ class CriminalCase:
                 )
                 
                 # 使用AI的chat接口判断真相
-                response = self.client.chat.completions.create(
+                response = self.ai.create_completion(
+                    PRIORITY_URGENT,
                     model=self.ai.current_model,
                     messages=[
                         {"role": "user", "content": truth_check_prompt}
@@ -280,7 +278,8 @@ class CriminalCase:
                 )
                 
                 # 使用AI的chat接口生成调查结果
-                response = self.client.chat.completions.create(
+                response = self.ai.create_completion(
+                    PRIORITY_URGENT,
                     model=self.ai.current_model,
                     messages=[
                         {"role": "user", "content": investigation_prompt}
@@ -335,17 +334,25 @@ class CriminalCase:
             print(f"奖励好感度失败：{str(e)}")
             return 0
     
-    def check_case_timeout(self) -> Dict[str, Tuple[str, str]]:
+    def check_case_timeout(self, group_id: str = None) -> Dict[str, Tuple[str, str]]:
         """
         检查并处理超时的案件
         
+        Args:
+            group_id: 只检查该群的案件，默认检查所有群
+        
         Returns:
             Dict[str, Tuple[str, str]]: 群组ID -> (结束消息, 真相)
         """
         now = datetime.now()
         timeout_groups = {}
         
-        for group_id, case in list(self.active_cases.items()):
+        if group_id is None:
+            cases = list(self.active_cases.items())
+        else:
+            cases = [(group_id, self.active_cases[group_id])] if group_id in self.active_cases else []
+        
+        for group_id, case in cases:
             start_time = case["start_time"]
             elapsed = (now - start_time).total_seconds()
             
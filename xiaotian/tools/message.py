@@ -1,6 +1,7 @@
 import os
-import time
 import random
+from concurrent.futures import Future
+from typing import List
 from ..manage.root_manager import RootManager
 from ..ai.ai_core import XiaotianAI
 from ..manage.config import TRIGGER_WORDS
@@ -11,14 +12,20 @@ class MessageSender:
         self.root_manager = root_manager
         self.ai = ai_core
 
-    def send_message_to_groups(self, message: str = None, image_path: str = None, group_id: str = None):
+    def send_message_to_groups(self, message: str = None, image_path: str = None, group_id: str = None) -> List[Future]:
         """向目标群组发送消息
         
+        消息放进各群的发送队列后立即返回，各群并行发送。
+        
         Args:
             message: 要发送的文本消息
             image_path: 要发送的图片路径
             group_id: 指定的群组ID，如果提供则只发送到这个群组
+            
+        Returns:
+            List[Future]: 每条消息发出后完成的Future
         """
+        futures = []
         if self.root_manager.settings['qq_send_callback']:
             all_target_groups = self.root_manager.get_target_groups()
             
@@ -28,7 +35,7 @@ class MessageSender:
                     target_groups = [group_id]
                 else:
                     print(f"警告：尝试向非目标群组 {group_id} 发送消息，已阻止。")
-                    return
+                    return futures
             else:
                 target_groups = all_target_groups
 
@@ -61,25 +68,24 @@ class MessageSender:
                                 print(f"警告: 所有图片路径均无效: {image_path}")
 
                     wait_time = min(30, max(2, len(message) // 3)) if message else 2
-                    time.sleep(wait_time + random.uniform(-1, 1))
+                    wait_time += random.uniform(-1, 1)
+                    send = self.root_manager.settings['qq_send_callback']
 
-                    # 发送消息
+                    # 发送消息（等待时间在该群的发送队列中计时，不阻塞调用方）
                     if valid_image_path:
                         # 先发送图片，后发送文本
                         print(f"先发送图片到群组 {group_id}, 图片路径: {valid_image_path}")
-                        self.root_manager.settings['qq_send_callback']('group', group_id, None, valid_image_path)
-
-                        # 添加短暂延时，确保图片发送完成
-                        time.sleep(4 + random.uniform(0, 1))
+                        futures.append(send('group', group_id, None, valid_image_path, delay=wait_time))
 
-                        # 如果有文本消息，再发送文本
+                        # 如果有文本消息，图片发出后短暂延时再发送文本
                         if message:
                             print(f"再发送文本到群组 {group_id}")
-                            self.root_manager.settings['qq_send_callback']('group', group_id, message, None)
+                            futures.append(send('group', group_id, message, None, delay=4 + random.uniform(0, 1)))
                     else:
                         print(f"发送纯文本消息到群组 {group_id}")
-                        self.root_manager.settings['qq_send_callback']('group', group_id, message)
+                        futures.append(send('group', group_id, message, None, delay=wait_time))
                 except Exception as e:
                     print(f"发送消息到群组 {group_id} 失败：{e}")
                     import traceback
                     print(traceback.format_exc())
+        return [future for future in futures if future is not None]
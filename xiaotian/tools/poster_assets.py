@@ -0,0 +1,141 @@
+"""
+小天的海报素材缓存模块
+缓存海报用到的字体对象，以及每个月份预先合成好的底图（背景图+半透明遮罩+标题+logo），
+生成海报时只需复制底图再绘制日期、正文和用户图片。
+素材按文件的修改时间和大小生成签名，Root替换了图片或字体目录有变化时自动重新生成。
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ..manage.config import (
+    ASTRONOMY_FONTS_DIR, DEFAULT_FONT, TITLE_FONT, ARTISTIC_FONT, DATE_FONT
+)
+
+POSTER_SIZE = (1200, 1800)  # 标准海报尺寸
+LOGO_BOX = (135, 30, 180)  # logo位置和边长，与日期框左右对称
+
+
+def draw_bold_text(draw: ImageDraw.ImageDraw, xy: Tuple[float, float], text: str, font, fill,
+                   anchor: str = "mm", weight: int = 1):
+    """绘制加粗文字：用描边代替多次偏移重绘，字形只需光栅化一次
+
+    weight为描边宽度（像素），1对应原来上下左右各偏移1像素的9次重绘。
+    """
+    draw.text(xy, text, fill=fill, font=font, anchor=anchor, stroke_width=weight, stroke_fill=fill)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """文件的(修改时间, 大小)，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class PosterAssetCache:
+    """海报字体和底图缓存"""
+
+    def __init__(self, images_path: str, fonts_path: str = ASTRONOMY_FONTS_DIR):
+        self.images_path = images_path
+        self.fonts_path = fonts_path
+        self.lock = threading.Lock()
+        self._fonts = None
+        self._fonts_signature = None
+        # 月份图片路径 -> (签名, 底图)
+        self._layers: Dict[str, Tuple[tuple, Image.Image]] = {}
+
+    def _font_signature(self) -> tuple:
+        return (_file_signature(self.fonts_path),) + tuple(
+            _file_signature(path) for path in (DEFAULT_FONT, TITLE_FONT, ARTISTIC_FONT, DATE_FONT))
+
+    def fonts(self) -> Dict[str, ImageFont.ImageFont]:
+        """获取海报字体，字体文件变化后重新加载"""
+        signature = self._font_signature()
+        with self.lock:
+            if self._fonts is None or signature != self._fonts_signature:
+                self._fonts = self._load_fonts()
+                self._fonts_signature = signature
+                # 标题字体可能变化，底图需要重新合成
+                self._layers.clear()
+            return self._fonts
+
+    @staticmethod
+    def _load_fonts() -> Dict[str, ImageFont.ImageFont]:
+        print("加载字体（从配置）")
+        # 首先尝试加载默认字体，用于基本文本（缩小字体）
+        try:
+            text_font = ImageFont.truetype(DEFAULT_FONT, 32)  # 缩小正文字号
+            print(f"成功加载默認字体: {DEFAULT_FONT}")
+        except Exception:
+            text_font = ImageFont.load_default()
+            print("默认字体加载失败，使用系统默认字体")
+
+        def load(path: str, size: int, label: str):
+            try:
+                font = ImageFont.truetype(path, size)
+                print(f"成功加载{label}: {path}")
+                return font
+            except Exception:
+                print(f"{label}加载失败，使用默认字体代替")
+                try:
+                    return text_font.font_variant(size=size)
+                except Exception:
+                    return ImageFont.load_default()
+
+        return {
+            'text': text_font,
+            'title': load(TITLE_FONT, 110, "标题字体"),  # 放大标题字号
+            'date': load(ARTISTIC_FONT, 35, "艺术字体"),  # 适中的页脚字号
+            'time_display': load(DATE_FONT, 47, "时间字体"),  # 时间显示专用字体
+            'footer': load(ARTISTIC_FONT, 28, "页脚字体"),  # 较小字号的页脚字体
+        }
+
+    def base_layer(self, image_path: str, title: str) -> Image.Image:
+        """返回该月份的底图副本，可以直接在上面继续绘制"""
+        fonts = self.fonts()
+        logo_path = os.path.join(self.images_path, "logo.png")
+        signature = (_file_signature(image_path), _file_signature(logo_path), title)
+        with self.lock:
+            cached = self._layers.get(image_path)
+            if cached is None or cached[0] != signature:
+                cached = (signature, self._compose(image_path, logo_path, title, fonts['title']))
+                self._layers[image_path] = cached
+            return cached[1].copy()
+
+    @staticmethod
+    def _compose(image_path: str, logo_path: str, title: str, title_font) -> Image.Image:
+        """合成底图：背景图、半透明遮罩、标题和logo"""
+        img = Image.open(image_path).convert("RGBA").resize(POSTER_SIZE)
+
+        # 添加半透明遮罩，让文字更易读
+        overlay = Image.new('RGBA', img.size, (0, 0, 0, 180))
+        img = Image.alpha_composite(img, overlay)
+
+        # 添加标题
+        draw = ImageDraw.Draw(img)
+        draw.text((600, 120), title, fill=(255, 255, 255, 255), font=title_font, anchor="mm")
+
+        # 添加logo图片到左上角（正文、日期和页脚都不会绘制到logo区域）
+        if os.path.exists(logo_path):
+            try:
+                logo_x, logo_y, logo_size = LOGO_BOX
+                logo = Image.open(logo_path).convert("RGBA")
+                logo = logo.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
+                img.paste(logo, (logo_x, logo_y), logo)
+                print(f"成功添加顶层logo: {logo_path}")
+            except Exception as e:
+                print(f"添加logo失败: {e}")
+        else:
+            print(f"Logo文件不存在: {logo_path}")
+        return img
+
+    def invalidate(self):
+        """清空缓存，下次生成海报时重新加载"""
+        with self.lock:
+            self._fonts = None
+            self._layers.clear()
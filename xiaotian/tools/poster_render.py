@@ -0,0 +1,335 @@
+"""
+小天的海报渲染模块
+海报绘制是CPU密集的Pillow操作，放到进程池中执行，不占用消息处理和定时任务的线程。
+调用方先准备好渲染参数（PosterSpec，包含正文、用户图片、日期、主题和页脚格言），
+提交后得到输出路径的Future；多张海报（如补做多天的海报）可以同时使用多个CPU核心。
+等待用户图片期间可以先预渲染不含用户图片的版面，最终生成时只需贴上用户图片。
+"""
+
+import multiprocessing
+import os
+import textwrap
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from ..manage.config import (
+    ASTRONOMY_IMAGES_DIR, ASTRONOMY_FONTS_DIR, POSTER_OUTPUT_DIR,
+    DAILY_ASTRONOMY_MESSAGE, POSTER_RENDER_WORKERS
+)
+from .poster_assets import PosterAssetCache, draw_bold_text
+
+
+class PosterSpec(NamedTuple):
+    """一张海报的渲染参数（可以在进程间传递）"""
+    text: str
+    user_images: Tuple[str, ...] = ()
+    date: Optional[datetime] = None  # 海报日期，决定背景月份、日期框和文件名，默认今天
+    theme: Optional[str] = None  # 背景图片名（不含扩展名），不指定时使用当月图片
+    title: str = DAILY_ASTRONOMY_MESSAGE
+    footer_text: str = "小天 · 喵喵喵"
+    max_images: int = 2
+    images_path: str = ASTRONOMY_IMAGES_DIR
+    fonts_path: str = ASTRONOMY_FONTS_DIR
+    output_path: str = POSTER_OUTPUT_DIR
+
+
+# 每个进程各自的素材缓存，渲染进程常驻，缓存在多次渲染之间复用
+_ASSETS: Dict[Tuple[str, str], PosterAssetCache] = {}
+
+
+def _background_path(spec: PosterSpec, date: datetime) -> str:
+    """依次查找主题图片、当月图片和默认图片"""
+    names = [f"{spec.theme}.jpg"] if spec.theme else []
+    names += [f"{date.month}.jpg", "default.jpg"]
+    for name in names:
+        image_path = os.path.join(spec.images_path, name)
+        if os.path.exists(image_path):
+            return image_path
+    raise FileNotFoundError(f"无法找到月份图片 {date.month}.jpg 或默认图片")
+
+
+def _draw_layout(spec: PosterSpec, date: datetime) -> Tuple[Image.Image, int]:
+    """绘制除用户图片以外的版面，返回(图片, 正文结束的纵坐标)"""
+    image_path = _background_path(spec, date)
+
+    assets = _ASSETS.get((spec.images_path, spec.fonts_path))
+    if assets is None:
+        assets = _ASSETS[(spec.images_path, spec.fonts_path)] = PosterAssetCache(spec.images_path, spec.fonts_path)
+
+    # 复制缓存的底图（背景图、遮罩、标题和logo已合成），字体同样来自缓存
+    fonts = assets.fonts()
+    text_font = fonts['text']
+    time_display_font = fonts['time_display']
+    img = assets.base_layer(image_path, spec.title)
+    draw = ImageDraw.Draw(img)
+
+    # 在右上角添加正方形的日期框（纵向排列）- 优化版本
+    date_box_size = 180  # 进一步放大正方形边长
+    date_box_x = img.width - date_box_size - 135  # 进一步向左移动，距右边界100px
+    date_box_y = 30  # 距上边界30px
+
+    # 绘制半透明白色背景框
+    draw.rectangle(
+        [(date_box_x, date_box_y), 
+         (date_box_x + date_box_size, date_box_y + date_box_size)],
+        fill=None,  # 去掉白色背景
+        outline=(255, 255, 255, 255),  # 保留白色边框
+        width=10
+    )
+
+    # 在框内纵向排列年月日
+    year_str = date.strftime("%Y")
+    month_str = date.strftime("%m月")
+    day_str = date.strftime("%d日")
+
+    # 使用时间专用字体，加粗放大
+    date_font_bold = time_display_font
+
+    # 计算位置 - 年份竖排在左边，月日在右边中间
+    date_center_x = date_box_x + date_box_size // 2
+
+    # 年份竖排位置 - 在框的左边
+    year_x = date_box_x + 30  # 距离左边框25px
+    year_start_y = date_box_y + 30  # 起始位置
+
+    # 月日在右边剩余空间的中间
+    right_center_x = date_box_x + date_box_size // 2 + 30  # 右边区域中心
+    month_y = date_box_y + 60
+    day_y = date_box_y + 110
+
+    # 绘制年份（竖排）
+    color = '#7FBCDE'
+    year_chars = list(year_str)  # 将年份拆分为单个字符
+    for i, char in enumerate(year_chars):
+        char_y = year_start_y + i * 38  # 每个字符间距35px
+        draw_bold_text(draw, (year_x, char_y), char, date_font_bold, '#FFFFFF')
+
+    # 绘制年份与月日之间的分割线（白色竖直线）
+    line_x = (date_box_x + date_box_size // 2) - 32  # 在方框中间位置
+    line_start_y = date_box_y + 15  # 距离上边框15px
+    line_end_y = date_box_y + date_box_size - 15  # 距离下边框15px
+    draw.line([(line_x, line_start_y), (line_x, line_end_y)], fill=(255, 255, 255, 255), width=5)
+
+    # 绘制月日（右边中间），描边加粗
+    draw_bold_text(draw, (right_center_x, month_y), month_str, date_font_bold, color)
+    draw_bold_text(draw, (right_center_x, day_y), day_str, date_font_bold, color)
+    # 处理文本，保留用户的换行符（正文往上移动）
+    paragraphs = spec.text.split('\n')
+    y_position = 240  # 上移正文位置，缩小与标题间距
+    text_width = img.width - 300  # 左右各留150px边距
+    max_y_position = 1300  # 为用户图片和页脚留出更多空间
+    for paragraph in paragraphs:
+        # 检查用户是否已经首行缩进
+        if paragraph.startswith("　　"):  # 判断是否以全角空格开头
+            indented_paragraph = paragraph
+        else:
+            # 每个段落首行缩进两个字符，同时预处理负号和加号
+            cleaned_paragraph = paragraph.replace('-', '负').replace('+', '')
+            indented_paragraph = "　　" + cleaned_paragraph  # 使用全角空格进行缩进
+        # 对每个段落进行自动换行
+        lines = textwrap.wrap(indented_paragraph, width=28)  # 减小宽度以适应全角空格缩进
+
+        # 处理每一行
+        for i, line in enumerate(lines):
+            # 计算文本宽度来实现居中
+            try:
+                text_size = draw.textlength(line, font=text_font)
+                x_position = (img.width - text_size) / 2
+            except AttributeError:
+                # 如果textlength方法不可用（旧版PIL），使用固定位置
+                x_position = 150
+
+            # 绘制文本及其阴影，提高可读性
+            draw.text((x_position+2, y_position+2), line, fill=(0, 0, 0, 180), font=text_font)  # 阴影
+            draw.text((x_position, y_position), line, fill=(255, 255, 255, 255), font=text_font)  # 文本
+
+            y_position += 55  # 缩小行距
+            if y_position > max_y_position:  # 防止文字溢出
+                draw.text((img.width/2, y_position), "...(内容过长)", fill=(255, 255, 255, 255), font=text_font, anchor="mt")
+                y_position += 55  # 为省略号腾出空间
+                break
+
+        # 段落间额外添加一行间距
+        y_position += 15  # 缩小段落间距
+        if y_position > max_y_position:
+            break
+
+    # 使用较小字号的页脚字体
+    draw.text((600, 1650), spec.footer_text, fill=(180, 180, 255, 255), font=fonts['footer'], anchor="mm")
+
+    return img, y_position
+
+
+def _paste_user_images(img: Image.Image, spec: PosterSpec, y_position: int):
+    """把用户图片贴到正文下方（智能调整大小避免与页脚重合）"""
+    if spec.user_images:
+        # 计算图片区域，确保不与页脚重合
+        image_y_position = y_position + 40  # 在文字下方留出一定空间
+        footer_y_position = 1630  # 页脚位置
+        available_height = footer_y_position - image_y_position - 40  # 留出与页脚的间距
+        image_height = min(280, available_height)  # 动态调整图片高度
+
+        # 处理用户提供的图片（最多两张）
+        valid_images = []
+        for img_path in spec.user_images[:spec.max_images]:
+            try:
+                user_img = Image.open(img_path)
+                valid_images.append(user_img)
+            except Exception as e:
+                print(f"无法加载用户图片 {img_path}: {e}")
+
+        if len(valid_images) == 1:
+            # 单张图片居中放置
+            user_img = valid_images[0]
+
+            # 保持宽高比，调整大小
+            img_width = 600  # 单张图片宽度
+            img_height = int(user_img.height * (img_width / user_img.width))
+            if img_height > image_height:
+                img_height = image_height
+                img_width = int(user_img.width * (img_height / user_img.height))
+
+            user_img = user_img.resize((img_width, img_height))
+
+            # 计算居中位置
+            paste_x = (img.width - img_width) // 2
+            paste_y = image_y_position
+
+            # 将用户图片粘贴到主图上
+            if user_img.mode == 'RGBA':
+                img.paste(user_img, (paste_x, paste_y), user_img)
+            else:
+                img.paste(user_img, (paste_x, paste_y))
+
+        elif len(valid_images) == 2:
+            # 两张图片左右放置
+            img_width = 450  # 双图模式下每张图片宽度
+
+            for i, user_img in enumerate(valid_images):
+                # 保持宽高比，调整大小
+                img_height = int(user_img.height * (img_width / user_img.width))
+                if img_height > image_height:
+                    img_height = image_height
+                    img_width = int(user_img.width * (img_height / user_img.height))
+
+                user_img = user_img.resize((img_width, img_height))
+
+                # 计算放置位置
+                if i == 0:  # 左侧图片
+                    paste_x = (img.width // 2) - img_width - 50
+                else:  # 右侧图片
+                    paste_x = (img.width // 2) + 50
+
+                paste_y = image_y_position
+
+                # 将用户图片粘贴到主图上
+                if user_img.mode == 'RGBA':
+                    img.paste(user_img, (paste_x, paste_y), user_img)
+                else:
+                    img.paste(user_img, (paste_x, paste_y))
+
+
+def render_layout(spec: PosterSpec) -> Tuple[str, int]:
+    """预先渲染不含用户图片的版面，返回(版面文件路径, 正文结束的纵坐标)"""
+    date = spec.date or datetime.now()
+    img, y_position = _draw_layout(spec, date)
+    layout_dir = os.path.join(spec.output_path, "layouts")
+    os.makedirs(layout_dir, exist_ok=True)
+    layout_path = os.path.join(layout_dir, f"layout_{date.strftime('%Y%m%d')}_{os.getpid()}_{time.time_ns()}.png")
+    # 保存为不压缩的PNG，读回时比重新绘制快
+    img.save(layout_path, compress_level=0)
+    return layout_path, y_position
+
+
+def render_poster(spec: PosterSpec, layout: Tuple[str, int] = None) -> str:
+    """按渲染参数绘制海报，返回输出路径（在渲染进程中执行）
+
+    传入预先渲染的版面时只需贴上用户图片并保存。
+    """
+    date = spec.date or datetime.now()
+    img = None
+    if layout is not None:
+        try:
+            layout_path, y_position = layout
+            img = Image.open(layout_path).convert("RGBA")
+        except Exception as e:
+            print(f"读取预渲染版面失败，重新绘制: {e}")
+    if img is None:
+        img, y_position = _draw_layout(spec, date)
+    _paste_user_images(img, spec, y_position)
+
+    # 保存海报
+    os.makedirs(spec.output_path, exist_ok=True)
+    output_filename = f"astronomy_{date.strftime('%Y%m%d')}.png"
+    output_path = os.path.join(spec.output_path, output_filename)
+    img = img.convert("RGB")
+    img.save(output_path)
+
+    return output_path
+
+
+class PosterRenderService:
+    """进程池海报渲染服务，进程池不可用时在当前线程中渲染"""
+
+    def __init__(self, max_workers: int = POSTER_RENDER_WORKERS):
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self._pool is None:
+                # 使用spawn启动渲染进程，避免在多线程进程中fork
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _submit(self, func, *args) -> Future:
+        try:
+            return self._get_pool().submit(func, *args)
+        except Exception as e:
+            print(f"⚠️ 海报渲染进程池不可用，改为直接渲染：{e}")
+            with self.lock:
+                self._pool = None
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as render_err:
+                future.set_exception(render_err)
+            return future
+
+    def submit(self, spec: PosterSpec, layout: Tuple[str, int] = None) -> Future:
+        """提交渲染任务，返回输出路径的Future；layout为 submit_layout 预先渲染的版面"""
+        return self._submit(render_poster, spec, layout)
+
+    def submit_layout(self, spec: PosterSpec) -> Future:
+        """提交版面预渲染任务，返回(版面文件路径, 正文结束的纵坐标)的Future"""
+        return self._submit(render_layout, spec._replace(user_images=()))
+
+    def render(self, spec: PosterSpec, layout: Tuple[str, int] = None, timeout: float = None) -> str:
+        """渲染海报并等待完成，返回输出路径"""
+        return self.submit(spec, layout).result(timeout)
+
+    def shutdown(self):
+        with self.lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_RENDERER = None
+_RENDERER_GUARD = threading.Lock()
+
+
+def get_poster_renderer() -> PosterRenderService:
+    """获取进程内共用的海报渲染服务"""
+    global _RENDERER
+    with _RENDERER_GUARD:
+        if _RENDERER is None:
+            _RENDERER = PosterRenderService()
+        return _RENDERER
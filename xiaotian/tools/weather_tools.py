@@ -13,11 +13,12 @@ from .message import MessageSender
 
 
 class WeatherTools:
-    def __init__(self, root_manager=None):
+    def __init__(self, root_manager=None, ai_core=None):
         if root_manager is None:
             raise ValueError("WeatherTools requires a RootManager instance")
         self.root_manager = root_manager
-        self.message_sender = MessageSender(self.root_manager, None)  # AI核心暂时不需要传入
+        self.ai = ai_core
+        self.message_sender = MessageSender(self.root_manager, ai_core)
     
     def daily_weather_task(self):
         """每日天气任务"""
@@ -81,9 +82,11 @@ class WeatherTools:
             
             print(f"天气查询参数: 日期={current_date}, 时段={time_of_day}")
             
-            # 导入AI核心，利用已有的Moonshot API连接
-            from ..ai.ai_core import XiaotianAI
-            ai = XiaotianAI()
+            # 利用共享AI实例已有的Moonshot API连接
+            ai = self.ai
+            if ai is None:
+                from ..ai.ai_core import get_shared_ai
+                ai = self.ai = get_shared_ai()
             
             # 构造天气查询系统提示词和用户提示词
             system_prompt = """你是专业的气象与天文观测助手。
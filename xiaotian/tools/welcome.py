@@ -162,6 +162,8 @@ class WelcomeManager:
                         print(f"✓ 已为新成员 {user_id} 赠送{20 + bonus}点好感度")
                     
                     welcome_msg += bonus_msg
+                    # 记录好感度变更
+                    self.ai.save_like_status(user_id)
                 else:
                     print(f"⚠️ 无法为新成员 {user_id} 创建好感度记录，可能是AI实例未完全初始化")
             except Exception as e:
@@ -178,6 +180,7 @@ class WelcomeManager:
                         'speed_multiplier': 1.0,
                         'personality_change_count': 0
                     }
+                    self.ai.save_like_status(user_id)
                     print(f"✓ 已通过备用方式为新成员 {user_id} 赠送20点好感度")
                     welcome_msg += "🎁 初次见面，已赠送您 20 点好感度~~如果可以的话，能不能给小天一颗⭐，求求了"
                 except Exception as backup_error:
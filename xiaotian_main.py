@@ -20,9 +20,10 @@ from ncatbot.core import BotClient, GroupMessage, PrivateMessage, Request, At
 from ncatbot.utils import get_log
 
 # 导入小天相关模块
-from xiaotian.scheduler import XiaotianScheduler
+from xiaotian.scheduler import XiaotianScheduler, Reply
 from xiaotian.manage.config import ADMIN_USER_IDS, BLACKLIST_USER_IDS
-from xiaotian.ai.ai_core import XiaotianAI
+from xiaotian.ai.ai_core import get_shared_ai
+from xiaotian.manage.outbound_dispatcher import OutboundDispatcher
 
 
 class XiaotianQQBot:
@@ -50,17 +51,26 @@ class XiaotianQQBot:
         self.replying_users: Set[str] = set()  # 正在回复的用户集合
         self.reply_locks: Dict[str, asyncio.Lock] = {}  # 每个用户的回复锁
 
+        # 主动发送的消息按目标排队、并行发送并限速
+        self.outbound = OutboundDispatcher(self._post_message)
 
         # 注册回调函数
         self.register_handlers()
-    def qq_send_callback(self, msg_type: str, target_id: str, message: str = None, image_path: str = None):
-        """QQ发送消息的回调函数"""
-        try:
-            # 检查 target_id 是否为 None
-            if target_id is None:
-                self._log.error("目标 ID (target_id) 为空，无法发送消息")
-                return
+    def qq_send_callback(self, msg_type: str, target_id: str, message: str = None, image_path: str = None,
+                         delay: float = 0):
+        """QQ发送消息的回调函数：放进发送队列后立即返回，返回的Future在消息发出后完成
 
+        delay为轮到该消息后发送前的等待时间，同一目标的消息按调用顺序发送。
+        """
+        # 检查 target_id 是否为 None
+        if target_id is None:
+            self._log.error("目标 ID (target_id) 为空，无法发送消息")
+            return None
+        return self.outbound.enqueue(msg_type, target_id, message, image_path, delay)
+
+    def _post_message(self, msg_type: str, target_id: str, message: str = None, image_path: str = None) -> bool:
+        """实际发送一条QQ消息（在发送队列的线程池中执行），发送成功时返回True"""
+        try:
             # 添加详细日志
             if message:
                 self._log.info(f"发送消息到 {msg_type}({target_id}): {message[:50]}{'...' if len(message) > 50 else ''}")
@@ -88,7 +98,7 @@ class XiaotianQQBot:
                     target_groups = self.scheduler.root_manager.get_target_groups()
                     if target_id not in target_groups:
                         self._log.warning(f"警告：尝试向非目标群组 {target_id} 发送消息，已阻止。")
-                        return
+                        return False
                 
                 if valid_image_ and not message:
                     # 仅发送图片消息
@@ -125,10 +135,12 @@ class XiaotianQQBot:
                     # 发送纯文本消息
                     self.bot.api.post_private_msg_sync(user_id=int(target_id), text=message)
                     self._log.info(f"已发送纯文本私聊消息到 {target_id}")
+            return True
         except Exception as e:
             self._log.error(f"发送消息失败：{e}")
             import traceback
             self._log.error(traceback.format_exc())
+            return False
     def register_handlers(self):
         """注册NcatBot回调函数"""
         # 注册私聊消息处理
@@ -143,11 +155,15 @@ class XiaotianQQBot:
         # 注册群组通知事件处理（如新成员入群）
         self.bot.add_notice_event_handler(self.on_group_notice)
     
-    def handle_response(self, response:str, user_id: str, group_id: str = None) -> tuple:
-        # 尝试解析AI回复中的JSON信息并处理
+    def handle_response(self, response, user_id: str, group_id: str = None) -> tuple:
+        # 命令回复直接使用Reply中的字段，只有AI生成的文本才解析其中的JSON信息
         try:
             memory_key = self.ai._get_memory_key(user_id, group_id)
-            cleaned_response, like_value, wait_time, not_even_wrong = self.ai.parse_ai_response_for_like(response)
+            if isinstance(response, Reply):
+                cleaned_response, like_value = response.contents, response.like
+                wait_time, not_even_wrong = response.wait_times, response.not_even_wrong
+            else:
+                cleaned_response, like_value, wait_time, not_even_wrong = self.ai.parse_ai_response_for_like(response)
             
             # 如果标记为not_even_wrong，不进行回复
             if not_even_wrong:
@@ -171,11 +187,50 @@ class XiaotianQQBot:
             # 返回最终回复
             return wait_time, cleaned_response, like_response
         except Exception as e:
-            # 如果解析失败，说明这是一个普通的文本回复（比如root命令结果）
-            # 直接返回文本，不处理like值
-            self._log.debug(f"解析AI响应失败，当作普通文本处理: {e}")
+            # 如果处理失败，直接发送回复内容，不处理like值
+            self._log.debug(f"处理回复失败，当作普通文本处理: {e}")
+            if isinstance(response, Reply):
+                return response.wait_times, response.contents, ""
             return [3], [response], ""  # 返回固定等待时间和原始响应
 
+    async def _send_streamed_parts(self, parts: asyncio.Queue, send, delay, user_id: str, group_id: str = None) -> set:
+        """依次发送流式生成的消息，直到收到None，返回已发送消息的位置集合
+
+        send(text) 负责发送一条消息，delay(i, wait_time) 返回第i条消息发送前的等待秒数
+        """
+        streamed = set()
+        while True:
+            part = await parts.get()
+            if part is None:
+                return streamed
+            index, wait_time, content = part
+            try:
+                sleep_time = delay(index, wait_time)
+                self.scheduler.add_response_wait_time(sleep_time, user_id, group_id)
+                await asyncio.sleep(sleep_time)
+                await send(content)
+                self._log.info(f"已流式发送第{index+1}条消息: {content[:50]}...")
+            except Exception as e:
+                self._log.error(f"流式发送消息失败: {e}")
+            streamed.add(index)
+
+    async def _process_with_stream(self, user_id: str, message: str, group_id: str, image_data: bytes, send, delay) -> tuple:
+        """处理消息，AI回复中的每条消息生成后立即发送
+
+        返回 (完整回复, 已发送消息的位置集合)，其余的消息和好感度提示由调用方按原方式发送
+        """
+        parts = asyncio.Queue()
+        sender = asyncio.create_task(self._send_streamed_parts(parts, send, delay, user_id, group_id))
+        try:
+            response = await self.scheduler.process_message_async(
+                user_id, message, group_id, image_data,
+                on_part=lambda index, wait_time, content: parts.put_nowait((index, wait_time, content))
+            )
+        finally:
+            parts.put_nowait(None)
+            streamed = await sender
+        return response, streamed
+
     async def on_private_message(self, msg: PrivateMessage):
         """处理私聊消息"""
         self._log.info(f"收到私聊消息: {msg.user_id}:{msg.raw_message}")
@@ -219,7 +274,7 @@ class XiaotianQQBot:
                             if image_url:
                                 try:
                                     import requests
-                                    response = requests.get(image_url, timeout=10)
+                                    response = await asyncio.to_thread(requests.get, image_url, timeout=10)
                                     if response.status_code == 200:
                                         image_data = response.content
                                         self._log.info(f"Root用户图片下载成功，大小: {len(image_data)} 字节")
@@ -227,8 +282,14 @@ class XiaotianQQBot:
                                 except Exception as e:
                                     self._log.warning(f"下载图片失败: {e}")
                                     
-                # 处理消息（私聊不传group_id）
-                response = self.scheduler.process_message(user_id, msg.raw_message, None, image_data)
+                # 处理消息（私聊不传group_id），AI回复的每条消息生成后立即发送
+                async def send_private(text):
+                    await msg.reply(text=text)
+
+                response, streamed = await self._process_with_stream(
+                    user_id, msg.raw_message, None, image_data, send_private,
+                    lambda i, wait: wait + random.uniform(0, 3)
+                )
                 self._log.info(f"Scheduler返回响应: '{response}' (类型: {type(response)}, 长度: {len(str(response)) if response else 0})")
                 
                 # 检查是否有回复
@@ -239,19 +300,19 @@ class XiaotianQQBot:
                     
                     # 检查返回值是否有效
                     if wait_time and cleaned_response:
-                        self._log.info(f"发送多条消息，共{len(cleaned_response)}条")
+                        self._log.info(f"发送多条消息，共{len(cleaned_response)}条，已流式发送{len(streamed)}条")
                         for i in range(len(wait_time)):
-                            if cleaned_response[i]:
+                            if i not in streamed and cleaned_response[i]:
                                 sleep_time = wait_time[i] + random.uniform(0, 3)
-                                self.scheduler.add_response_wait_time(sleep_time)
+                                self.scheduler.add_response_wait_time(sleep_time, user_id)
                                 await asyncio.sleep(sleep_time)
                                 await msg.reply(text=cleaned_response[i])
                                 self._log.info(f"已发送第{i+1}条消息: {cleaned_response[i][:50]}...")
-                    elif cleaned_response:
+                    elif cleaned_response and not streamed:
                         # 如果只有cleaned_response，没有wait_time
                         self._log.info(f"发送单条消息: {cleaned_response}")
                         sleep_time = 3 + random.uniform(0, 1)
-                        self.scheduler.add_response_wait_time(sleep_time)
+                        self.scheduler.add_response_wait_time(sleep_time, user_id)
                         await asyncio.sleep(sleep_time)
                         await msg.reply(text=cleaned_response)
                         self._log.info(f"已发送消息")
@@ -259,7 +320,7 @@ class XiaotianQQBot:
                     if like_response:
                         self._log.info(f"发送like响应: {like_response}")
                         sleep_time = 3 + random.uniform(-1, 2)
-                        self.scheduler.add_response_wait_time(sleep_time)
+                        self.scheduler.add_response_wait_time(sleep_time, user_id)
                         await asyncio.sleep(sleep_time)
                         await msg.reply(text=like_response)
                         self._log.info(f"已发送like响应")
@@ -314,22 +375,32 @@ class XiaotianQQBot:
             try:
                 image_data = None
 
-                # 处理消息
-                response = self.scheduler.process_message(user_id, msg.raw_message, group_id, image_data)
+                # 处理消息，AI回复的每条消息生成后立即发送
+                async def send_group(text):
+                    # 检查是否有其他用户请求，如果没有则不使用引用
+                    if len(self.replying_users) <= 1:  # 只有当前用户在回复队列中
+                        await self.bot.api.post_group_msg(group_id=int(group_id), text=text)
+                    else:
+                        await msg.reply(text=text)
+
+                response, streamed = await self._process_with_stream(
+                    user_id, msg.raw_message, group_id, image_data, send_group,
+                    lambda i, wait: 1 if i == 0 else wait + random.uniform(0, 1)
+                )
 
                 wait_time, cleaned_response, like_response = self.handle_response(response, user_id, group_id)
                 
                 if wait_time and cleaned_response:
                     for i in range(len(wait_time)):
-                        if cleaned_response[i]:
+                        if i not in streamed and cleaned_response[i]:
                             if i != 0:
                                 sleep_time = wait_time[i] + random.uniform(0, 1)
                                 # 将等待时间累加到scheduler中，用于唤醒超时计算
-                                self.scheduler.add_response_wait_time(sleep_time)
+                                self.scheduler.add_response_wait_time(sleep_time, user_id, group_id)
                                 await asyncio.sleep(sleep_time)
                             else:
                                 sleep_time = 1
-                                self.scheduler.add_response_wait_time(sleep_time)
+                                self.scheduler.add_response_wait_time(sleep_time, user_id, group_id)
                                 await asyncio.sleep(sleep_time)
                             # 检查是否有其他用户请求，如果没有则不使用引用
                             if len(self.replying_users) <= 1:  # 只有当前用户在回复队列中
@@ -339,15 +410,15 @@ class XiaotianQQBot:
                     self.replying_users.discard(user_key)
                     if like_response:
                         sleep_time = 1 + random.uniform(0, 2)
-                        self.scheduler.add_response_wait_time(sleep_time)
+                        self.scheduler.add_response_wait_time(sleep_time, user_id, group_id)
                         await asyncio.sleep(sleep_time)
                         if len(self.replying_users) <= 1:
                             await self.bot.api.post_group_msg(group_id=int(group_id), text=like_response)
                         else:
                             await msg.reply(text=like_response)
-                elif cleaned_response:
+                elif cleaned_response and not streamed:
                     sleep_time = 3 + random.uniform(0, 1)
-                    self.scheduler.add_response_wait_time(sleep_time)
+                    self.scheduler.add_response_wait_time(sleep_time, user_id, group_id)
                     # 检查是否为余额不足错误
                     error_map = {
                         402: "包里没钱啦~",
@@ -372,9 +443,6 @@ class XiaotianQQBot:
                     self.replying_users.discard(user_key)
                 else:
                     self.replying_users.discard(user_key)
-
-                self.scheduler.last_user_id = user_id
-                self.scheduler.last_group_id = group_id
                 
             except Exception as e:
                 try:
@@ -465,7 +533,7 @@ class XiaotianQQBot:
             return
         
         # 初始化AI和调度器
-        self.ai = XiaotianAI()
+        self.ai = get_shared_ai()
         self.scheduler = XiaotianScheduler(root_id=root_id, qq_send_callback=self.qq_send_callback, ai = self.ai)
         
         # 检查是否有必要的图片和字体文件
@@ -480,6 +548,10 @@ class XiaotianQQBot:
             self.bot.run(bt_uin=bot_uin, root=root_id)
         except Exception as e:
             self._log.error(f"启动失败: {str(e)}")
+        finally:
+            # 退出前停止调度器并写入缓冲中的记忆变更
+            self.scheduler.stop_scheduler()
+            self.outbound.stop()
             
     def _check_required_files(self):
         """检查必要的资源文件是否存在"""